@@ -0,0 +1,425 @@
+#!/usr/bin/env python3
+"""
+Message Batches mode for reprocessing many documents at once.
+Packages the text_extraction_analysis prompt of every document into
+Message Batches jobs instead of one synchronous call per document, polls
+the jobs and maps results back to document ids. Batches are processed
+asynchronously at half the per-token price, so large backfills trade
+latency for throughput and cost.
+
+All progress is kept in a SQLite state file: documents, the batch each was
+sent in and its result. Rerunning the same command after a crash resumes
+where it stopped: collected results are kept, open batches are polled
+rather than resubmitted, and only documents never submitted (or whose
+batch expired or was canceled) are sent again.
+
+Usage:
+    python batch_analyzer.py samples/*.pdf [--state batch_state.sqlite3] [--output batch_results.json]
+    python batch_analyzer.py samples/ --no-wait     # submit and exit; rerun later to collect
+    python batch_analyzer.py --status
+    python batch_analyzer.py samples/ --base-url http://127.0.0.1:8766  # against batch_api_stub.py
+"""
+
+import argparse
+import json
+import sqlite3
+import sys
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from llm_cache import LLMResultCache
+from blank_pages import BlankPageDetector
+from llm_document_analyzer import DocumentAnalyzer, skipped_pages_summary, usage_dict
+from page_dedup import PageDeduplicator
+from text_extraction import ExtractionCache, TextExtractor
+from token_budget import DEFAULT_TOKEN_BUDGET
+
+# Message Batches limits: 100,000 requests or 256 MB per batch
+MAX_BATCH_REQUESTS = 100000
+MAX_BATCH_BYTES = 256 * 1024 * 1024
+
+# Document states; expired and canceled requests go back to pending
+PENDING, SUBMITTED, SUCCEEDED, ERRORED, NO_TEXT = 'pending', 'submitted', 'succeeded', 'errored', 'no_text'
+# Every page is blank or repeats an already indexed page (see PageDeduplicator)
+DUPLICATE = 'duplicate'
+# Prompt estimated over the analyzer's token_budget; left to the interactive
+# analyzer, which splits it into chunks
+OVER_BUDGET = 'over_budget'
+
+
+class BatchStateStore:
+    """SQLite record of documents and batches for crash-safe resume."""
+
+    def __init__(self, db_path: str):
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.db_path), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS documents (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                doc_id TEXT UNIQUE NOT NULL,
+                pdf_path TEXT NOT NULL,
+                status TEXT NOT NULL,
+                batch_id TEXT,
+                cache_key TEXT,
+                response TEXT,
+                usage TEXT,
+                error TEXT,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                updated REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_documents_status ON documents(status);
+            CREATE TABLE IF NOT EXISTS batches (
+                batch_id TEXT PRIMARY KEY,
+                model TEXT NOT NULL,
+                request_count INTEGER NOT NULL,
+                processing_status TEXT NOT NULL,
+                collected INTEGER NOT NULL DEFAULT 0,
+                created REAL NOT NULL,
+                ended REAL
+            );
+        """)
+        self._conn.commit()
+
+    def add_documents(self, documents: Iterable[Tuple[str, str]]) -> int:
+        """Register (doc_id, pdf_path) pairs as pending; known doc_ids are left alone."""
+        now = time.time()
+        with self._lock:
+            before = self._conn.total_changes
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO documents (doc_id, pdf_path, status, updated) VALUES (?, ?, ?, ?)",
+                ((doc_id, pdf_path, PENDING, now) for doc_id, pdf_path in documents)
+            )
+            self._conn.commit()
+            return self._conn.total_changes - before
+
+    def pending(self) -> List[Tuple[int, str, str]]:
+        """(row id, doc_id, pdf_path) of documents waiting to be submitted."""
+        with self._lock:
+            return self._conn.execute(
+                "SELECT id, doc_id, pdf_path FROM documents WHERE status = ? ORDER BY id", (PENDING,)
+            ).fetchall()
+
+    def record_batch(self, batch_id: str, model: str, submitted: List[Tuple[int, str]]):
+        """Record a created batch and mark its (row id, cache key) documents submitted."""
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO batches (batch_id, model, request_count, processing_status, created) "
+                "VALUES (?, ?, ?, 'in_progress', ?)",
+                (batch_id, model, len(submitted), now)
+            )
+            self._conn.executemany(
+                "UPDATE documents SET status = ?, batch_id = ?, cache_key = ?, "
+                "attempts = attempts + 1, updated = ? WHERE id = ?",
+                ((SUBMITTED, batch_id, cache_key, now, row_id) for row_id, cache_key in submitted)
+            )
+            self._conn.commit()
+
+    def open_batches(self) -> List[str]:
+        """Batches whose results haven't been collected yet."""
+        with self._lock:
+            return [row[0] for row in self._conn.execute(
+                "SELECT batch_id FROM batches WHERE collected = 0 ORDER BY created"
+            )]
+
+    def set_batch_status(self, batch_id: str, processing_status: str):
+        with self._lock:
+            self._conn.execute(
+                "UPDATE batches SET processing_status = ?, ended = CASE WHEN ? = 'ended' THEN ? ELSE ended END "
+                "WHERE batch_id = ?",
+                (processing_status, processing_status, time.time(), batch_id)
+            )
+            self._conn.commit()
+
+    def document_cache_key(self, row_id: int) -> Optional[str]:
+        with self._lock:
+            row = self._conn.execute("SELECT cache_key FROM documents WHERE id = ?", (row_id,)).fetchone()
+            return row[0] if row else None
+
+    def set_result(self, row_id: int, status: str, response: Optional[str] = None,
+                   usage: Optional[Dict] = None, error: Optional[str] = None, commit: bool = True):
+        with self._lock:
+            self._conn.execute(
+                "UPDATE documents SET status = ?, response = ?, usage = ?, error = ?, updated = ? WHERE id = ?",
+                (status, response, json.dumps(usage) if usage else None, error, time.time(), row_id)
+            )
+            if commit:
+                self._conn.commit()
+
+    def mark_collected(self, batch_id: str):
+        """Finish a batch; any of its documents without a result go back to pending."""
+        with self._lock:
+            self._conn.execute(
+                "UPDATE documents SET status = ?, batch_id = NULL, updated = ? WHERE batch_id = ? AND status = ?",
+                (PENDING, time.time(), batch_id, SUBMITTED)
+            )
+            self._conn.execute("UPDATE batches SET collected = 1 WHERE batch_id = ?", (batch_id,))
+            self._conn.commit()
+
+    def retry_errored(self) -> int:
+        """Send errored documents again on the next submit."""
+        with self._lock:
+            cursor = self._conn.execute(
+                "UPDATE documents SET status = ?, batch_id = NULL, error = NULL, updated = ? WHERE status = ?",
+                (PENDING, time.time(), ERRORED)
+            )
+            self._conn.commit()
+            return cursor.rowcount
+
+    def counts(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self._conn.execute("SELECT status, COUNT(*) FROM documents GROUP BY status"))
+
+    def results(self) -> Iterator[Dict]:
+        """Every document with its current status and result."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT doc_id, pdf_path, status, batch_id, response, usage, error, attempts "
+                "FROM documents ORDER BY id"
+            ).fetchall()
+        for doc_id, pdf_path, status, batch_id, response, usage, error, attempts in rows:
+            yield {
+                'doc_id': doc_id,
+                'pdf_path': pdf_path,
+                'status': status,
+                'batch_id': batch_id,
+                'response': response,
+                'usage': json.loads(usage) if usage else None,
+                'error': error,
+                'attempts': attempts
+            }
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class BatchAnalyzer:
+    """Submit documents' text_extraction_analysis prompts as Message Batches.
+
+    Uses the analyzer's client, prompt and text extractor, so results match
+    analyze_with_text_extraction(). With the analyzer's LLMResultCache,
+    documents already answered are served from the cache instead of being
+    submitted, and batch results are added to it for the interactive path.
+    """
+
+    def __init__(self, analyzer: DocumentAnalyzer, store: BatchStateStore,
+                 model: str = "claude-3-5-haiku-latest", max_tokens: int = 4000,
+                 temperature: float = 0.1, max_batch_requests: int = MAX_BATCH_REQUESTS):
+        self.analyzer = analyzer
+        self.store = store
+        self.model = model
+        self.max_tokens = max_tokens
+        self.temperature = temperature
+        self.max_batch_requests = min(max_batch_requests, MAX_BATCH_REQUESTS)
+
+    def submit_pending(self) -> List[str]:
+        """Build prompts for pending documents and submit them; returns new batch ids."""
+        batch_ids = []
+        requests, submitted, size = [], [], 0
+
+        for row_id, doc_id, pdf_path in self.store.pending():
+            pages, skipped = self.analyzer.prescreen_pages(pdf_path)
+            if not pages:
+                self.store.set_result(row_id, NO_TEXT, error="Failed to extract text from PDF")
+                continue
+            if len(skipped) == len(pages):
+                summary = skipped_pages_summary(skipped)
+                if summary['duplicate_pages']:
+                    self.store.set_result(row_id, DUPLICATE, json.dumps(summary))
+                else:
+                    self.store.set_result(row_id, NO_TEXT, error="All pages are blank")
+                continue
+            prefix, prompt = self.analyzer.text_extraction_prompt(pages, skipped)
+            estimated_tokens = self.analyzer.count_input_tokens(prefix + prompt, self.model)
+            if estimated_tokens > self.analyzer.token_budget:
+                self.store.set_result(row_id, OVER_BUDGET,
+                                      error=f"~{estimated_tokens} input tokens exceeds the budget of "
+                                            f"{self.analyzer.token_budget}; use llm_document_analyzer.py")
+                continue
+
+            cache_key = LLMResultCache.make_key(self.model, self.temperature, self.max_tokens, prefix + prompt)
+            cached = self.analyzer.cache.get(cache_key) if self.analyzer.cache else None
+            if cached:
+                self.store.set_result(row_id, SUCCEEDED, cached['response'], cached['usage'])
+                continue
+
+            request = {
+                # custom_id must match ^[a-zA-Z0-9_-]{1,64}$, which doc ids (paths) needn't
+                'custom_id': f"doc-{row_id}",
+                'params': {
+                    'model': self.model,
+                    'max_tokens': self.max_tokens,
+                    'temperature': self.temperature,
+                    # Requests in a batch share the instruction prefix through the prompt cache too
+                    'messages': [{"role": "user", "content": self.analyzer.message_content(prompt, prefix, self.model)}]
+                }
+            }
+            request_size = len(json.dumps(request).encode('utf-8'))
+            if requests and (len(requests) >= self.max_batch_requests or size + request_size > MAX_BATCH_BYTES):
+                batch_ids.append(self._create_batch(requests, submitted))
+                requests, submitted, size = [], [], 0
+            requests.append(request)
+            submitted.append((row_id, cache_key))
+            size += request_size
+
+        if requests:
+            batch_ids.append(self._create_batch(requests, submitted))
+        return batch_ids
+
+    def _create_batch(self, requests: List[Dict], submitted: List[Tuple[int, str]]) -> str:
+        batch = self.analyzer.rate_limiter.retry(self.analyzer.client.messages.batches.create, requests=requests)
+        # A crash between create and this write leaves the documents pending,
+        # so they are resubmitted once; the orphaned batch is only wasted cost
+        self.store.record_batch(batch.id, self.model, submitted)
+        print(f"Submitted batch {batch.id} with {len(requests)} documents")
+        return batch.id
+
+    def poll(self) -> Dict[str, str]:
+        """Check every open batch, collecting results of those that ended."""
+        statuses = {}
+        for batch_id in self.store.open_batches():
+            batch = self.analyzer.rate_limiter.retry(self.analyzer.client.messages.batches.retrieve, batch_id)
+            statuses[batch_id] = batch.processing_status
+            self.store.set_batch_status(batch_id, batch.processing_status)
+            if batch.processing_status == 'ended':
+                self.collect(batch_id)
+        return statuses
+
+    def collect(self, batch_id: str) -> Dict[str, int]:
+        """Store an ended batch's results by document; returns counts by result type."""
+        counts = {}
+        results = self.analyzer.rate_limiter.retry(self.analyzer.client.messages.batches.results, batch_id)
+        for entry in results:
+            result_type = entry.result.type
+            counts[result_type] = counts.get(result_type, 0) + 1
+            row_id = int(entry.custom_id.split('-', 1)[1])
+
+            if result_type == 'succeeded':
+                message = entry.result.message
+                text = message.content[0].text
+                usage = usage_dict(message.usage)
+                self.store.set_result(row_id, SUCCEEDED, text, usage, commit=False)
+                cache_key = self.store.document_cache_key(row_id)
+                if self.analyzer.cache and cache_key:
+                    self.analyzer.cache.put(cache_key, self.model, text, usage)
+            elif result_type == 'errored':
+                error = entry.result.error
+                detail = getattr(error, 'error', error)
+                self.store.set_result(row_id, ERRORED, error=f"{getattr(detail, 'type', '')}: "
+                                                              f"{getattr(detail, 'message', detail)}", commit=False)
+            # expired and canceled requests were never processed; mark_collected
+            # returns them to pending
+
+        self.store.mark_collected(batch_id)
+        print(f"Collected batch {batch_id}: {counts}")
+        return counts
+
+    def run(self, wait: bool = True, poll_interval: float = 60.0) -> Dict[str, int]:
+        """Resume open batches, submit pending documents and (if wait) poll until done.
+
+        Documents returned to pending by expired or canceled batches are
+        submitted again in a new batch.
+        """
+        self.poll()
+        self.submit_pending()
+        while wait and self.store.open_batches():
+            time.sleep(poll_interval)
+            statuses = self.poll()
+            print(f"  {time.strftime('%H:%M:%S')} batches: {statuses} documents: {self.store.counts()}")
+            if self.store.counts().get(PENDING):
+                self.submit_pending()
+        return self.store.counts()
+
+
+def find_documents(paths: Iterable[str]) -> Iterator[Tuple[str, str]]:
+    """Yield (doc_id, pdf_path) for PDFs, searching directories recursively.
+
+    The resolved path is the doc_id, so rerunning with the same files
+    matches documents already in the state file.
+    """
+    for path in map(Path, paths):
+        files = sorted(path.rglob('*.pdf')) if path.is_dir() else [path]
+        for file_path in files:
+            resolved = str(file_path.resolve())
+            yield resolved, resolved
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Analyze many PDFs through the Message Batches API")
+    parser.add_argument('paths', nargs='*', help='PDF files or directories (searched recursively)')
+    parser.add_argument('--state', default='batch_state.sqlite3', help='state file used to resume after a crash')
+    parser.add_argument('--model', default='claude-3-5-haiku-latest')
+    parser.add_argument('--max-tokens', type=int, default=4000)
+    parser.add_argument('--batch-size', type=int, default=MAX_BATCH_REQUESTS, help='max documents per batch')
+    parser.add_argument('--poll', type=float, default=60.0, help='seconds between status checks')
+    parser.add_argument('--no-wait', action='store_true', help='submit and exit; rerun later to collect')
+    parser.add_argument('--retry-errored', action='store_true', help='resubmit documents whose request errored')
+    parser.add_argument('--status', action='store_true', help='print document counts and exit')
+    parser.add_argument('--cache', help='LLM response cache shared with llm_document_analyzer.py')
+    parser.add_argument('--text-cache', help='extracted page text cache (SQLite)')
+    parser.add_argument('--token-budget', type=int, default=DEFAULT_TOKEN_BUDGET,
+                        help='documents whose prompt is estimated over this many input tokens are not submitted')
+    parser.add_argument('--keep-blank', action='store_true', help="don't leave blank pages out of prompts")
+    parser.add_argument('--dedup-index', help='page deduplication index (SQLite); duplicate pages are left out')
+    parser.add_argument('--base-url', help='API base URL, e.g. a local batch_api_stub.py')
+    parser.add_argument('--output', help='write all results to this JSON file')
+    args = parser.parse_args()
+
+    store = BatchStateStore(args.state)
+    try:
+        if args.status:
+            print(f"Documents: {store.counts()}")
+            print(f"Open batches: {store.open_batches()}")
+            return
+
+        added = store.add_documents(find_documents(args.paths))
+        print(f"Added {added} new documents to {args.state}")
+        if args.retry_errored:
+            print(f"Retrying {store.retry_errored()} errored documents")
+
+        analyzer = DocumentAnalyzer(
+            cache=LLMResultCache(args.cache) if args.cache else None,
+            extractor=TextExtractor(cache=ExtractionCache(args.text_cache)) if args.text_cache else None,
+            base_url=args.base_url,
+            deduplicator=PageDeduplicator(args.dedup_index) if args.dedup_index else None,
+            blank_detector=None if args.keep_blank else BlankPageDetector(),
+            token_budget=args.token_budget
+        )
+        batch_analyzer = BatchAnalyzer(analyzer, store, model=args.model, max_tokens=args.max_tokens,
+                                       max_batch_requests=args.batch_size)
+
+        already_done = store.counts().get(SUCCEEDED, 0)
+        resumed = bool(store.open_batches())
+        start = time.time()
+        counts = batch_analyzer.run(wait=not args.no_wait, poll_interval=args.poll)
+        elapsed = time.time() - start
+        completed = counts.get(SUCCEEDED, 0) - already_done
+        print(f"\nDocuments: {counts} ({elapsed:.1f}s)")
+        # Batches resumed from an earlier run were processing before this one started
+        if completed and not args.no_wait and not resumed:
+            print(f"Throughput: {completed / elapsed * 3600:.0f} documents/hour this run")
+        if store.open_batches():
+            print(f"Batches still open: {store.open_batches()}; rerun to collect")
+
+        if args.output:
+            with open(args.output, 'w') as f:
+                json.dump(list(store.results()), f, indent=2)
+            print(f"Results saved to: {args.output}")
+
+        if analyzer.cache:
+            print(f"LLM cache: {analyzer.cache.stats()}")
+    except Exception as e:
+        print(f"Batch analysis failed: {e}; rerun to resume from {args.state}")
+        sys.exit(1)
+    finally:
+        store.close()
+
+
+if __name__ == '__main__':
+    main()
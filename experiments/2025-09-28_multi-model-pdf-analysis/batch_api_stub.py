@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+"""
+Local stub of the Message Batches endpoints for exercising batch_analyzer.py
+without an API key or cost.
+
+Implements create, retrieve and results for /v1/messages/batches. Batches end
+--delay seconds after creation; each request gets a canned JSON analysis
+naming its custom_id, or is errored/expired at the given rates so resume
+and retry paths can be tested. State is in memory only.
+
+Usage:
+    python batch_api_stub.py [--port 8766] [--delay 5] [--error-rate 0.1] [--expire-rate 0.1]
+    ANTHROPIC_API_KEY=stub python batch_analyzer.py samples/ --base-url http://127.0.0.1:8766 --poll 2
+"""
+
+import argparse
+import json
+import random
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+PREFIX = '/v1/messages/batches'
+
+
+def _timestamp(seconds):
+    return datetime.fromtimestamp(seconds, timezone.utc).isoformat().replace('+00:00', 'Z') if seconds else None
+
+
+class BatchStub:
+    """In-memory batches that end after a fixed delay."""
+
+    def __init__(self, delay=5.0, error_rate=0.0, expire_rate=0.0, seed=None):
+        self.delay = delay
+        self.error_rate = error_rate
+        self.expire_rate = expire_rate
+        self.random = random.Random(seed)
+        self.batches = {}
+        self._lock = threading.Lock()
+
+    def create(self, requests):
+        batch_id = f"msgbatch_{uuid.uuid4().hex[:24]}"
+        with self._lock:
+            outcomes = []
+            for request in requests:
+                roll = self.random.random()
+                outcome = ('errored' if roll < self.error_rate else
+                           'expired' if roll < self.error_rate + self.expire_rate else 'succeeded')
+                outcomes.append((request, outcome))
+            self.batches[batch_id] = {'created': time.time(), 'outcomes': outcomes}
+        return batch_id
+
+    def describe(self, batch_id, base_url):
+        batch = self.batches[batch_id]
+        ended = time.time() - batch['created'] >= self.delay
+        counts = {'processing': 0, 'succeeded': 0, 'errored': 0, 'canceled': 0, 'expired': 0}
+        for _, outcome in batch['outcomes']:
+            counts[outcome if ended else 'processing'] += 1
+        return {
+            'id': batch_id,
+            'type': 'message_batch',
+            'processing_status': 'ended' if ended else 'in_progress',
+            'request_counts': counts,
+            'created_at': _timestamp(batch['created']),
+            'expires_at': _timestamp(batch['created'] + 86400),
+            'ended_at': _timestamp(batch['created'] + self.delay) if ended else None,
+            'cancel_initiated_at': None,
+            'archived_at': None,
+            'results_url': f"{base_url}{PREFIX}/{batch_id}/results" if ended else None
+        }
+
+    def results(self, batch_id):
+        for request, outcome in self.batches[batch_id]['outcomes']:
+            result = {'type': outcome}
+            if outcome == 'succeeded':
+                params = request['params']
+                text = json.dumps({
+                    'document_type': 'stub',
+                    'summary': f"Stub analysis for {request['custom_id']}",
+                    'confidence': 0.5
+                }, indent=2)
+                result['message'] = {
+                    'id': f"msg_{uuid.uuid4().hex[:24]}",
+                    'type': 'message',
+                    'role': 'assistant',
+                    'model': params['model'],
+                    'content': [{'type': 'text', 'text': text}],
+                    'stop_reason': 'end_turn',
+                    'stop_sequence': None,
+                    'usage': {
+                        'input_tokens': sum(len(str(m['content']).split()) for m in params['messages']),
+                        'output_tokens': len(text.split())
+                    }
+                }
+            elif outcome == 'errored':
+                result['error'] = {'type': 'error', 'error': {'type': 'api_error', 'message': 'stub error'}}
+            yield {'custom_id': request['custom_id'], 'result': result}
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    stub = None
+
+    def _send_json(self, status, payload, content_type='application/json'):
+        body = payload if isinstance(payload, bytes) else json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _not_found(self):
+        self._send_json(404, {'type': 'error', 'error': {'type': 'not_found_error', 'message': self.path}})
+
+    def do_POST(self):
+        if self.path.split('?')[0] != PREFIX:
+            return self._not_found()
+        body = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))))
+        batch_id = self.stub.create(body['requests'])
+        print(f"Created {batch_id} with {len(body['requests'])} requests")
+        self._send_json(200, self.stub.describe(batch_id, self._base_url()))
+
+    def do_GET(self):
+        parts = self.path.split('?')[0][len(PREFIX):].strip('/').split('/')
+        if not self.path.startswith(PREFIX) or not parts[0] or parts[0] not in self.stub.batches:
+            return self._not_found()
+        batch_id = parts[0]
+        if len(parts) == 1:
+            return self._send_json(200, self.stub.describe(batch_id, self._base_url()))
+        if parts[1:] == ['results']:
+            lines = ''.join(json.dumps(entry) + '\n' for entry in self.stub.results(batch_id))
+            return self._send_json(200, lines.encode('utf-8'), 'application/x-jsonl')
+        self._not_found()
+
+    def _base_url(self):
+        return f"http://{self.headers.get('Host')}"
+
+    def log_message(self, format, *args):
+        pass
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local stub of the Message Batches API")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8766)
+    parser.add_argument('--delay', type=float, default=5.0, help='seconds until a batch ends')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='share of requests that error')
+    parser.add_argument('--expire-rate', type=float, default=0.0, help='share of requests that expire')
+    parser.add_argument('--seed', type=int)
+    args = parser.parse_args()
+
+    StubHandler.stub = BatchStub(args.delay, args.error_rate, args.expire_rate, args.seed)
+    server = ThreadingHTTPServer((args.host, args.port), StubHandler)
+    print(f"Message Batches stub on http://{args.host}:{args.port} (batches end after {args.delay}s)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
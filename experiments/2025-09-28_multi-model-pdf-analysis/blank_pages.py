@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+"""
+Cheap local blank and near-blank page detection ahead of the LLM.
+
+A page is checked with the cheapest signal first:
+1. Text yield - enough extracted text means the page has content.
+2. Content-stream size - a page with an empty content stream draws nothing.
+3. Ink coverage - a low-resolution grayscale rendering (pypdfium2) tells
+   a blank scan with a few specks or scanner-edge shadows from a scanned
+   page that simply has no text layer.
+
+Text pages never get rendered; the rest take a few milliseconds each.
+
+Usage:
+    python blank_pages.py scan.pdf [more.pdf ...] [--max-ink 0.001] [--dpi 20]
+"""
+
+import argparse
+import time
+from collections import Counter
+from typing import Dict, Iterator, Optional
+
+from text_extraction import PDFDocument, TextExtractor, pypdfium2
+
+# At least this many non-whitespace characters of text means the page has content
+MIN_TEXT_CHARS = 20
+
+# Share of the page covered by ink at or below which a page counts as blank;
+# specks and a lone page number stay under it, a single line of text doesn't
+MAX_INK_RATIO = 0.001
+
+# Pixels within this many gray levels of the paper tone are scanner noise, not ink
+PAPER_NOISE = 32
+
+RENDER_DPI = 20
+
+# Share of each edge left out of the ink measurement (scanner shadows, punch holes)
+EDGE_MARGIN = 0.05
+
+
+class BlankPageDetector:
+    """Flags blank and near-blank pages from text yield, content size and ink coverage."""
+
+    def __init__(self, min_text_chars: int = MIN_TEXT_CHARS, max_ink_ratio: float = MAX_INK_RATIO,
+                 dpi: int = RENDER_DPI, margin: float = EDGE_MARGIN):
+        self.min_text_chars = min_text_chars
+        self.max_ink_ratio = max_ink_ratio
+        self.dpi = dpi
+        self.margin = margin
+
+    def content_bytes(self, doc: PDFDocument, page: int) -> Optional[int]:
+        """Decoded size of a 0-based page's content stream, or None if unreadable."""
+        try:
+            contents = doc.parsed('pypdf').pages[page].get_contents()
+            return len(contents.get_data()) if contents is not None else 0
+        except Exception:
+            return None
+
+    def ink_ratio(self, doc: PDFDocument, page: int) -> Optional[float]:
+        """Darkness-weighted share of a 0-based page covered by ink, or None without a renderer.
+
+        The page is rendered in grayscale at self.dpi with the edge margins
+        cropped off. Darkness is measured against the paper tone (the most
+        common gray level), so off-white or gray scans of blank paper still
+        come out near 0.0; solid black is 1.0.
+        """
+        if not pypdfium2:
+            return None
+        try:
+            pdf_page = doc.parsed('pypdfium2')[page]
+            width, height = pdf_page.get_size()
+            crop_x, crop_y = width * self.margin, height * self.margin
+            bitmap = pdf_page.render(scale=self.dpi / 72, grayscale=True,
+                                     crop=(crop_x, crop_y, crop_x, crop_y))
+        except Exception:
+            return None
+
+        buffer = memoryview(bitmap.buffer).cast('B')
+        row_bytes, stride = bitmap.width, bitmap.stride
+        pixels = row_bytes * bitmap.height
+        if not pixels:
+            return 0.0
+        if stride == row_bytes:
+            histogram = Counter(buffer[:pixels].tobytes())
+        else:
+            histogram = Counter()
+            for row in range(bitmap.height):
+                histogram.update(buffer[row * stride:row * stride + row_bytes].tobytes())
+
+        paper = histogram.most_common(1)[0][0]
+        if paper < 128:
+            # Mostly dark page; measure against white
+            paper = 255
+        darkness = sum(count * (paper - level) for level, count in histogram.items()
+                       if level < paper - PAPER_NOISE)
+        return darkness / (paper * pixels)
+
+    def check(self, doc: PDFDocument, page: int, text: Optional[str] = None) -> Dict:
+        """Classify a 0-based page; text is its extracted text if already known.
+
+        Returns {'page_number', 'blank', 'reason', 'text_chars',
+        'content_bytes', 'ink_ratio', 'seconds'}. Measurements that weren't
+        needed for the decision are None.
+        """
+        start = time.perf_counter()
+        if text is None:
+            text = doc.extract_page(page)['text']
+        text_chars = len(''.join(text.split()))
+        content_bytes = ink = None
+
+        if text_chars >= self.min_text_chars:
+            blank, reason = False, 'text'
+        else:
+            content_bytes = self.content_bytes(doc, page)
+            if content_bytes == 0:
+                blank, reason = True, 'empty content stream'
+            else:
+                ink = self.ink_ratio(doc, page)
+                if ink is None:
+                    # Without a rendering an image-only page can't be judged, so keep it
+                    blank, reason = False, 'not rendered'
+                elif ink <= self.max_ink_ratio:
+                    blank, reason = True, 'no ink' if text_chars == 0 else 'near-blank'
+                else:
+                    blank, reason = False, 'ink'
+
+        return {
+            'page_number': page + 1,
+            'blank': blank,
+            'reason': reason,
+            'text_chars': text_chars,
+            'content_bytes': content_bytes,
+            'ink_ratio': round(ink, 5) if ink is not None else None,
+            'seconds': time.perf_counter() - start
+        }
+
+    def iter_checks(self, doc: PDFDocument) -> Iterator[Dict]:
+        """check() every page of a document, with text from its fallback extraction."""
+        for page in doc.iter_pages():
+            yield self.check(doc, page['page_number'] - 1, page['text'])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Flag blank and near-blank pages in PDFs")
+    parser.add_argument('pdfs', nargs='+')
+    parser.add_argument('--min-text', type=int, default=MIN_TEXT_CHARS,
+                        help='characters of text that make a page non-blank')
+    parser.add_argument('--max-ink', type=float, default=MAX_INK_RATIO,
+                        help='ink coverage at or below which a page is blank')
+    parser.add_argument('--dpi', type=int, default=RENDER_DPI, help='rendering resolution for ink coverage')
+    args = parser.parse_args()
+
+    if not pypdfium2:
+        print("Warning: pypdfium2 not installed; image-only pages can't be checked (pip install pypdfium2)")
+
+    detector = BlankPageDetector(args.min_text, args.max_ink, args.dpi)
+    extractor = TextExtractor()
+    for pdf_path in args.pdfs:
+        print(f"\n{pdf_path}")
+        print(f"  {'page':>4} {'blank':>5} {'text':>6} {'content':>8} {'ink':>8} {'ms':>6}  reason")
+        with extractor.open(pdf_path) as doc:
+            for result in detector.iter_checks(doc):
+                content = result['content_bytes'] if result['content_bytes'] is not None else '-'
+                ink = f"{result['ink_ratio']:.4f}" if result['ink_ratio'] is not None else '-'
+                print(f"  {result['page_number']:>4} {'yes' if result['blank'] else 'no':>5} "
+                      f"{result['text_chars']:>6} {content:>8} {ink:>8} {result['seconds'] * 1000:>6.1f}  "
+                      f"{result['reason']}")
+
+
+if __name__ == '__main__':
+    main()
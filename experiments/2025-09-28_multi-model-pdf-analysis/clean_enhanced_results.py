@@ -4,30 +4,9 @@ Extract and display clean enhanced analysis results
 """
 
 import json
-import re
+from json_stream import parse_json_response
 from llm_document_analyzer import DocumentAnalyzer
 
-def extract_json_from_response(response_text):
-    """Extract JSON from response that may have extra text."""
-    # Find the first { and last }
-    start = response_text.find('{')
-    if start == -1:
-        return None
-
-    # Count braces to find the matching closing brace
-    brace_count = 0
-    end = start
-    for i, char in enumerate(response_text[start:], start):
-        if char == '{':
-            brace_count += 1
-        elif char == '}':
-            brace_count -= 1
-            if brace_count == 0:
-                end = i + 1
-                break
-
-    return response_text[start:end]
-
 def run_clean_analysis():
     """Run enhanced analysis and display clean results."""
 
@@ -45,15 +24,13 @@ def run_clean_analysis():
             return
 
         response_text = result.get('response', '')
-        json_text = extract_json_from_response(response_text)
+        analysis, json_text, extra_text = parse_json_response(response_text)
 
         if not json_text:
             print("❌ No JSON found in response")
             return
 
         try:
-            analysis = json.loads(json_text)
-
             print("✅ SUCCESSFUL ANALYSIS:")
             print(f"🎯 Confidence: {analysis['analysis_confidence']}%")
             print(f"📄 Documents: {analysis['document_count']}")
@@ -92,12 +69,10 @@ def run_clean_analysis():
             print()
 
             # Check for extra observations
-            if len(response_text) > len(json_text):
-                extra_text = response_text[len(json_text):].strip()
-                if extra_text:
-                    print("💡 ADDITIONAL OBSERVATIONS:")
-                    print(f"   {extra_text}")
-                    print()
+            if extra_text:
+                print("💡 ADDITIONAL OBSERVATIONS:")
+                print(f"   {extra_text}")
+                print()
 
             # Save clean results
             clean_results = {
@@ -105,7 +80,7 @@ def run_clean_analysis():
                 "model": "claude-3-5-haiku-latest",
                 "pdf": "WESTFIELD_ABBYY_OCR.pdf",
                 "analysis": analysis,
-                "extra_observations": response_text[len(json_text):].strip() if len(response_text) > len(json_text) else None
+                "extra_observations": extra_text or None
             }
 
             with open("enhanced_analysis_clean.json", 'w') as f:
@@ -113,8 +88,8 @@ def run_clean_analysis():
 
             print("💾 Clean results saved to: enhanced_analysis_clean.json")
 
-        except json.JSONDecodeError as e:
-            print(f"❌ JSON parsing failed: {e}")
+        except (KeyError, TypeError) as e:
+            print(f"❌ Unexpected analysis structure: {e}")
             print("Extracted JSON text:")
             print(json_text)
 
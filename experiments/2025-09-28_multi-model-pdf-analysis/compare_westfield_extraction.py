@@ -3,7 +3,7 @@
 Compare text extraction between WESTFIELD.pdf and WESTFIELD_ABBYY_OCR.pdf
 """
 
-import pypdf
+from text_extraction import TextExtractor
 
 def extract_and_compare():
     files = [
@@ -12,6 +12,7 @@ def extract_and_compare():
     ]
 
     results = {}
+    extractor = TextExtractor()
 
     for pdf_path in files:
         filename = pdf_path.split('/')[-1]
@@ -20,25 +21,27 @@ def extract_and_compare():
         print('='*60)
 
         try:
-            with open(pdf_path, 'rb') as file:
-                pdf_reader = pypdf.PdfReader(file)
+            with extractor.open(pdf_path) as doc:
                 pages_data = []
                 total_chars = 0
+                total_pages = doc.page_count()
 
-                print(f"Total pages: {len(pdf_reader.pages)}")
+                print(f"Total pages: {total_pages}")
 
-                for i, page in enumerate(pdf_reader.pages, 1):
-                    text = page.extract_text()
-                    char_count = len(text)
+                for page in doc.iter_pages():
+                    i = page['page_number']
+                    text = page['text']
+                    char_count = page['char_count']
                     total_chars += char_count
 
                     pages_data.append({
                         'page': i,
                         'char_count': char_count,
+                        'extractor': page['extractor'],
                         'text': text
                     })
 
-                    print(f"\nPage {i}: {char_count} characters")
+                    print(f"\nPage {i}: {char_count} characters (via {page['extractor']}, tried {', '.join(page['tried'])})")
                     if char_count > 0:
                         # Show first 200 characters
                         preview = text[:200].replace('\n', '\\n')
@@ -49,14 +52,14 @@ def extract_and_compare():
                         print("No text extracted")
 
                 results[filename] = {
-                    'total_pages': len(pdf_reader.pages),
+                    'total_pages': total_pages,
                     'total_characters': total_chars,
                     'pages': pages_data
                 }
 
                 print(f"\nSUMMARY for {filename}:")
                 print(f"  Total characters extracted: {total_chars}")
-                print(f"  Average per page: {total_chars / len(pdf_reader.pages):.1f}")
+                print(f"  Average per page: {total_chars / total_pages:.1f}")
 
         except Exception as e:
             print(f"Error processing {filename}: {e}")
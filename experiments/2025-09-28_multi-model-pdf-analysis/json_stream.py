@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+"""
+Incremental, string-aware JSON object extraction from LLM responses.
+Models often wrap the JSON answer in prose ("Here is the analysis: {...}
+Additional observations: ..."). JSONObjectExtractor is fed response text in
+any chunking, tracks brace depth while skipping braces inside JSON strings,
+and parses the object as soon as its closing brace arrives, so a streamed
+response can be acted on without waiting for trailing commentary.
+"""
+
+import json
+import re
+import time
+from typing import Any, Callable, Dict, Optional, Tuple
+
+# Characters that can change the scanner state, outside and inside strings
+_STRUCTURAL = re.compile(r'[{}\[\]",]')
+_STRING_SPECIAL = re.compile(r'["\\]')
+
+
+class JSONObjectExtractor:
+    """Find and parse the first complete top-level JSON object in a text stream.
+
+    Call feed() with each chunk; it returns the parsed object once the
+    object's closing brace has been seen (and None before that). Text before
+    the object is kept in `prefix` and anything after it in `trailing`.
+
+    Top-level fields are parsed as soon as each one is complete; they are
+    collected in `fields`, with perf_counter completion times in
+    `field_times`, and passed to on_field(name, value) if given.
+    """
+
+    def __init__(self, on_field: Optional[Callable[[str, Any], None]] = None):
+        self.on_field = on_field
+        self.fields: Dict[str, Any] = {}
+        self.field_times: Dict[str, float] = {}
+        self.buffer = ''
+        self.result: Optional[Any] = None
+        self.done = False
+        self.error: Optional[str] = None
+        self._start = -1
+        self._end = -1
+        self._pos = 0
+        self._depth = 0
+        self._in_string = False
+        self._escaped = False
+        self._field_start = -1
+
+    def feed(self, chunk: str) -> Optional[Any]:
+        """Add text; return the parsed object when it completes, else None."""
+        self.buffer += chunk
+        if self.done:
+            return None
+        return self._scan()
+
+    def finish(self) -> Optional[Any]:
+        """Call at the end of the stream; returns the object or None.
+
+        An unbalanced brace in prose before the JSON keeps the scan from
+        ever closing, so retry from each later '{' before giving up.
+        """
+        while not self.done and self._start != -1:
+            self._restart_after(self._start)
+            self._scan()
+        return self.result
+
+    def _restart_after(self, position: int):
+        # Fields seen in a candidate that turned out not to be the object
+        self.fields.clear()
+        self.field_times.clear()
+        self._pos = position + 1
+        self._start = -1
+        self._in_string = False
+        self._escaped = False
+
+    def _scan(self) -> Optional[Any]:
+        buffer = self.buffer
+        while True:
+            if self._start == -1:
+                start = buffer.find('{', self._pos)
+                if start == -1:
+                    self._pos = len(buffer)
+                    return None
+                self._start = start
+                self._pos = start
+                self._depth = 0
+                self._field_start = start + 1
+
+            if self._in_string:
+                # A backslash at the very end of a chunk escapes the first
+                # character of the next one
+                if self._escaped:
+                    if self._pos >= len(buffer):
+                        return None
+                    self._pos += 1
+                    self._escaped = False
+                match = _STRING_SPECIAL.search(buffer, self._pos)
+                if not match:
+                    self._pos = len(buffer)
+                    return None
+                self._pos = match.end()
+                if match.group() == '\\':
+                    self._escaped = True
+                else:
+                    self._in_string = False
+                continue
+
+            match = _STRUCTURAL.search(buffer, self._pos)
+            if not match:
+                self._pos = len(buffer)
+                return None
+            self._pos = match.end()
+            char = match.group()
+            if char == '"':
+                self._in_string = True
+            elif char in '{[':
+                self._depth += 1
+            elif char == ',':
+                if self._depth == 1:
+                    self._field_done(match.start())
+            else:
+                self._depth -= 1
+                if self._depth == 0 and char == '}':
+                    self._field_done(match.start())
+                    candidate = buffer[self._start:self._pos]
+                    try:
+                        self.result = json.loads(candidate)
+                    except json.JSONDecodeError as e:
+                        # A brace in the surrounding prose; look for the next object
+                        self.error = str(e)
+                        self._restart_after(self._start)
+                        continue
+                    self.done = True
+                    self.error = None
+                    self._end = self._pos
+                    return self.result
+
+    def _field_done(self, end: int):
+        """Parse the top-level `"name": value` ending at end, if there is one."""
+        segment = self.buffer[self._field_start:end]
+        self._field_start = end + 1
+        if not segment.strip():
+            return
+        try:
+            field = json.loads('{' + segment + '}')
+        except json.JSONDecodeError:
+            return
+        for name, value in field.items():
+            if name not in self.fields:
+                self.fields[name] = value
+                self.field_times[name] = time.perf_counter()
+                if self.on_field:
+                    self.on_field(name, value)
+
+    @property
+    def json_text(self) -> Optional[str]:
+        return self.buffer[self._start:self._end] if self.done else None
+
+    @property
+    def prefix(self) -> str:
+        return self.buffer[:self._start] if self._start != -1 else self.buffer
+
+    @property
+    def trailing(self) -> str:
+        return self.buffer[self._end:] if self.done else ''
+
+
+def parse_json_response(response_text: str) -> Tuple[Optional[Any], Optional[str], str]:
+    """Return (object, json_text, trailing text) for the first JSON object in a response.
+
+    object and json_text are None if no complete object was found.
+    """
+    extractor = JSONObjectExtractor()
+    extractor.feed(response_text)
+    extractor.finish()
+    return extractor.result, extractor.json_text, extractor.trailing.strip()
+
+
+def extract_json_from_response(response_text: str) -> Optional[str]:
+    """Extract the JSON object text from a response that may have extra text."""
+    return parse_json_response(response_text)[1]
@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+"""
+Content-addressed, on-disk cache for LLM responses.
+Keys are a hash of everything that determines the answer (model, sampling
+settings and the fully formatted prompt), so reprocessing a document only
+pays for calls whose text or prompt template actually changed.
+"""
+
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Optional
+
+# put() lets the table grow this share past max_entries before trimming it
+# back, so the LRU scan runs once per batch of inserts rather than per insert
+EVICTION_SLACK = 0.1
+# With no max_entries, expired entries are swept every this many puts
+EVICTION_INTERVAL = 1000
+
+
+class LLMResultCache:
+    """SQLite-backed response cache with size/age eviction and hit/miss counters."""
+
+    def __init__(self, db_path: str, max_entries: Optional[int] = 10000,
+                 max_age_seconds: Optional[float] = None):
+        """Open (or create) the cache database at db_path."""
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self.max_entries = max_entries
+        self.max_age_seconds = max_age_seconds
+        self.hits = 0
+        self.misses = 0
+
+        # Analyzer calls may come from worker threads, so share one connection
+        # behind a lock rather than one connection per thread
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.db_path), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                model TEXT,
+                response TEXT NOT NULL,
+                usage TEXT,
+                created REAL NOT NULL,
+                last_used REAL NOT NULL
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_responses_last_used ON responses(last_used)")
+        self._conn.commit()
+
+        # Upper bound on the row count (a replaced key is counted again);
+        # recounted exactly whenever eviction runs
+        self._entries = self._conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+        self._puts_since_eviction = 0
+        self._evict_above = (max_entries + max(1, int(max_entries * EVICTION_SLACK))
+                             if max_entries is not None else None)
+
+    @staticmethod
+    def make_key(model: str, temperature: float, max_tokens: int, prompt: str, stream: bool = False) -> str:
+        """Hash the inputs that determine a response into a cache key.
+
+        Streamed responses cut off once their JSON is complete are stored
+        under stream=True, apart from full responses to the same prompt.
+        """
+        request = {
+            'model': model,
+            'temperature': temperature,
+            'max_tokens': max_tokens,
+            'prompt': prompt
+        }
+        if stream:
+            request['stream'] = True
+        payload = json.dumps(request, sort_keys=True)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def get(self, key: str) -> Optional[Dict]:
+        """Return the cached {'response', 'usage'} for key, or None on a miss."""
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT response, usage, created FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+
+            if row and self.max_age_seconds is not None and now - row[2] > self.max_age_seconds:
+                self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                self._conn.commit()
+                row = None
+
+            if not row:
+                self.misses += 1
+                return None
+
+            self._conn.execute("UPDATE responses SET last_used = ? WHERE key = ?", (now, key))
+            self._conn.commit()
+            self.hits += 1
+
+        return {
+            'response': row[0],
+            'usage': json.loads(row[1]) if row[1] else None
+        }
+
+    def put(self, key: str, model: str, response: str, usage: Optional[Dict] = None):
+        """Store a response; evicts once the cache is EVICTION_SLACK over max_entries."""
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, model, response, usage, created, last_used) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (key, model, response, json.dumps(usage) if usage else None, now, now)
+            )
+            self._entries += 1
+            self._puts_since_eviction += 1
+            if ((self._evict_above is not None and self._entries > self._evict_above)
+                    or (self._evict_above is None and self.max_age_seconds is not None
+                        and self._puts_since_eviction >= EVICTION_INTERVAL)):
+                self._evict_locked(now)
+            self._conn.commit()
+
+    def evict(self):
+        """Drop expired entries and trim to max_entries (least recently used first)."""
+        with self._lock:
+            self._evict_locked(time.time())
+            self._conn.commit()
+
+    def _evict_locked(self, now: float):
+        if self.max_age_seconds is not None:
+            self._conn.execute("DELETE FROM responses WHERE created < ?", (now - self.max_age_seconds,))
+
+        if self.max_entries is not None:
+            self._conn.execute("""
+                DELETE FROM responses WHERE key IN (
+                    SELECT key FROM responses ORDER BY last_used DESC LIMIT -1 OFFSET ?
+                )
+            """, (self.max_entries,))
+
+        self._entries = self._conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+        self._puts_since_eviction = 0
+
+    def clear(self):
+        """Remove every cached response."""
+        with self._lock:
+            self._conn.execute("DELETE FROM responses")
+            self._conn.commit()
+            self._entries = 0
+
+    def stats(self) -> Dict:
+        """Return hit/miss counters and current cache size."""
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+            'entries': entries,
+            'db_path': str(self.db_path)
+        }
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -7,8 +7,20 @@ Tests different approaches for PDF analysis using Anthropic's API
 import json
 import os
 import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
 from pathlib import Path
-from typing import Dict, List, Optional, Tuple
+from string import Formatter
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple, Union
+
+from blank_pages import BlankPageDetector
+from json_stream import JSONObjectExtractor
+from llm_cache import LLMResultCache
+from page_dedup import PageDeduplicator
+from rate_limit import Permit, RateLimiter
+from text_extraction import ExtractionCache, TextExtractor, extract_page_range, file_sha256
+from token_budget import (DEFAULT_TOKEN_BUDGET, TokenCounter, clean_page_text, pack_pages,
+                          reported_input_tokens, trim_pages, truncate_to_tokens)
 
 try:
     import anthropic
@@ -17,25 +29,135 @@ except ImportError:
     print("Error: anthropic package not installed. Run: pip install anthropic")
     exit(1)
 
-try:
-    import PyPDF2
-except ImportError:
-    print("Warning: PyPDF2 not installed. Text extraction method will be skipped.")
-    print("To install: pip install PyPDF2")
-    PyPDF2 = None
+USAGE_FIELDS = ('input_tokens', 'output_tokens', 'cache_creation_input_tokens', 'cache_read_input_tokens')
+
+# Shortest prefix the API will cache, by model name fragment (first match
+# wins); shorter prefixes are sent uncached whatever cache_control says
+MIN_CACHEABLE_TOKENS = (('haiku-4-5', 4096), ('opus-4-5', 4096), ('haiku', 2048))
+DEFAULT_MIN_CACHEABLE_TOKENS = 1024
+
+
+def min_cacheable_tokens(model: str) -> int:
+    """The API's minimum cacheable prompt prefix for model, in tokens."""
+    return next((tokens for fragment, tokens in MIN_CACHEABLE_TOKENS if fragment in model),
+                DEFAULT_MIN_CACHEABLE_TOKENS)
+
+
+def split_prompt_template(template: str) -> Tuple[str, str]:
+    """Split a str.format template into (static prefix, per-call template).
+
+    The prefix is the literal text up to the line holding the first
+    placeholder, unescaped, so it is byte-identical on every call and can be
+    cached; prefix + rest.format(...) == template.format(...).
+    """
+    literal = ''
+    for text, field_name, _, _ in Formatter().parse(template):
+        literal += text
+        if field_name is not None:
+            break
+    else:
+        return literal, ''
+
+    prefix = literal[:literal.rfind('\n') + 1]
+    raw_length = len(prefix) + prefix.count('{') + prefix.count('}')
+    return prefix, template[raw_length:]
+
+
+def usage_dict(usage) -> Optional[Dict]:
+    """Token usage from an API response, including prompt cache reads and writes."""
+    if usage is None:
+        return None
+    return {field: getattr(usage, field, None) or 0 for field in USAGE_FIELDS}
+
+
+def sum_usage(usages: List[Optional[Dict]]) -> Dict:
+    """Add up token usage dicts, e.g. over the page calls of one document."""
+    return {field: sum((usage or {}).get(field) or 0 for usage in usages) for field in USAGE_FIELDS}
+
+
+def skipped_page_note(skip: Dict) -> str:
+    """Stand-in text for a page left out as blank or as a duplicate."""
+    if 'blank' in skip:
+        return "[Blank page - omitted]"
+    match = skip['duplicate_of']
+    if match['same_document']:
+        return f"[Duplicate of page {match['page_number']} - text omitted]"
+    return (f"[Duplicate of page {match['page_number']} of previously processed document "
+            f"{match['doc_id'][:12]} - text omitted]")
+
+
+def analysis_pages(analysis: Dict) -> List[int]:
+    """[first, last] page covered by a page, chunk or partial aggregate analysis."""
+    if 'page' in analysis:
+        return [analysis['page'], analysis['page']]
+    return analysis['pages']
+
+
+def skipped_pages_summary(skipped: Dict[int, Dict]) -> Dict:
+    """{'blank_pages': [...], 'duplicate_pages': {page: match}} for a result dict."""
+    return {
+        "blank_pages": sorted(page for page, skip in skipped.items() if 'blank' in skip),
+        "duplicate_pages": {page: skip['duplicate_of'] for page, skip in sorted(skipped.items())
+                            if 'duplicate_of' in skip}
+    }
 
 
 class DocumentAnalyzer:
     """Analyzes PDF documents using different LLM models and input methods."""
 
-    def __init__(self, api_key: Optional[str] = None):
-        """Initialize with Anthropic API key from environment or parameter."""
+    def __init__(self, api_key: Optional[str] = None, max_concurrent_pages: int = 1,
+                 cache: Optional[LLMResultCache] = None, extractor: Optional[TextExtractor] = None,
+                 stream: bool = False, base_url: Optional[str] = None, prompt_caching: bool = True,
+                 deduplicator: Optional[PageDeduplicator] = None,
+                 blank_detector: Optional[BlankPageDetector] = None,
+                 token_budget: int = DEFAULT_TOKEN_BUDGET, token_counter: Optional[TokenCounter] = None,
+                 exact_token_counts: bool = False, rate_limiter: Optional[RateLimiter] = None):
+        """Initialize with Anthropic API key from environment or parameter.
+
+        max_concurrent_pages bounds how many page analysis calls are in flight
+        at once in analyze_page_by_page (1 = sequential, the original behavior).
+        cache, if given, is consulted before every messages.create call.
+        extractor does the PDF text extraction (default: all installed
+        extractors with per-page fallback, memoized in memory for this run).
+        stream=True streams responses and stops reading as soon as the JSON
+        answer is complete, dropping any commentary the model adds after it.
+        base_url points the client at another API endpoint, e.g. a local stub.
+        prompt_caching marks each prompt's static instruction prefix with
+        cache_control so repeated calls read it from the API's prompt cache,
+        when the prefix is long enough for the model to cache (see
+        caches_prefix).
+        deduplicator, if given, drops pages repeating an earlier page of the
+        same scan or of any indexed document before they reach a prompt, and
+        indexes every analyzed document's pages.
+        blank_detector, if given, leaves blank and near-blank pages out of
+        prompts and the page-by-page fan-out.
+        token_budget caps the estimated input tokens of any one prompt; larger
+        documents are analyzed in chunks and aggregated (see
+        analyze_with_text_extraction). token_counter makes the estimates and
+        learns from reported usage; exact_token_counts asks the API's
+        count_tokens endpoint instead before deciding whether to chunk.
+        rate_limiter paces and retries every messages call (see
+        rate_limit.RateLimiter); share one between analyzers that share an
+        API key. By default each analyzer gets its own.
+        """
         self.api_key = api_key or os.getenv('ANTHROPIC_API_KEY')
         if not self.api_key:
             raise ValueError("ANTHROPIC_API_KEY environment variable not set")
 
-        self.client = Anthropic(api_key=self.api_key)
+        # RateLimiter does the retrying; SDK retries would multiply its attempts
+        self.client = Anthropic(api_key=self.api_key, base_url=base_url, max_retries=0)
         self.prompt_dir = Path(__file__).parent / "prompts"
+        self.max_concurrent_pages = max(1, max_concurrent_pages)
+        self.cache = cache
+        self.extractor = extractor or TextExtractor()
+        self.stream = stream
+        self.prompt_caching = prompt_caching
+        self.deduplicator = deduplicator
+        self.blank_detector = blank_detector
+        self.token_budget = token_budget
+        self.token_counter = token_counter or TokenCounter()
+        self.exact_token_counts = exact_token_counts
+        self.rate_limiter = rate_limiter or RateLimiter()
 
     def load_prompt(self, prompt_name: str) -> str:
         """Load a prompt template from the prompts directory."""
@@ -45,66 +167,378 @@ class DocumentAnalyzer:
 
         return prompt_file.read_text().strip()
 
-    def extract_text_from_pdf(self, pdf_path: str) -> List[Dict[str, str]]:
-        """Extract text from PDF using PyPDF2."""
-        if not PyPDF2:
-            return []
+    def load_prompt_parts(self, prompt_name: str) -> Tuple[str, str]:
+        """Load a prompt template as (static prefix, per-call template)."""
+        return split_prompt_template(self.load_prompt(prompt_name))
+
+    def caches_prefix(self, prefix: str, model: str) -> bool:
+        """True if prompt caching is on and prefix is long enough for model to cache.
+
+        Uses the local token estimate, so it costs no API call.
+        """
+        return (self.prompt_caching and bool(prefix)
+                and self.token_counter.estimate(prefix) >= min_cacheable_tokens(model))
+
+    def message_content(self, prompt: str, cached_prefix: str = '', model: str = '') -> Union[str, List[Dict]]:
+        """User message content for cached_prefix + prompt.
+
+        When model can cache the prefix (caches_prefix), it is its own text
+        block with a cache_control breakpoint, so calls sharing it (every
+        page of a document, every document in a run) read it from the cache.
+        Shorter prefixes are sent as plain text.
+        """
+        if not cached_prefix:
+            return prompt
+        if not self.caches_prefix(cached_prefix, model):
+            return cached_prefix + prompt
+        return [
+            {"type": "text", "text": cached_prefix, "cache_control": {"type": "ephemeral"}},
+            {"type": "text", "text": prompt}
+        ]
+
+    def count_input_tokens(self, text: str, model: str) -> int:
+        """Input tokens of a one-message prompt, from count_tokens or the local estimate.
+
+        count_tokens (with exact_token_counts) needs a network round trip but
+        no spend; its answers also calibrate the local estimate. Falls back to
+        the estimate if the endpoint fails.
+        """
+        if self.exact_token_counts:
+            try:
+                counted = self.client.messages.count_tokens(
+                    model=model, messages=[{"role": "user", "content": text}]
+                ).input_tokens
+                self.token_counter.observe(self.token_counter.raw_tokens(text), counted)
+                return counted
+            except Exception as e:
+                print(f"Warning: count_tokens failed, using the local estimate: {e}")
+        return self.token_counter.estimate(text)
+
+    def _create_message(self, prompt: str, model: str, max_tokens: int,
+                        temperature: float = 0.1, stream: Optional[bool] = None,
+                        on_field: Optional[Callable[[str, Any], None]] = None,
+                        cached_prefix: str = '') -> Dict:
+        """Send a single-prompt request, serving it from the cache when possible.
+
+        The prompt sent is cached_prefix + prompt, with the prefix marked for
+        prompt caching (see message_content).
+
+        Returns {'text', 'usage', 'cached', 'estimated_input_tokens'}. The
+        request goes through self.rate_limiter, which retries rate-limit,
+        overload and connection errors; other errors, and the last one once
+        retries run out, propagate to the caller. usage includes
+        cache_creation_input_tokens and cache_read_input_tokens, and calibrates
+        the token counter against the estimate made before the call.
+        When streaming (stream, defaulting to self.stream) the result also has
+        'streaming' timings. on_field(name, value) is called for each top-level
+        field of the JSON answer as soon as it is complete, at most once per
+        field: if the rate limiter retries a stream, fields already reported
+        by the failed attempt are not reported again.
+        """
+        stream = self.stream if stream is None else stream
+        raw_tokens = self.token_counter.raw_tokens(cached_prefix + prompt)
+        estimated_tokens = self.token_counter.scaled(raw_tokens)
+
+        cache_key = stream_key = None
+        if self.cache:
+            # A full response answers a streamed request too; only answers a
+            # stream cut off early are kept under the stream key
+            cache_key = LLMResultCache.make_key(model, temperature, max_tokens, cached_prefix + prompt)
+            cached = self.cache.get(cache_key)
+            if stream:
+                stream_key = LLMResultCache.make_key(model, temperature, max_tokens, cached_prefix + prompt, True)
+                cached = cached or self.cache.get(stream_key)
+            if cached:
+                if on_field:
+                    JSONObjectExtractor(on_field=on_field).feed(cached['response'])
+                return {"text": cached['response'], "usage": cached['usage'], "cached": True,
+                        "estimated_input_tokens": estimated_tokens}
+
+        content = self.message_content(prompt, cached_prefix, model)
+
+        if stream:
+            if on_field:
+                reported = set()
+                report_field = on_field
+
+                def on_field(name, value):
+                    if name not in reported:
+                        reported.add(name)
+                        report_field(name, value)
+
+            result = self.rate_limiter.call(
+                lambda permit: self._stream_message(content, model, max_tokens, temperature, on_field, permit),
+                input_tokens=estimated_tokens, max_tokens=max_tokens
+            )
+            result['estimated_input_tokens'] = estimated_tokens
+            self.token_counter.observe(raw_tokens, reported_input_tokens(result['usage']))
+            if self.cache:
+                stopped_early = result.get('streaming', {}).get('stopped_early')
+                self.cache.put(stream_key if stopped_early else cache_key, model, result['text'], result['usage'])
+            return result
+
+        def send(permit: Permit):
+            raw_response = self.client.messages.with_raw_response.create(
+                model=model,
+                max_tokens=max_tokens,
+                temperature=temperature,
+                messages=[{"role": "user", "content": content}]
+            )
+            permit.observe(raw_response.headers)
+            response = raw_response.parse()
+            permit.settle(usage_dict(getattr(response, 'usage', None)))
+            return response
+
+        response = self.rate_limiter.call(send, input_tokens=estimated_tokens, max_tokens=max_tokens)
+
+        text = response.content[0].text
+        usage = usage_dict(getattr(response, 'usage', None))
+        self.token_counter.observe(raw_tokens, reported_input_tokens(usage))
+
+        if self.cache:
+            self.cache.put(cache_key, model, text, usage)
+
+        return {"text": text, "usage": usage, "cached": False, "estimated_input_tokens": estimated_tokens}
+
+    def _stream_message(self, content: Union[str, List[Dict]], model: str, max_tokens: int, temperature: float,
+                        on_field: Optional[Callable[[str, Any], None]] = None,
+                        permit: Optional[Permit] = None) -> Dict:
+        """Stream a response, closing the stream once its JSON object is complete.
+
+        Times are seconds from the request: first token, first complete
+        top-level field (e.g. document_type) and complete JSON object. When
+        the stream is closed early, output_tokens is only what the API had
+        reported by then, not what was generated. permit, from
+        RateLimiter.call, gets the response headers and usage.
+        """
+        extractor = JSONObjectExtractor(on_field=on_field)
+        start = time.perf_counter()
+        first_token = None
+        stopped_early = False
+
+        with self.client.messages.stream(
+            model=model,
+            max_tokens=max_tokens,
+            temperature=temperature,
+            messages=[{"role": "user", "content": content}]
+        ) as response_stream:
+            if permit:
+                permit.observe(response_stream.response.headers)
+            for text in response_stream.text_stream:
+                if first_token is None:
+                    first_token = time.perf_counter()
+                if extractor.feed(text) is not None:
+                    stopped_early = True
+                    break
+            json_done = time.perf_counter()
+            message = (response_stream.current_message_snapshot if stopped_early
+                       else response_stream.get_final_message())
+
+        first_field = min(extractor.field_times.items(), key=lambda item: item[1], default=None)
+        usage = usage_dict(getattr(message, 'usage', None))
+        if permit:
+            permit.settle(usage)
+
+        return {
+            # Drop the partial commentary read before the stream was closed
+            "text": extractor.prefix + extractor.json_text if stopped_early else extractor.buffer,
+            "usage": usage,
+            "cached": False,
+            "streaming": {
+                "time_to_first_token": first_token - start if first_token else None,
+                "first_field": first_field[0] if first_field else None,
+                "time_to_first_field": first_field[1] - start if first_field else None,
+                "time_to_json": json_done - start if extractor.done else None,
+                "total_time": time.perf_counter() - start,
+                "stopped_early": stopped_early
+            }
+        }
+
+    def iter_text_from_pdf(self, pdf_path: str, processes: Optional[int] = None,
+                           pages_per_chunk: int = 8) -> Iterator[Dict]:
+        """Yield extracted pages in order as soon as each one is decoded.
+
+        With processes > 1, page ranges of pages_per_chunk pages are extracted
+        across a ProcessPoolExecutor. At most two ranges per process are in
+        flight so memory stays bounded on very long documents.
+        """
+        if not self.extractor.extractors:
+            print("Warning: no PDF text extractor installed (pip install pypdf pdfplumber)")
+            return
 
-        pages = []
         try:
-            with open(pdf_path, 'rb') as file:
-                pdf_reader = PyPDF2.PdfReader(file)
-                for i, page in enumerate(pdf_reader.pages, 1):
-                    text = page.extract_text()
-                    pages.append({
-                        'page_number': i,
-                        'text': text,
-                        'char_count': len(text)
-                    })
+            with self.extractor.open(pdf_path) as doc:
+                if not processes or processes <= 1:
+                    yield from doc.iter_pages()
+                    return
+                total_pages = doc.page_count()
+                file_hash = doc.file_hash
+
+            ranges = deque(
+                (start, start + pages_per_chunk)
+                for start in range(0, total_pages, pages_per_chunk)
+            )
+            worker_args = self.extractor.worker_args()
+            with ProcessPoolExecutor(max_workers=processes) as executor:
+                in_flight = deque()
+                while ranges or in_flight:
+                    while ranges and len(in_flight) < processes * 2:
+                        start, end = ranges.popleft()
+                        in_flight.append(executor.submit(
+                            extract_page_range, pdf_path, start, end, file_hash, **worker_args
+                        ))
+                    yield from in_flight.popleft().result()
+
         except Exception as e:
             print(f"Error extracting text from PDF: {e}")
 
-        return pages
-
-    def analyze_with_text_extraction(self, pdf_path: str, model: str = "claude-3-5-haiku-latest") -> Dict:
-        """Analyze PDF by first extracting text, then sending to LLM."""
-        start_time = time.time()
+    def extract_text_from_pdf(self, pdf_path: str, processes: Optional[int] = None) -> List[Dict[str, str]]:
+        """Extract text from PDF, falling back per page to slower extractors."""
+        return list(self.iter_text_from_pdf(pdf_path, processes=processes))
+
+    def iter_prescreened_pages(self, pdf_path: str,
+                               pages: Iterable[Dict]) -> Iterator[Tuple[Dict, Optional[Dict]]]:
+        """Yield (page, skip) for extracted pages, checking each as it arrives.
+
+        skip is None for pages to analyze, {'blank': check} for pages the
+        blank detector flags, or {'duplicate_of': match} for pages the
+        deduplicator matches. Once all pages are through, the document's
+        pages are added to the deduplication index.
+        """
+        all_pages = []
+
+        def collect(pages):
+            for page in pages:
+                all_pages.append(page)
+                yield page
+
+        doc_id = None
+        if self.deduplicator:
+            doc_id = file_sha256(pdf_path)
+            matched_pages = self.deduplicator.iter_matches(doc_id, collect(pages))
+        else:
+            matched_pages = ((page, None) for page in collect(pages))
 
-        # Extract text
+        doc = self.extractor.open(pdf_path) if self.blank_detector else None
+        try:
+            for page, match in matched_pages:
+                skip = None
+                if doc:
+                    check = self.blank_detector.check(doc, page['page_number'] - 1, page['text'])
+                    if check['blank']:
+                        skip = {"blank": check}
+                if not skip and match:
+                    skip = {"duplicate_of": match}
+                yield page, skip
+        finally:
+            if doc:
+                doc.close()
+
+        if self.deduplicator:
+            self.deduplicator.add_document(doc_id, all_pages)
+
+    def prescreen_pages(self, pdf_path: str) -> Tuple[List[Dict], Dict[int, Dict]]:
+        """Extract all pages; returns (pages, {page_number: skip}) for blank and duplicate pages."""
         pages = self.extract_text_from_pdf(pdf_path)
-        if not pages:
-            return {"error": "Failed to extract text from PDF"}
+        skipped = {page['page_number']: skip for page, skip in self.iter_prescreened_pages(pdf_path, pages) if skip}
+        return pages, skipped
+
+    @staticmethod
+    def page_sections(pages: List[Dict], skipped: Optional[Dict[int, Dict]] = None) -> List[str]:
+        """Each page's marker and text for text_extraction_analysis.
+
+        Skipped pages keep their page marker, with a note in place of the
+        text, so the model can still report them as blank or duplicates.
+        """
+        skipped = skipped or {}
+        return [
+            f"=== PAGE {page['page_number']} ===\\n"
+            f"{skipped_page_note(skipped[page['page_number']]) if page['page_number'] in skipped else page['text']}"
+            for page in pages
+        ]
+
+    def text_extraction_prompt(self, pages: List[Dict],
+                               skipped: Optional[Dict[int, Dict]] = None,
+                               sections: Optional[List[str]] = None) -> Tuple[str, str]:
+        """The text_extraction_analysis prompt as (static prefix, document part).
+
+        Page text is trimmed first (whitespace, separator rules, repeated
+        headers and footers; see trim_pages). sections, if given, are
+        already built page sections to use instead of pages.
+        """
+        if sections is None:
+            pages, _ = trim_pages(pages, skip=skipped or {})
+            sections = self.page_sections(pages, skipped)
 
         # Prepare text for analysis
-        text_content = "\\n\\n".join([
-            f"=== PAGE {page['page_number']} ===\\n{page['text']}"
-            for page in pages
-        ])
+        text_content = "\\n\\n".join(sections)
 
-        prompt_template = self.load_prompt("text_extraction_analysis")
-        prompt = prompt_template.format(text_content=text_content)
+        prefix, prompt_template = self.load_prompt_parts("text_extraction_analysis")
+        return prefix, prompt_template.format(text_content=text_content)
 
-        try:
-            response = self.client.messages.create(
-                model=model,
-                max_tokens=4000,
-                temperature=0.1,
-                messages=[{"role": "user", "content": prompt}]
-            )
+    def analyze_with_text_extraction(self, pdf_path: str, model: str = "claude-3-5-haiku-latest",
+                                     on_field: Optional[Callable[[str, Any], None]] = None) -> Dict:
+        """Analyze PDF by first extracting text, then sending to LLM.
 
-            processing_time = time.time() - start_time
+        on_field is passed to _create_message, e.g. to route on document_type
+        before the rest of a streamed answer arrives.
+
+        If the prompt's estimated input tokens exceed self.token_budget, the
+        pages are packed into chunks under the budget, each chunk is analyzed
+        with the same prompt and the chunk analyses are aggregated (see
+        _aggregate); the result then has chunked=True and chunk_analyses, and
+        on_field isn't called.
+        """
+        start_time = time.time()
 
+        pages, skipped = self.prescreen_pages(pdf_path)
+        if not pages:
+            return {"error": "Failed to extract text from PDF"}
+        if len(skipped) == len(pages):
             return {
                 "method": "text_extraction",
                 "model": model,
-                "processing_time": processing_time,
-                "input_tokens": len(prompt.split()),
-                "response": response.content[0].text,
-                "usage": {
-                    "input_tokens": response.usage.input_tokens if hasattr(response, 'usage') else None,
-                    "output_tokens": response.usage.output_tokens if hasattr(response, 'usage') else None
-                } if hasattr(response, 'usage') else None
+                "processing_time": time.time() - start_time,
+                "all_pages_skipped": True,
+                **skipped_pages_summary(skipped)
             }
+        pages, boilerplate = trim_pages(pages, skip=skipped)
+        sections = self.page_sections(pages, skipped)
+        prefix, prompt = self.text_extraction_prompt(pages, skipped, sections)
+        estimated_tokens = self.count_input_tokens(prefix + prompt, model)
+
+        try:
+            result = {
+                "method": "text_extraction",
+                "model": model,
+                "estimated_input_tokens": estimated_tokens,
+                "token_budget": self.token_budget,
+                "boilerplate_lines": len(boilerplate),
+                **skipped_pages_summary(skipped)
+            }
+
+            if estimated_tokens > self.token_budget:
+                chunk_analyses = self._analyze_chunks(pages, sections, model)
+                response = self._aggregate(chunk_analyses, len(pages), model)
+                result.update({
+                    "chunked": True,
+                    "chunk_analyses": chunk_analyses,
+                    "chunk_usage": sum_usage([analysis.get('usage') for analysis in chunk_analyses]),
+                    "aggregate_calls": response['aggregate_calls']
+                })
+            else:
+                response = self._create_message(prompt, model, max_tokens=4000, on_field=on_field,
+                                                cached_prefix=prefix)
+
+            result.update({
+                "processing_time": time.time() - start_time,
+                "response": response['text'],
+                "usage": response['usage'],
+                "cached": response['cached']
+            })
+            if 'streaming' in response:
+                result['streaming'] = response['streaming']
+            return result
 
         except Exception as e:
             return {
@@ -127,17 +561,7 @@ class DocumentAnalyzer:
 
             # Note: This approach may not work as Anthropic's API might not accept raw PDF
             # This is more of a test to see what happens
-            response = self.client.messages.create(
-                model=model,
-                max_tokens=4000,
-                temperature=0.1,
-                messages=[
-                    {
-                        "role": "user",
-                        "content": prompt
-                    }
-                ]
-            )
+            response = self._create_message(prompt, model, max_tokens=4000)
 
             processing_time = time.time() - start_time
 
@@ -145,11 +569,9 @@ class DocumentAnalyzer:
                 "method": "direct_pdf",
                 "model": model,
                 "processing_time": processing_time,
-                "response": response.content[0].text,
-                "usage": {
-                    "input_tokens": response.usage.input_tokens if hasattr(response, 'usage') else None,
-                    "output_tokens": response.usage.output_tokens if hasattr(response, 'usage') else None
-                } if hasattr(response, 'usage') else None
+                "response": response['text'],
+                "usage": response['usage'],
+                "cached": response['cached']
             }
 
         except Exception as e:
@@ -160,56 +582,220 @@ class DocumentAnalyzer:
                 "processing_time": time.time() - start_time
             }
 
-    def analyze_page_by_page(self, pdf_path: str, model: str = "claude-3-5-haiku-latest") -> Dict:
-        """Analyze each page separately, then aggregate results."""
-        start_time = time.time()
+    def _run_calls(self, call: Callable[[Any], Dict], items: List, warm_cache: bool = False) -> List[Dict]:
+        """call(item) for each item over up to max_concurrent_pages threads, in order.
+
+        With warm_cache (the calls share a prefix caches_prefix accepts) the
+        first call runs alone so it writes the prefix to the cache before the
+        rest read it.
+        """
+        workers = min(self.max_concurrent_pages, len(items))
+        if workers <= 1:
+            return [call(item) for item in items]
+        first = [call(items[0])] if warm_cache else []
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            return first + list(executor.map(call, items[len(first):]))
+
+    def _analyze_chunks(self, pages: List[Dict], sections: List[str], model: str) -> List[Dict]:
+        """Run text_extraction_analysis on groups of page sections that fit the token budget.
+
+        A page too large for the budget on its own is truncated. Each entry
+        has the [first, last] pages it covers and the analysis or error.
+        """
+        prefix, prompt_template = self.load_prompt_parts("text_extraction_analysis")
+        estimate = self.token_counter.estimate
+        section_budget = self.token_budget - estimate(prefix + prompt_template.format(text_content=''))
+        sections = [truncate_to_tokens(section, section_budget, estimate) for section in sections]
+        chunks = pack_pages(sections, section_budget, estimate, separator="\\n\\n")
+
+        def analyze_chunk(indexes: List[int]) -> Dict:
+            covered = [pages[indexes[0]]['page_number'], pages[indexes[-1]]['page_number']]
+            prompt = prompt_template.format(text_content="\\n\\n".join(sections[index] for index in indexes))
+            try:
+                response = self._create_message(prompt, model, max_tokens=4000, cached_prefix=prefix)
+                return {
+                    "pages": covered,
+                    "analysis": response['text'],
+                    "usage": response['usage'],
+                    "estimated_input_tokens": response['estimated_input_tokens']
+                }
+            except Exception as e:
+                return {"pages": covered, "error": str(e)}
+
+        return self._run_calls(analyze_chunk, chunks, warm_cache=self.caches_prefix(prefix, model))
+
+    def _aggregate(self, analyses: List[Dict], total_pages: int, model: str) -> Dict:
+        """Combine page or chunk analyses with the aggregate_analysis prompt.
+
+        If the analyses don't fit the token budget in one prompt, groups of
+        them are aggregated first and their results aggregated in turn. Each
+        round must leave fewer entries than it started with; when grouping
+        can't (two oversized analyses), each analysis is truncated to an
+        equal share of the budget instead. Returns _create_message's result
+        with usage summed over every call and aggregate_calls counting them.
+        """
+        prefix, prompt_template = self.load_prompt_parts("aggregate_analysis")
+
+        def entry(analysis: Dict) -> Dict:
+            return {key: value for key, value in analysis.items()
+                    if key not in ('usage', 'estimated_input_tokens')}
+
+        def aggregate_prompt(entries: List[Dict]) -> str:
+            return prompt_template.format(page_analyses=json.dumps(entries, indent=2), total_pages=total_pages)
+
+        entries = [entry(analysis) for analysis in analyses]
+        prompt = aggregate_prompt(entries)
+        estimated_tokens = self.count_input_tokens(prefix + prompt, model)
+        if estimated_tokens <= self.token_budget or len(entries) < 2:
+            response = self._create_message(prompt, model, max_tokens=4000, cached_prefix=prefix)
+            return {**response, "estimated_input_tokens": estimated_tokens, "aggregate_calls": 1}
+
+        estimate = self.token_counter.estimate
+        entries_budget = self.token_budget - estimate(prefix + aggregate_prompt([]))
+        groups = pack_pages([json.dumps(item, indent=2) for item in entries],
+                            entries_budget, estimate, separator=',\n', min_per_chunk=2)
+        if len(groups) < 2:
+            half = len(entries) // 2
+            groups = [list(range(half)), list(range(half, len(entries)))]
+        if len(groups) >= len(entries):
+            # Merging would hand the next round as many entries as this one.
+            # Each analysis gets an equal share of what the prompt without
+            # them leaves, measured as it appears in the prompt (JSON-escaped)
+            has_text = [isinstance(item.get('analysis'), str) for item in entries]
+            skeleton = aggregate_prompt([dict(item, analysis='') if text else item
+                                         for item, text in zip(entries, has_text)])
+            share = max(0, self.token_budget - estimate(prefix + skeleton)) // max(1, sum(has_text))
+
+            def escaped_estimate(text: str) -> int:
+                return estimate(json.dumps(text)[1:-1])
+
+            entries = [dict(item, analysis=truncate_to_tokens(item['analysis'], share, escaped_estimate))
+                       if text else item for item, text in zip(entries, has_text)]
+            prompt = aggregate_prompt(entries)
+            response = self._create_message(prompt, model, max_tokens=4000, cached_prefix=prefix)
+            return {**response, "estimated_input_tokens": self.count_input_tokens(prefix + prompt, model),
+                    "aggregate_calls": 1}
+
+        partials = self._run_calls(
+            lambda group: self._aggregate([analyses[index] for index in group], total_pages, model), groups,
+            warm_cache=self.caches_prefix(prefix, model)
+        )
+        merged = [
+            {"pages": [analysis_pages(analyses[group[0]])[0], analysis_pages(analyses[group[-1]])[1]],
+             "analysis": partial['text']}
+            for group, partial in zip(groups, partials)
+        ]
+        final = self._aggregate(merged, total_pages, model)
+        final['usage'] = sum_usage([partial['usage'] for partial in partials] + [final['usage']])
+        final['aggregate_calls'] += sum(partial['aggregate_calls'] for partial in partials)
+        return final
+
+    def _analyze_single_page(self, page: Dict, page_prompt_parts: Tuple[str, str], model: str,
+                             skip: Optional[Dict] = None) -> Dict:
+        """Run the page analysis prompt for one page, capturing any error.
+
+        Skipped pages aren't sent; their entry records why (see iter_prescreened_pages).
+        """
+        if skip:
+            return {"page": page['page_number'], **skip}
+
+        prefix, page_prompt_template = page_prompt_parts
+        estimate = self.token_counter.estimate
+        page_budget = self.token_budget - estimate(
+            prefix + page_prompt_template.format(page_number=page['page_number'], page_text='')
+        )
+        page_prompt = page_prompt_template.format(
+            page_number=page['page_number'],
+            page_text=truncate_to_tokens(clean_page_text(page['text']), page_budget, estimate)
+        )
 
-        pages = self.extract_text_from_pdf(pdf_path)
-        if not pages:
-            return {"error": "Failed to extract text from PDF"}
+        try:
+            response = self._create_message(page_prompt, model, max_tokens=1000, cached_prefix=prefix)
 
-        page_analyses = []
+            return {
+                "page": page['page_number'],
+                "analysis": response['text'],
+                "usage": response['usage'],
+                "estimated_input_tokens": response['estimated_input_tokens']
+            }
 
-        for page in pages:
-            page_prompt_template = self.load_prompt("page_analysis")
-            page_prompt = page_prompt_template.format(
-                page_number=page['page_number'],
-                page_text=page['text']
-            )
+        except Exception as e:
+            return {
+                "page": page['page_number'],
+                "error": str(e)
+            }
 
-            try:
-                response = self.client.messages.create(
-                    model=model,
-                    max_tokens=1000,
-                    temperature=0.1,
-                    messages=[{"role": "user", "content": page_prompt}]
-                )
-
-                page_analyses.append({
-                    "page": page['page_number'],
-                    "analysis": response.content[0].text
-                })
+    def analyze_page_by_page(self, pdf_path: str, model: str = "claude-3-5-haiku-latest",
+                             max_concurrent: Optional[int] = None,
+                             extract_processes: Optional[int] = None) -> Dict:
+        """Analyze each page separately, then aggregate results.
+
+        Page calls are fanned out over a thread pool of at most max_concurrent
+        workers (defaults to self.max_concurrent_pages). Results are kept in
+        page order regardless of completion order. extract_processes is passed
+        through to iter_text_from_pdf.
+
+        When the instruction prefix is long enough to cache (caches_prefix),
+        the first page call runs alone so it writes the prefix to the cache
+        before the other pages read it.
+        Blank and duplicate pages get no page call, and blank pages are
+        left out of the aggregate prompt as well. Page text is trimmed and,
+        if a page alone would exceed the token budget, truncated; page
+        analyses that don't fit one aggregate prompt are aggregated in groups
+        (see _aggregate).
+        """
+        start_time = time.time()
 
-            except Exception as e:
-                page_analyses.append({
-                    "page": page['page_number'],
-                    "error": str(e)
-                })
+        page_prompt_parts = self.load_prompt_parts("page_analysis")
+        workers = max(1, max_concurrent or self.max_concurrent_pages)
 
-        # Now aggregate the results
-        aggregate_prompt_template = self.load_prompt("aggregate_analysis")
-        aggregate_prompt = aggregate_prompt_template.format(
-            page_analyses=json.dumps(page_analyses, indent=2),
-            total_pages=len(pages)
+        # Pages are submitted as the extractor yields them, so page 1 is being
+        # analyzed while later pages are still being decoded
+        pages = self.iter_prescreened_pages(
+            pdf_path, self.iter_text_from_pdf(pdf_path, processes=extract_processes)
         )
+        if workers == 1:
+            page_analyses = [
+                self._analyze_single_page(page, page_prompt_parts, model, skip)
+                for page, skip in pages
+            ]
+        else:
+            futures = {}
+            warmed = not self.caches_prefix(page_prompt_parts[0], model)
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                for index, (page, skip) in enumerate(pages):
+                    future = executor.submit(self._analyze_single_page, page, page_prompt_parts, model, skip)
+                    futures[future] = index
+                    if not warmed and not skip:
+                        future.result()
+                        warmed = True
+                page_analyses = [None] * len(futures)
+                for future in as_completed(futures):
+                    page_analyses[futures[future]] = future.result()
+
+        if not page_analyses:
+            return {"error": "Failed to extract text from PDF"}
+
+        skipped = {analysis['page']: analysis for analysis in page_analyses
+                   if 'blank' in analysis or 'duplicate_of' in analysis}
+        if len(skipped) == len(page_analyses):
+            return {
+                "method": "page_by_page",
+                "model": model,
+                "processing_time": time.time() - start_time,
+                "page_analyses": page_analyses,
+                "all_pages_skipped": True,
+                **skipped_pages_summary(skipped)
+            }
+
+        pages_time = time.time() - start_time
+
+        # Now aggregate the results
+        page_usage = sum_usage([analysis.get('usage') for analysis in page_analyses])
 
         try:
-            final_response = self.client.messages.create(
-                model=model,
-                max_tokens=4000,
-                temperature=0.1,
-                messages=[{"role": "user", "content": aggregate_prompt}]
-            )
+            final_response = self._aggregate([analysis for analysis in page_analyses if 'blank' not in analysis],
+                                             len(page_analyses), model)
 
             processing_time = time.time() - start_time
 
@@ -217,9 +803,16 @@ class DocumentAnalyzer:
                 "method": "page_by_page",
                 "model": model,
                 "processing_time": processing_time,
+                "pages_time": pages_time,
+                "max_concurrent": workers,
                 "page_analyses": page_analyses,
-                "final_analysis": final_response.content[0].text,
-                "usage": final_response.usage._asdict() if hasattr(final_response, 'usage') else None
+                "final_analysis": final_response['text'],
+                "usage": final_response['usage'],
+                "page_usage": page_usage,
+                "estimated_input_tokens": final_response['estimated_input_tokens'],
+                "aggregate_calls": final_response['aggregate_calls'],
+                "cached": final_response['cached'],
+                **skipped_pages_summary(skipped)
             }
 
         except Exception as e:
@@ -228,28 +821,30 @@ class DocumentAnalyzer:
                 "model": model,
                 "error": str(e),
                 "page_analyses": page_analyses,
+                "page_usage": page_usage,
                 "processing_time": time.time() - start_time
             }
 
 
 def main():
     """Run comprehensive testing of different analysis methods."""
+    # model_router builds on this module
+    from model_router import DEFAULT_TIERS, ModelRouter
 
     # Configuration
     pdf_path = "/Users/brianweaver/code/doc-manager/samples/09162025_RESPONSE REQUESTED BY September 16,2025.pdf"
     output_dir = Path("/Users/brianweaver/code/doc-manager/experiments")
 
-    # Test models (start with Haiku, optionally test Sonnet)
-    models_to_test = [
-        "claude-3-5-haiku-latest",
-        # "claude-3-5-sonnet-20241022"  # Uncomment to test Sonnet
-    ]
+    # Text extraction starts with Haiku and escalates low-confidence or
+    # malformed answers to Sonnet; the other methods run on the first tier
+    model_tiers = DEFAULT_TIERS
+    models_to_test = [model_tiers[0]["model"]]
 
     results = {
         "test_metadata": {
             "timestamp": time.strftime("%Y-%m-%d %H:%M:%S"),
             "pdf_file": pdf_path,
-            "models_tested": models_to_test
+            "models_tested": [tier["model"] for tier in model_tiers]
         },
         "test_results": []
     }
@@ -261,15 +856,28 @@ def main():
         print(f"Error: PDF file not found at {pdf_path}")
         return
 
+    analyzer = router = None
     try:
-        analyzer = DocumentAnalyzer()
+        # Up to 4 page analysis calls in flight for the page-by-page method
+        analyzer = DocumentAnalyzer(
+            max_concurrent_pages=4,
+            cache=LLMResultCache(output_dir / "llm_cache.sqlite3"),
+            extractor=TextExtractor(cache=ExtractionCache(output_dir / "text_cache.sqlite3")),
+            stream=True,
+            deduplicator=PageDeduplicator(output_dir / "dedup_index.sqlite3"),
+            blank_detector=BlankPageDetector()
+        )
+        router = ModelRouter(analyzer, model_tiers)
 
         for model in models_to_test:
             print(f"\\nTesting model: {model}")
 
-            # Test 1: Text extraction method
+            # Test 1: Text extraction method, routed across model tiers
             print("  Method 1: Text extraction...")
-            result1 = analyzer.analyze_with_text_extraction(pdf_path, model)
+            result1 = router.analyze(
+                pdf_path,
+                on_field=lambda name, value: print(f"    {name}: {value}") if name == "document_type" else None
+            )
             results["test_results"].append(result1)
 
             # Test 2: Direct PDF method (likely to fail, but worth testing)
@@ -288,6 +896,9 @@ def main():
         print(f"Error during testing: {e}")
         results["error"] = str(e)
 
+    if router:
+        results["routing"] = router.metrics.stats()
+
     # Save results
     output_file = output_dir / "api_test_results.json"
     with open(output_file, 'w') as f:
@@ -295,6 +906,16 @@ def main():
 
     print(f"\\nResults saved to: {output_file}")
 
+    if analyzer and analyzer.cache:
+        print(f"LLM cache: {analyzer.cache.stats()}")
+    if analyzer:
+        print(f"Text extraction cache: {analyzer.extractor.cache.stats()}")
+        print(f"Page dedup index: {analyzer.deduplicator.stats()}")
+        print(f"Token estimates: {analyzer.token_counter.stats()}")
+        print(f"Rate limiter: {analyzer.rate_limiter.stats()}")
+    if router:
+        print(f"Model routing: {results['routing']}")
+
     # Print summary
     print("\\n=== TEST SUMMARY ===")
     for result in results["test_results"]:
@@ -302,6 +923,16 @@ def main():
             print(f"{result.get('model', 'unknown')} - {result.get('method', 'unknown')}: ERROR - {result['error']}")
         else:
             print(f"{result.get('model', 'unknown')} - {result.get('method', 'unknown')}: SUCCESS - {result.get('processing_time', 0):.2f}s")
+            streaming = result.get('streaming')
+            if streaming and streaming['first_field'] and streaming['time_to_json'] is not None:
+                print(f"    first token {streaming['time_to_first_token']:.2f}s, "
+                      f"{streaming['first_field']} at {streaming['time_to_first_field']:.2f}s, "
+                      f"JSON complete {streaming['time_to_json']:.2f}s"
+                      f"{' (stopped early)' if streaming['stopped_early'] else ''}")
+            routing = result.get('routing')
+            if routing:
+                print(f"    tiers: {' -> '.join(attempt['tier'] for attempt in routing['attempts'])}"
+                      f" ({routing['attempts'][0]['reason'] or 'accepted'}), ${routing['cost']:.4f}")
 
 
 if __name__ == "__main__":
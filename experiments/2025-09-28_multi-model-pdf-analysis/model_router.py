@@ -0,0 +1,314 @@
+#!/usr/bin/env python3
+"""
+Tiered model routing for document analysis.
+
+Every document is analyzed by the cheapest model first. The answer is
+parsed and checked against the text_extraction_analysis schema; only
+answers that are malformed, failed, or below the tier's confidence
+threshold go to the next (larger) model. Document types that matter more
+(tax, legal, medical...) can require a higher confidence. Most mail is
+simple, so typical latency and cost stay at the first tier's.
+
+Per-tier call counts, escalations, latency and cost are kept in
+RoutingMetrics.
+
+Usage:
+    python model_router.py scan.pdf [more.pdf ...] [--min-confidence 75] [--override tax=90]
+"""
+
+import argparse
+import statistics
+import threading
+from typing import Dict, List, Optional, Tuple
+
+from json_stream import parse_json_response
+from llm_document_analyzer import DocumentAnalyzer, sum_usage
+
+# Cheapest first; the last tier's answer is always accepted
+DEFAULT_TIERS = [
+    {"name": "haiku", "model": "claude-3-5-haiku-latest", "min_confidence": 75},
+    {"name": "sonnet", "model": "claude-sonnet-4-5"},
+]
+
+# Minimum confidence for answers naming these document types (matched as a
+# lower-case substring of any recommended action's document_type)
+DEFAULT_TYPE_OVERRIDES = {
+    "tax": 90,
+    "legal": 90,
+    "court": 90,
+    "medical": 85,
+    "insurance": 85,
+}
+
+# USD per million input and output tokens, by model name prefix
+MODEL_PRICES = {
+    "claude-3-5-haiku": (0.80, 4.00),
+    "claude-haiku-4-5": (1.00, 5.00),
+    "claude-3-5-sonnet": (3.00, 15.00),
+    "claude-3-7-sonnet": (3.00, 15.00),
+    "claude-sonnet-4": (3.00, 15.00),
+    "claude-opus-4": (15.00, 75.00),
+}
+# Prompt cache writes and reads, relative to the input price
+CACHE_WRITE_MULTIPLIER = 1.25
+CACHE_READ_MULTIPLIER = 0.1
+
+ACTIONS = {"extract", "remove", "keep", "reorder"}
+
+
+def call_cost(model: str, usage: Optional[Dict]) -> Optional[float]:
+    """USD cost of a call's usage, or None for a model without a known price."""
+    prices = next((price for prefix, price in MODEL_PRICES.items() if model.startswith(prefix)), None)
+    if prices is None:
+        return None
+    if not usage:
+        return 0.0
+    input_price, output_price = prices
+    return ((usage.get('input_tokens') or 0) * input_price
+            + (usage.get('cache_creation_input_tokens') or 0) * input_price * CACHE_WRITE_MULTIPLIER
+            + (usage.get('cache_read_input_tokens') or 0) * input_price * CACHE_READ_MULTIPLIER
+            + (usage.get('output_tokens') or 0) * output_price) / 1_000_000
+
+
+def result_usage(result: Dict) -> Dict:
+    """All usage of an analyze_with_text_extraction result, including chunk calls."""
+    return sum_usage([result.get('usage'), result.get('chunk_usage')])
+
+
+def validate_analysis(analysis) -> List[str]:
+    """Problems with a parsed analysis against the text_extraction_analysis schema; empty if valid."""
+    if not isinstance(analysis, dict):
+        return ["response is not a JSON object"]
+
+    problems = []
+    confidence = analysis.get('analysis_confidence')
+    if not isinstance(confidence, (int, float)) or isinstance(confidence, bool) or not 0 <= confidence <= 100:
+        problems.append("analysis_confidence is not a number from 0 to 100")
+    for field in ('document_count', 'total_pages'):
+        if not isinstance(analysis.get(field), int) or isinstance(analysis.get(field), bool) or analysis[field] < 0:
+            problems.append(f"{field} is not a non-negative integer")
+
+    total_pages = analysis.get('total_pages') if isinstance(analysis.get('total_pages'), int) else None
+    actions = analysis.get('recommended_actions')
+    if not isinstance(actions, list) or not actions:
+        problems.append("recommended_actions is missing or empty")
+        actions = []
+    for index, action in enumerate(actions):
+        if not isinstance(action, dict):
+            problems.append(f"recommended_actions[{index}] is not an object")
+            continue
+        if action.get('action') not in ACTIONS:
+            problems.append(f"recommended_actions[{index}].action {action.get('action')!r} is not one of {sorted(ACTIONS)}")
+        pages = action.get('pages')
+        if (not isinstance(pages, list)
+                or not all(isinstance(page, int) and page >= 1 and (not total_pages or page <= total_pages)
+                           for page in pages)):
+            problems.append(f"recommended_actions[{index}].pages are not page numbers of the document")
+
+    if 'duplicates_detected' in analysis and not isinstance(analysis['duplicates_detected'], list):
+        problems.append("duplicates_detected is not a list")
+    return problems
+
+
+def normalized_confidence(analysis: Dict) -> Optional[float]:
+    """analysis_confidence on a 0-100 scale.
+
+    Fractions below 1 (0.85) are taken as a 0-1 answer and scaled up;
+    whole numbers, including 0 and 1, are already percentages.
+    """
+    confidence = analysis.get('analysis_confidence') if isinstance(analysis, dict) else None
+    if not isinstance(confidence, (int, float)) or isinstance(confidence, bool):
+        return None
+    return confidence * 100 if 0 < confidence < 1 else confidence
+
+
+def document_types(analysis: Dict) -> List[str]:
+    """document_type of each recommended action, in order."""
+    actions = analysis.get('recommended_actions') if isinstance(analysis, dict) else None
+    return [action['document_type'] for action in actions or []
+            if isinstance(action, dict) and isinstance(action.get('document_type'), str)]
+
+
+class RoutingMetrics:
+    """Per-tier calls, escalations, latency and cost across routed documents. Thread-safe."""
+
+    def __init__(self, tier_names: List[str]):
+        self.tier_names = tier_names
+        self.tiers = {name: {'calls': 0, 'escalations': 0, 'final': 0, 'latencies': [], 'cost': 0.0}
+                      for name in tier_names}
+        self.document_latencies = []
+        self.document_costs = []
+        self._lock = threading.Lock()
+
+    def record(self, attempts: List[Dict]):
+        """Add one document's tier attempts (see ModelRouter.analyze)."""
+        with self._lock:
+            for attempt in attempts:
+                tier = self.tiers[attempt['tier']]
+                tier['calls'] += 1
+                tier['latencies'].append(attempt['latency'])
+                tier['cost'] += attempt['cost'] or 0.0
+                if attempt['escalated']:
+                    tier['escalations'] += 1
+                else:
+                    tier['final'] += 1
+            self.document_latencies.append(sum(attempt['latency'] for attempt in attempts))
+            self.document_costs.append(sum(attempt['cost'] or 0.0 for attempt in attempts))
+
+    def stats(self) -> Dict:
+        """Escalation rate, latency and cost per tier and per document."""
+        with self._lock:
+            documents = len(self.document_latencies)
+            tiers = {}
+            for name in self.tier_names:
+                tier = self.tiers[name]
+                latencies = sorted(tier['latencies'])
+                tiers[name] = {
+                    'calls': tier['calls'],
+                    'final': tier['final'],
+                    'escalations': tier['escalations'],
+                    'escalation_rate': round(tier['escalations'] / tier['calls'], 4) if tier['calls'] else None,
+                    'median_latency': round(statistics.median(latencies), 3) if latencies else None,
+                    'p90_latency': round(latencies[int(0.9 * (len(latencies) - 1))], 3) if latencies else None,
+                    'cost': round(tier['cost'], 6)
+                }
+            escalated = documents - self.tiers[self.tier_names[0]]['final'] if documents else 0
+            return {
+                'documents': documents,
+                'escalated': escalated,
+                'escalation_rate': round(escalated / documents, 4) if documents else None,
+                'median_latency': round(statistics.median(self.document_latencies), 3) if documents else None,
+                'median_cost': round(statistics.median(self.document_costs), 6) if documents else None,
+                'total_cost': round(sum(self.document_costs), 6),
+                'tiers': tiers
+            }
+
+
+class ModelRouter:
+    """Run analyze_with_text_extraction on the cheapest tier, escalating weak answers.
+
+    tiers are dicts with 'name', 'model' and (for all but the last)
+    'min_confidence'. type_overrides raise the threshold for answers whose
+    document types contain a given key.
+    """
+
+    def __init__(self, analyzer: DocumentAnalyzer, tiers: Optional[List[Dict]] = None,
+                 type_overrides: Optional[Dict[str, float]] = None,
+                 metrics: Optional[RoutingMetrics] = None):
+        self.analyzer = analyzer
+        self.tiers = tiers or DEFAULT_TIERS
+        self.type_overrides = DEFAULT_TYPE_OVERRIDES if type_overrides is None else type_overrides
+        self.metrics = metrics or RoutingMetrics([tier['name'] for tier in self.tiers])
+
+    def threshold(self, tier: Dict, analysis: Dict) -> Tuple[float, Optional[str]]:
+        """Confidence needed to accept an answer from tier, and the override that set it, if any."""
+        threshold, matched = tier.get('min_confidence', 0), None
+        types = [document_type.lower() for document_type in document_types(analysis)]
+        for key, override in self.type_overrides.items():
+            if override > threshold and any(key in document_type for document_type in types):
+                threshold, matched = override, key
+        return threshold, matched
+
+    def review(self, tier: Dict, result: Dict) -> Tuple[Optional[str], Dict]:
+        """Why result should be escalated (None to accept it), plus what was checked."""
+        if 'error' in result:
+            return 'error', {}
+        analysis, _, _ = parse_json_response(result.get('response') or '')
+        problems = validate_analysis(analysis)
+        confidence = normalized_confidence(analysis)
+        threshold, override = self.threshold(tier, analysis)
+        checked = {
+            'confidence': confidence,
+            'threshold': threshold,
+            'type_override': override,
+            'document_types': document_types(analysis),
+            'schema_problems': problems
+        }
+        if problems:
+            return 'schema', checked
+        if confidence < threshold:
+            return 'low_confidence', checked
+        return None, checked
+
+    def analyze(self, pdf_path: str, **kwargs) -> Dict:
+        """Analyze pdf_path tier by tier; returns the accepted tier's result with a 'routing' record.
+
+        kwargs are passed to analyze_with_text_extraction. Documents with
+        every page skipped need no model and are returned unrouted.
+        """
+        attempts = []
+        for index, tier in enumerate(self.tiers):
+            result = self.analyzer.analyze_with_text_extraction(pdf_path, tier['model'], **kwargs)
+            if result.get('all_pages_skipped'):
+                return result
+
+            reason, checked = self.review(tier, result)
+            last = index == len(self.tiers) - 1
+            attempts.append({
+                'tier': tier['name'],
+                'model': tier['model'],
+                'latency': result.get('processing_time', 0.0),
+                'cost': 0.0 if result.get('cached') else call_cost(tier['model'], result_usage(result)),
+                'cached': result.get('cached', False),
+                'escalated': reason is not None and not last,
+                'reason': reason,
+                **checked
+            })
+            if reason is None or last:
+                break
+
+        self.metrics.record(attempts)
+        result['routing'] = {
+            'final_tier': attempts[-1]['tier'],
+            'escalated': len(attempts) > 1,
+            'latency': sum(attempt['latency'] for attempt in attempts),
+            'cost': sum(attempt['cost'] or 0.0 for attempt in attempts),
+            'attempts': attempts
+        }
+        return result
+
+
+def parse_overrides(values: List[str]) -> Dict[str, float]:
+    """TYPE=CONFIDENCE command-line overrides."""
+    overrides = {}
+    for value in values:
+        key, _, threshold = value.partition('=')
+        overrides[key.strip().lower()] = float(threshold)
+    return overrides
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Analyze PDFs with the cheapest model that answers confidently")
+    parser.add_argument('pdfs', nargs='+')
+    parser.add_argument('--min-confidence', type=float, default=DEFAULT_TIERS[0]['min_confidence'],
+                        help='confidence needed to accept the first tier')
+    parser.add_argument('--models', nargs='+', help='models to try in order (default: %(default)s)',
+                        default=[tier['model'] for tier in DEFAULT_TIERS])
+    parser.add_argument('--override', action='append', default=[], metavar='TYPE=CONFIDENCE',
+                        help='confidence needed for a document type, e.g. tax=90 (repeatable)')
+    parser.add_argument('--no-default-overrides', action='store_true')
+    args = parser.parse_args()
+
+    tiers = [{"name": model, "model": model, "min_confidence": args.min_confidence} for model in args.models]
+    overrides = {} if args.no_default_overrides else dict(DEFAULT_TYPE_OVERRIDES)
+    overrides.update(parse_overrides(args.override))
+    router = ModelRouter(DocumentAnalyzer(), tiers, overrides)
+
+    for pdf_path in args.pdfs:
+        result = router.analyze(pdf_path)
+        if 'routing' not in result:
+            print(f"{pdf_path}: all pages skipped")
+            continue
+        routing = result['routing']
+        steps = ', '.join(
+            f"{attempt['tier']} ({attempt['reason'] or 'accepted'}"
+            f"{', confidence %s' % attempt['confidence'] if attempt.get('confidence') is not None else ''})"
+            for attempt in routing['attempts']
+        )
+        print(f"{pdf_path}: {steps} - {routing['latency']:.2f}s, ${routing['cost']:.4f}")
+
+    print(f"\nRouting: {router.metrics.stats()}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,344 @@
+#!/usr/bin/env python3
+"""
+Local page deduplication before any LLM call (the "Deduplicator (Hash+Fuzzy)"
+stage in docs/ARCHITECTURE.md).
+
+Every page's extracted text gets an exact hash of its normalized text and a
+MinHash signature of its word shingles. Signatures are stored in a SQLite
+LSH index (banded MinHash), so a page is matched against every page seen
+before, in this scan or earlier ones, with one indexed lookup instead of a
+comparison per archived page. Exact duplicates match on the hash; OCR
+re-scans of the same page match when their estimated Jaccard similarity
+is at least the threshold. Fuzzy matches must also share their numbers
+(amounts, dates, account numbers), so this month's bill isn't dropped as
+a near-duplicate of last month's from the same template.
+
+Usage:
+    python page_dedup.py scan.pdf [more.pdf ...] [--index dedup_index.sqlite3] [--add]
+"""
+
+import argparse
+import hashlib
+import random
+import re
+import sqlite3
+import threading
+import time
+import zlib
+from array import array
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from text_extraction import TextExtractor
+
+# Mersenne prime for the (a * x + b) mod p permutations
+MERSENNE_PRIME = (1 << 61) - 1
+
+NUM_PERM = 128
+BANDS = 32
+SHINGLE_SIZE = 3
+SIMILARITY_THRESHOLD = 0.7
+
+# Pages with fewer normalized words than this aren't matched at all;
+# blank and near-blank pages would otherwise all match each other
+MIN_WORDS = 8
+
+# Pages with fewer distinct numbers than this are matched on words alone
+MIN_NUMBERS = 3
+
+_WORD = re.compile(r'\w+')
+_NUMBER = re.compile(r'\d+(?:[.,/:-]\d+)*')
+
+
+def normalize_words(text: str) -> List[str]:
+    """Lowercased words, ignoring punctuation and layout whitespace."""
+    return _WORD.findall(text.lower())
+
+
+def shingle_hashes(words: List[str], size: int = SHINGLE_SIZE) -> set:
+    """Stable 32-bit hashes of the word n-grams of a page."""
+    if len(words) < size:
+        return {zlib.crc32(' '.join(words).encode('utf-8'))}
+    return {
+        zlib.crc32(' '.join(words[i:i + size]).encode('utf-8'))
+        for i in range(len(words) - size + 1)
+    }
+
+
+class MinHasher:
+    """MinHash signatures from a fixed seed, so stored signatures stay comparable."""
+
+    def __init__(self, num_perm: int = NUM_PERM, seed: int = 1):
+        rng = random.Random(seed)
+        self.num_perm = num_perm
+        self.permutations = [
+            (rng.randrange(1, MERSENNE_PRIME), rng.randrange(0, MERSENNE_PRIME))
+            for _ in range(num_perm)
+        ]
+
+    def signature(self, hashes: Iterable[int]) -> Tuple[int, ...]:
+        hashes = list(hashes)
+        prime = MERSENNE_PRIME
+        return tuple(min([(a * h + b) % prime for h in hashes]) for a, b in self.permutations)
+
+    @staticmethod
+    def similarity(first: Tuple[int, ...], second: Tuple[int, ...]) -> float:
+        """Estimated Jaccard similarity of the two shingle sets."""
+        return sum(x == y for x, y in zip(first, second)) / len(first)
+
+
+class PageSignature:
+    """Exact hash, MinHash signature and distinct numbers of one page's text."""
+
+    __slots__ = ('exact_hash', 'minhash', 'word_count', 'numbers')
+
+    def __init__(self, exact_hash: str, minhash: Tuple[int, ...], word_count: int, numbers: frozenset):
+        self.exact_hash = exact_hash
+        self.minhash = minhash
+        self.word_count = word_count
+        self.numbers = numbers
+
+
+class PageDeduplicator:
+    """Persistent LSH index of page signatures keyed by (doc_id, page_number).
+
+    db_path ':memory:' keeps the index for the life of the process only.
+    bands * rows must equal num_perm; with the defaults (32 bands of 4 rows)
+    pages with Jaccard similarity around 0.45 and above become candidates,
+    which are then confirmed against the threshold.
+    """
+
+    def __init__(self, db_path: str = ':memory:', num_perm: int = NUM_PERM, bands: int = BANDS,
+                 threshold: float = SIMILARITY_THRESHOLD, min_words: int = MIN_WORDS):
+        """threshold is the minimum estimated Jaccard similarity of a near-duplicate."""
+        if num_perm % bands:
+            raise ValueError(f"num_perm ({num_perm}) must be a multiple of bands ({bands})")
+        self.in_memory = str(db_path) == ':memory:'
+        self.db_path = Path(db_path)
+        if not self.in_memory:
+            self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self.hasher = MinHasher(num_perm)
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.threshold = threshold
+        self.min_words = min_words
+        self.lookups = 0
+        self.lookup_seconds = 0.0
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.db_path), check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS settings (
+                name TEXT PRIMARY KEY,
+                value TEXT NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS pages (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                doc_id TEXT NOT NULL,
+                page_number INTEGER NOT NULL,
+                exact_hash TEXT NOT NULL,
+                minhash BLOB NOT NULL,
+                word_count INTEGER NOT NULL,
+                numbers TEXT NOT NULL,
+                created REAL NOT NULL,
+                UNIQUE (doc_id, page_number)
+            );
+            CREATE INDEX IF NOT EXISTS idx_pages_exact_hash ON pages(exact_hash);
+            CREATE TABLE IF NOT EXISTS lsh_buckets (
+                bucket INTEGER NOT NULL,
+                page_id INTEGER NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_lsh_buckets_bucket ON lsh_buckets(bucket);
+            CREATE INDEX IF NOT EXISTS idx_lsh_buckets_page_id ON lsh_buckets(page_id);
+        """)
+        self._check_settings({'num_perm': str(num_perm), 'bands': str(bands), 'seed': '1'})
+        self._conn.commit()
+
+    def _check_settings(self, settings: Dict[str, str]):
+        stored = dict(self._conn.execute("SELECT name, value FROM settings"))
+        if not stored:
+            self._conn.executemany("INSERT INTO settings (name, value) VALUES (?, ?)", settings.items())
+        elif stored != settings:
+            raise ValueError(f"{self.db_path} was built with {stored}, not {settings}")
+
+    def signature(self, text: str) -> Optional[PageSignature]:
+        """Signature of a page's text, or None if it has too few words to match."""
+        words = normalize_words(text)
+        if len(words) < self.min_words:
+            return None
+        exact_hash = hashlib.sha256(' '.join(words).encode('utf-8')).hexdigest()
+        return PageSignature(exact_hash, self.hasher.signature(shingle_hashes(words)), len(words),
+                             frozenset(_NUMBER.findall(text)))
+
+    def _numbers_match(self, first: frozenset, second: frozenset) -> bool:
+        if len(first) < MIN_NUMBERS or len(second) < MIN_NUMBERS:
+            return True
+        return len(first & second) / len(first | second) >= self.threshold
+
+    def _bucket_keys(self, minhash: Tuple[int, ...]) -> List[int]:
+        # One signed 64-bit key per band, so one indexed column serves all bands
+        keys = []
+        for band in range(self.bands):
+            chunk = array('Q', minhash[band * self.rows:(band + 1) * self.rows]).tobytes()
+            digest = hashlib.blake2b(chunk, digest_size=8, person=band.to_bytes(16, 'little')).digest()
+            keys.append(int.from_bytes(digest, 'little', signed=True))
+        return keys
+
+    def query(self, signature: PageSignature, exclude_doc: Optional[str] = None) -> Optional[Dict]:
+        """Best indexed match for a page signature, or None.
+
+        Returns {'doc_id', 'page_number', 'similarity', 'exact'}; an exact
+        hash match wins over fuzzy ones. Pages of exclude_doc are ignored,
+        so reprocessing a document doesn't match its own earlier entry.
+        """
+        start = time.perf_counter()
+        keys = self._bucket_keys(signature.minhash)
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT doc_id, page_number FROM pages WHERE exact_hash = ? AND doc_id IS NOT ? LIMIT 1",
+                (signature.exact_hash, exclude_doc)
+            ).fetchone()
+            candidates = [] if row else self._conn.execute(
+                f"SELECT DISTINCT p.doc_id, p.page_number, p.minhash, p.numbers FROM lsh_buckets b "
+                f"JOIN pages p ON p.id = b.page_id "
+                f"WHERE b.bucket IN ({','.join('?' * len(keys))}) AND p.doc_id IS NOT ?",
+                (*keys, exclude_doc)
+            ).fetchall()
+
+        match = None
+        if row:
+            match = {'doc_id': row[0], 'page_number': row[1], 'similarity': 1.0, 'exact': True}
+        else:
+            for doc_id, page_number, blob, numbers in candidates:
+                similarity = MinHasher.similarity(signature.minhash, tuple(array('Q', blob)))
+                if (similarity >= self.threshold and (not match or similarity > match['similarity'])
+                        and self._numbers_match(signature.numbers, frozenset(numbers.split()))):
+                    match = {'doc_id': doc_id, 'page_number': page_number,
+                             'similarity': round(similarity, 3), 'exact': False}
+
+        self.lookups += 1
+        self.lookup_seconds += time.perf_counter() - start
+        return match
+
+    def add(self, doc_id: str, page_number: int, signature: PageSignature, commit: bool = True):
+        """Index a page, replacing any earlier entry for the same (doc_id, page_number)."""
+        with self._lock:
+            self._remove_locked("doc_id = ? AND page_number = ?", (doc_id, page_number))
+            cursor = self._conn.execute(
+                "INSERT INTO pages (doc_id, page_number, exact_hash, minhash, word_count, numbers, created) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (doc_id, page_number, signature.exact_hash, array('Q', signature.minhash).tobytes(),
+                 signature.word_count, ' '.join(sorted(signature.numbers)), time.time())
+            )
+            self._conn.executemany(
+                "INSERT INTO lsh_buckets (bucket, page_id) VALUES (?, ?)",
+                ((key, cursor.lastrowid) for key in self._bucket_keys(signature.minhash))
+            )
+            if commit:
+                self._conn.commit()
+
+    def remove_document(self, doc_id: str):
+        with self._lock:
+            self._remove_locked("doc_id = ?", (doc_id,))
+            self._conn.commit()
+
+    def _remove_locked(self, where: str, params: Tuple):
+        self._conn.execute(f"DELETE FROM lsh_buckets WHERE page_id IN (SELECT id FROM pages WHERE {where})", params)
+        self._conn.execute(f"DELETE FROM pages WHERE {where}", params)
+
+    def iter_matches(self, doc_id: str, pages: Iterable[Dict]) -> Iterator[Tuple[Dict, Optional[Dict]]]:
+        """Yield (page, match or None) as pages arrive.
+
+        pages are extract_page results ({'page_number', 'text', ...}). A page
+        matches an earlier page of the same scan (match 'same_document' is
+        True) or any page of another indexed document. Nothing is added to
+        the index.
+        """
+        seen = PageDeduplicator(num_perm=self.hasher.num_perm, bands=self.bands,
+                                threshold=self.threshold, min_words=self.min_words)
+        try:
+            for page in pages:
+                signature = self.signature(page['text'])
+                match = None
+                if signature is not None:
+                    match = seen.query(signature)
+                    if match:
+                        match['same_document'] = True
+                    else:
+                        match = self.query(signature, exclude_doc=doc_id)
+                        if match:
+                            match['same_document'] = False
+                        seen.add(doc_id, page['page_number'], signature, commit=False)
+                yield page, match
+        finally:
+            seen.close()
+
+    def find_duplicates(self, doc_id: str, pages: Iterable[Dict]) -> Dict[int, Dict]:
+        """Map page_number -> match for pages that repeat an earlier page."""
+        return {page['page_number']: match for page, match in self.iter_matches(doc_id, pages) if match}
+
+    def add_document(self, doc_id: str, pages: List[Dict]) -> int:
+        """Index a document's pages (replacing an earlier version); returns pages indexed."""
+        self.remove_document(doc_id)
+        added = 0
+        for page in pages:
+            signature = self.signature(page['text'])
+            if signature is not None:
+                self.add(doc_id, page['page_number'], signature, commit=False)
+                added += 1
+        with self._lock:
+            self._conn.commit()
+        return added
+
+    def stats(self) -> Dict:
+        with self._lock:
+            pages = self._conn.execute("SELECT COUNT(*) FROM pages").fetchone()[0]
+            documents = self._conn.execute("SELECT COUNT(DISTINCT doc_id) FROM pages").fetchone()[0]
+        return {
+            'documents': documents,
+            'pages': pages,
+            'lookups': self.lookups,
+            'avg_lookup_ms': self.lookup_seconds / self.lookups * 1000 if self.lookups else 0.0,
+            'db_path': str(self.db_path)
+        }
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Find duplicate pages within and across scanned PDFs")
+    parser.add_argument('pdfs', nargs='+')
+    parser.add_argument('--index', default='dedup_index.sqlite3', help='persistent page index (SQLite)')
+    parser.add_argument('--threshold', type=float, default=SIMILARITY_THRESHOLD,
+                        help='minimum estimated Jaccard similarity for a near-duplicate')
+    parser.add_argument('--add', action='store_true', help='add the scanned PDFs to the index afterwards')
+    args = parser.parse_args()
+
+    dedup = PageDeduplicator(args.index, threshold=args.threshold)
+    extractor = TextExtractor()
+    try:
+        for pdf_path in args.pdfs:
+            with extractor.open(pdf_path) as doc:
+                pages = list(doc.iter_pages())
+                doc_id = doc.file_hash
+
+            duplicates = dedup.find_duplicates(doc_id, pages)
+            print(f"\n{pdf_path}: {len(pages)} pages, {len(duplicates)} duplicates")
+            for page_number, match in sorted(duplicates.items()):
+                source = 'this scan' if match['same_document'] else f"document {match['doc_id'][:12]}"
+                kind = 'exact' if match['exact'] else f"similarity {match['similarity']:.2f}"
+                print(f"  page {page_number} duplicates {source} page {match['page_number']} ({kind})")
+
+            if args.add:
+                dedup.add_document(doc_id, pages)
+
+        print(f"\nIndex: {dedup.stats()}")
+    finally:
+        dedup.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,293 @@
+#!/usr/bin/env python3
+"""
+Client-side rate limiting and retries for Anthropic API calls.
+
+RateLimiter is the one concurrency-control object a DocumentAnalyzer and
+all its worker threads share. It does three things:
+
+- Bounds how many requests are in flight.
+- Keeps token buckets for requests, input tokens and output tokens per
+  minute. Output tokens are reserved at max_tokens and settled to actual
+  usage, the same way the API accounts for them. The buckets learn the
+  account's actual limits and remaining capacity from the
+  anthropic-ratelimit-* response headers, so a run fills its rate tier
+  without being told what the tier is.
+- Retries 429, 5xx/529 (overloaded) and connection errors with
+  exponential backoff and full jitter (NFR-3.1), honoring retry-after. A
+  429 pauses every thread, not just the one that hit it.
+
+The SDK's own retries should be off (max_retries=0) so attempts aren't
+multiplied.
+"""
+
+import random
+import threading
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Any, Callable, Dict, Optional
+
+try:
+    import anthropic
+except ImportError:
+    anthropic = None
+
+MAX_RETRIES = 6
+BACKOFF_BASE = 1.0
+BACKOFF_CAP = 60.0
+# Extra random delay on top of retry-after so paused threads don't all resume at once
+RETRY_AFTER_JITTER = 1.0
+
+MAX_IN_FLIGHT = 16
+
+RETRYABLE_STATUS = {408, 409, 429, 500, 502, 503, 504, 529}
+
+# Bucket name -> anthropic-ratelimit-<header>-{limit,remaining}
+RATE_LIMIT_HEADERS = {
+    'requests': 'requests',
+    'input_tokens': 'input-tokens',
+    'output_tokens': 'output-tokens',
+}
+
+
+def retry_after_seconds(headers) -> Optional[float]:
+    """Delay requested by retry-after-ms or retry-after (seconds or HTTP date), if any."""
+    if not headers:
+        return None
+    try:
+        if headers.get('retry-after-ms'):
+            return float(headers['retry-after-ms']) / 1000
+        value = headers.get('retry-after')
+        if not value:
+            return None
+        try:
+            return float(value)
+        except ValueError:
+            return max(0.0, (parsedate_to_datetime(value) - datetime.now(timezone.utc)).total_seconds())
+    except (TypeError, ValueError):
+        return None
+
+
+def is_retryable(error: Exception) -> bool:
+    """Whether a failed API call is worth retrying (rate limited, overloaded, transient)."""
+    response = getattr(error, 'response', None)
+    should_retry = response.headers.get('x-should-retry') if response is not None else None
+    if should_retry in ('true', 'false'):
+        return should_retry == 'true'
+    if anthropic and isinstance(error, anthropic.APIConnectionError):
+        return True
+    return getattr(error, 'status_code', None) in RETRYABLE_STATUS
+
+
+class TokenBucket:
+    """Per-minute capacity refilled continuously; not thread-safe (RateLimiter locks it)."""
+
+    def __init__(self, per_minute: Optional[float] = None):
+        self.capacity = per_minute
+        self.level = per_minute or 0.0
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float):
+        if self.capacity:
+            self.level = min(self.capacity, self.level + (now - self.updated) * self.capacity / 60)
+        self.updated = now
+
+    def wait_time(self, amount: float, now: float) -> float:
+        """Seconds until amount (or a full bucket, for larger amounts) is available."""
+        if not self.capacity or amount <= 0:
+            return 0.0
+        self._refill(now)
+        needed = min(amount, self.capacity) - self.level
+        return max(0.0, needed * 60 / self.capacity)
+
+    def take(self, amount: float, now: float):
+        if self.capacity:
+            self._refill(now)
+            self.level -= amount
+
+    def give(self, amount: float, now: float):
+        if self.capacity:
+            self._refill(now)
+            self.level = min(self.capacity, self.level + amount)
+
+    def sync(self, limit: Optional[float], remaining: Optional[float], now: float):
+        """Adopt the server's limit and, if lower than ours, its remaining capacity."""
+        if limit:
+            if self.capacity is None:
+                self.level = limit
+            self.capacity = limit
+        if remaining is not None and self.capacity:
+            self._refill(now)
+            self.level = min(self.level, remaining)
+
+
+class Permit:
+    """One request's reservation, handed to the function RateLimiter.call runs."""
+
+    def __init__(self, limiter: 'RateLimiter', input_tokens: int, max_tokens: int):
+        self.limiter = limiter
+        self.input_tokens = input_tokens
+        self.max_tokens = max_tokens
+        self.settled = False
+
+    def observe(self, headers):
+        """Update the limiter from a response's rate-limit headers."""
+        self.limiter.observe_headers(headers)
+
+    def settle(self, usage: Optional[Dict]):
+        """Correct the reservation to the tokens the API reports were used."""
+        if self.settled or not usage:
+            return
+        self.settled = True
+        self.limiter.settle(self, usage)
+
+
+class RateLimiter:
+    """Shared request/token-rate limits, in-flight cap and retry scheduling.
+
+    requests_per_minute, input_tokens_per_minute and output_tokens_per_minute
+    may be left as None; they are then learned from response headers and
+    nothing is throttled locally until they are.
+    """
+
+    def __init__(self, requests_per_minute: Optional[float] = None,
+                 input_tokens_per_minute: Optional[float] = None,
+                 output_tokens_per_minute: Optional[float] = None,
+                 max_in_flight: int = MAX_IN_FLIGHT, max_retries: int = MAX_RETRIES,
+                 backoff_base: float = BACKOFF_BASE, backoff_cap: float = BACKOFF_CAP,
+                 seed: Optional[int] = None):
+        self.buckets = {
+            'requests': TokenBucket(requests_per_minute),
+            'input_tokens': TokenBucket(input_tokens_per_minute),
+            'output_tokens': TokenBucket(output_tokens_per_minute),
+        }
+        self.max_in_flight = max(1, max_in_flight)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_cap = backoff_cap
+        self.random = random.Random(seed)
+        self.in_flight = 0
+        self.paused_until = 0.0
+        self.counters = {'requests': 0, 'retries': 0, 'rate_limited': 0, 'overloaded': 0,
+                         'failed': 0, 'wait_seconds': 0.0}
+        self._condition = threading.Condition()
+
+    def _acquire(self, input_tokens: int, max_tokens: int):
+        amounts = {'requests': 1, 'input_tokens': input_tokens, 'output_tokens': max_tokens}
+        start = time.monotonic()
+        with self._condition:
+            while True:
+                now = time.monotonic()
+                wait = max([self.paused_until - now]
+                           + [self.buckets[name].wait_time(amount, now) for name, amount in amounts.items()])
+                if self.in_flight < self.max_in_flight and wait <= 0:
+                    break
+                self._condition.wait(timeout=wait if wait > 0 else None)
+            for name, amount in amounts.items():
+                self.buckets[name].take(amount, now)
+            self.in_flight += 1
+            self.counters['requests'] += 1
+            self.counters['wait_seconds'] += now - start
+
+    def _release(self):
+        with self._condition:
+            self.in_flight -= 1
+            self._condition.notify_all()
+
+    def observe_headers(self, headers):
+        """Sync buckets with anthropic-ratelimit-* headers from any response."""
+        if not headers:
+            return
+        with self._condition:
+            now = time.monotonic()
+            for name, header in RATE_LIMIT_HEADERS.items():
+                limit = headers.get(f'anthropic-ratelimit-{header}-limit')
+                remaining = headers.get(f'anthropic-ratelimit-{header}-remaining')
+                try:
+                    self.buckets[name].sync(float(limit) if limit else None,
+                                            float(remaining) if remaining else None, now)
+                except ValueError:
+                    continue
+            self._condition.notify_all()
+
+    def settle(self, permit: Permit, usage: Dict):
+        """Return the unused part of a permit's reservations to the buckets."""
+        with self._condition:
+            now = time.monotonic()
+            used_input = (usage.get('input_tokens') or 0) + (usage.get('cache_creation_input_tokens') or 0)
+            self.buckets['input_tokens'].give(permit.input_tokens - used_input, now)
+            self.buckets['output_tokens'].give(permit.max_tokens - (usage.get('output_tokens') or 0), now)
+            self._condition.notify_all()
+
+    def pause(self, seconds: float):
+        """Hold every new request for seconds, e.g. after a 429."""
+        with self._condition:
+            self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+    def backoff(self, attempt: int, error: Exception) -> float:
+        """Delay before retry number attempt (0-based) after error."""
+        response = getattr(error, 'response', None)
+        retry_after = retry_after_seconds(response.headers if response is not None else None)
+        if retry_after is not None:
+            return retry_after + self.random.uniform(0, RETRY_AFTER_JITTER)
+        # Full jitter: uniform over the exponential window
+        return self.random.uniform(0, min(self.backoff_cap, self.backoff_base * 2 ** attempt))
+
+    def _note_failure(self, error: Exception):
+        response = getattr(error, 'response', None)
+        if response is not None:
+            self.observe_headers(response.headers)
+        status = getattr(error, 'status_code', None)
+        with self._condition:
+            if status == 429:
+                self.counters['rate_limited'] += 1
+            elif status == 529:
+                self.counters['overloaded'] += 1
+
+    def retry(self, function: Callable[..., Any], *args, **kwargs) -> Any:
+        """function(*args, **kwargs), retried with backoff; no rate accounting (e.g. batch endpoints)."""
+        return self._with_retries(lambda: function(*args, **kwargs))
+
+    def call(self, send: Callable[[Permit], Any], input_tokens: int = 0, max_tokens: int = 0) -> Any:
+        """Run send(permit) under the rate limits, retrying transient failures.
+
+        send makes one API request; it should pass the response headers to
+        permit.observe and the usage to permit.settle. Non-retryable errors,
+        and the last error once retries run out, propagate.
+        """
+        def attempt():
+            self._acquire(input_tokens, max_tokens)
+            try:
+                return send(Permit(self, input_tokens, max_tokens))
+            finally:
+                self._release()
+
+        return self._with_retries(attempt)
+
+    def _with_retries(self, attempt: Callable[[], Any]) -> Any:
+        for retry in range(self.max_retries + 1):
+            try:
+                return attempt()
+            except Exception as e:
+                self._note_failure(e)
+                if retry == self.max_retries or not is_retryable(e):
+                    with self._condition:
+                        self.counters['failed'] += 1
+                    raise
+                delay = self.backoff(retry, e)
+                if getattr(e, 'status_code', None) == 429:
+                    self.pause(delay)
+                with self._condition:
+                    self.counters['retries'] += 1
+                time.sleep(delay)
+
+    def stats(self) -> Dict:
+        """Request, retry and wait counters (wait summed over threads), and bucket capacity/level."""
+        with self._condition:
+            now = time.monotonic()
+            buckets = {}
+            for name, bucket in self.buckets.items():
+                bucket._refill(now)
+                buckets[name] = {'per_minute': bucket.capacity,
+                                 'available': round(bucket.level) if bucket.capacity else None}
+            return {**self.counters, 'wait_seconds': round(self.counters['wait_seconds'], 3), 'limits': buckets}
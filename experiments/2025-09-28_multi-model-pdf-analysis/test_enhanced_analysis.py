@@ -5,6 +5,7 @@ Test enhanced analysis with ABBYY OCR PDF and updated prompts
 
 import json
 import time
+from json_stream import JSONObjectExtractor
 from llm_document_analyzer import DocumentAnalyzer
 
 def test_enhanced_analysis():
@@ -39,10 +40,16 @@ def test_enhanced_analysis():
         print("📊 ANALYSIS RESULTS:")
         print("=" * 30)
 
-        # Parse the response
+        # Parse the response; the JSON object may be wrapped in prose
         try:
             if 'response' in result:
-                analysis = json.loads(result['response'])
+                extractor = JSONObjectExtractor()
+                extractor.feed(result['response'])
+                analysis = extractor.finish()
+                if analysis is None:
+                    raise json.JSONDecodeError(
+                        extractor.error or "No JSON object found", result['response'], 0
+                    )
 
                 print(f"🎯 Confidence: {analysis.get('analysis_confidence', 'N/A')}%")
                 print(f"📄 Document Count: {analysis.get('document_count', 'N/A')}")
@@ -96,7 +103,8 @@ def test_enhanced_analysis():
                             "processing_time": processing_time
                         },
                         "raw_result": result,
-                        "parsed_analysis": analysis
+                        "parsed_analysis": analysis,
+                        "extra_observations": extractor.trailing.strip() or None
                     }, f, indent=2)
 
                 print(f"💾 Detailed results saved to: {output_file}")
@@ -0,0 +1,382 @@
+#!/usr/bin/env python3
+"""
+Multi-extractor PDF text engine with per-page fallback and memoization.
+Each page is tried with the fastest extractor first (pypdf, or PyPDF2 when
+pypdf isn't installed) and only falls back to the others (pdfplumber, then
+pypdfium2) when the yield is empty or garbled, as with the WESTFIELD scan
+where one library returned 0 characters and another didn't. Results are memoized per
+(file hash, page, extractor), optionally in SQLite so reruns skip extraction.
+"""
+
+import hashlib
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Sequence
+
+try:
+    import pypdf
+except ImportError:
+    pypdf = None
+
+try:
+    import PyPDF2
+except ImportError:
+    PyPDF2 = None
+
+try:
+    import pdfplumber
+except ImportError:
+    pdfplumber = None
+
+try:
+    import pypdfium2
+except ImportError:
+    pypdfium2 = None
+
+# Fallback order; 'pypdf' is served by PyPDF2 when only the older package exists
+EXTRACTORS = ('pypdf', 'pdfplumber', 'pypdfium2')
+
+# Page texts kept by the in-memory cache TextExtractor creates by default
+MEMORY_CACHE_PAGES = 2000
+# put() lets the cache grow this share past max_entries before trimming it
+EVICTION_SLACK = 0.1
+
+# A page needs at least this many non-whitespace characters to count as extracted
+MIN_PAGE_CHARS = 10
+
+# Share of control characters, U+FFFD and (cid:N) markers above which
+# a page's text is treated as garbled
+MAX_GARBLE_RATIO = 0.1
+
+# C0/C1 control characters other than ordinary whitespace, as code points;
+# str.translate(DELETE_CONTROL) strips them
+CONTROL_CHARS = frozenset(c for c in range(0x20) if chr(c) not in '\t\n\r') | frozenset(range(0x7f, 0xa0))
+DELETE_CONTROL = dict.fromkeys(CONTROL_CHARS)
+_DELETE_GARBLED = dict.fromkeys(CONTROL_CHARS | {0xfffd})
+
+
+def available_extractors() -> List[str]:
+    """Extractors whose library is installed, fastest first."""
+    installed = {'pypdf': bool(pypdf or PyPDF2), 'pdfplumber': bool(pdfplumber), 'pypdfium2': bool(pypdfium2)}
+    return [name for name in EXTRACTORS if installed[name]]
+
+
+def file_sha256(pdf_path: str, chunk_size: int = 1024 * 1024) -> str:
+    sha256 = hashlib.sha256()
+    with open(pdf_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            sha256.update(chunk)
+    return sha256.hexdigest()
+
+
+def garble_ratio(text: str) -> float:
+    """Share of characters that are control characters, U+FFFD or (cid:N) markers."""
+    if not text:
+        return 0.0
+    garbled = len(text) - len(text.translate(_DELETE_GARBLED)) + text.count('(cid:') * 6
+    return min(1.0, garbled / len(text))
+
+
+def text_is_usable(text: str, min_chars: int = MIN_PAGE_CHARS) -> bool:
+    """True if text has enough content and isn't garbled."""
+    return len(''.join(text.split())) >= min_chars and garble_ratio(text) <= MAX_GARBLE_RATIO
+
+
+class ExtractionCache:
+    """SQLite store of extracted page text keyed by (file hash, page, extractor).
+
+    db_path ':memory:' keeps the cache for the life of the process only.
+    With max_entries, the least recently used pages are dropped once the
+    cache grows EVICTION_SLACK past it.
+    """
+
+    def __init__(self, db_path: str = ':memory:', max_entries: Optional[int] = None):
+        self.in_memory = str(db_path) == ':memory:'
+        self.db_path = Path(db_path)
+        if not self.in_memory:
+            self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.db_path), check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS page_text (
+                file_hash TEXT NOT NULL,
+                page INTEGER NOT NULL,
+                extractor TEXT NOT NULL,
+                text TEXT NOT NULL,
+                seconds REAL,
+                created REAL NOT NULL,
+                last_used REAL,
+                PRIMARY KEY (file_hash, page, extractor)
+            )
+        """)
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(page_text)")}
+        if 'last_used' not in columns:
+            self._conn.execute("ALTER TABLE page_text ADD COLUMN last_used REAL")
+        self._conn.commit()
+
+        self._entries = self._conn.execute("SELECT COUNT(*) FROM page_text").fetchone()[0]
+        self._evict_above = (max_entries + max(1, int(max_entries * EVICTION_SLACK))
+                             if max_entries is not None else None)
+
+    def get(self, file_hash: str, page: int, extractor: str) -> Optional[str]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT text FROM page_text WHERE file_hash = ? AND page = ? AND extractor = ?",
+                (file_hash, page, extractor)
+            ).fetchone()
+            if row:
+                if self.max_entries is not None:
+                    self._conn.execute(
+                        "UPDATE page_text SET last_used = ? WHERE file_hash = ? AND page = ? AND extractor = ?",
+                        (time.time(), file_hash, page, extractor)
+                    )
+                    self._conn.commit()
+                self.hits += 1
+                return row[0]
+            self.misses += 1
+            return None
+
+    def put(self, file_hash: str, page: int, extractor: str, text: str, seconds: Optional[float] = None):
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO page_text (file_hash, page, extractor, text, seconds, created, last_used) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (file_hash, page, extractor, text, seconds, now, now)
+            )
+            self._entries += 1
+            if self._evict_above is not None and self._entries > self._evict_above:
+                self._conn.execute("""
+                    DELETE FROM page_text WHERE rowid IN (
+                        SELECT rowid FROM page_text ORDER BY last_used DESC LIMIT -1 OFFSET ?
+                    )
+                """, (self.max_entries,))
+                self._entries = self._conn.execute("SELECT COUNT(*) FROM page_text").fetchone()[0]
+            self._conn.commit()
+
+    def stats(self) -> Dict:
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM page_text").fetchone()[0]
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+            'entries': entries,
+            'db_path': str(self.db_path)
+        }
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class PDFDocument:
+    """A PDF opened at most once per extractor library.
+
+    Parsed documents are created on first use and shared by metadata, text
+    and per-page fallback, and page text is memoized per (page, extractor)
+    in memory and, with a cache, on disk under the file's content hash.
+    """
+
+    LIBRARIES = EXTRACTORS
+
+    def __init__(self, pdf_path: str, cache: Optional[ExtractionCache] = None,
+                 extractors: Optional[Sequence[str]] = None, min_chars: int = MIN_PAGE_CHARS,
+                 file_hash: Optional[str] = None):
+        self.file_path = pdf_path
+        self.cache = cache
+        self.extractors = list(extractors) if extractors else available_extractors()
+        self.min_chars = min_chars
+        self._file_hash = file_hash
+        self._parsed = {}
+        self._errors = {}
+        self._text = {}
+        self._page_count = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    @property
+    def file_hash(self) -> str:
+        if self._file_hash is None:
+            self._file_hash = file_sha256(self.file_path)
+        return self._file_hash
+
+    def parsed(self, library: str):
+        """Return the library's parsed document; raises if it can't be opened.
+
+        Besides the extractors, 'pypdfium2' opens the file for rendering.
+        """
+        if library in self._errors:
+            raise self._errors[library]
+        if library not in self._parsed:
+            try:
+                if library == 'pypdf':
+                    module = pypdf or PyPDF2
+                    if not module:
+                        raise ImportError("pypdf not installed (pip install pypdf)")
+                    self._parsed[library] = module.PdfReader(self.file_path)
+                elif library == 'pdfplumber':
+                    if not pdfplumber:
+                        raise ImportError("pdfplumber not installed (pip install pdfplumber)")
+                    self._parsed[library] = pdfplumber.open(self.file_path)
+                elif library == 'pypdfium2':
+                    if not pypdfium2:
+                        raise ImportError("pypdfium2 not installed (pip install pypdfium2)")
+                    self._parsed[library] = pypdfium2.PdfDocument(self.file_path)
+                else:
+                    raise ValueError(f"Unknown PDF library: {library}")
+            except Exception as e:
+                self._errors[library] = e
+                raise
+        return self._parsed[library]
+
+    def page_count(self, library: Optional[str] = None) -> int:
+        """Page count from the given library, or the first one that opens the file."""
+        if library:
+            return self._library_page_count(library)
+        if self._page_count is None:
+            error = None
+            for name in self.extractors:
+                try:
+                    self._page_count = self._library_page_count(name)
+                    break
+                except Exception as e:
+                    error = e
+            else:
+                raise error or ValueError("No PDF extractor available")
+        return self._page_count
+
+    def _library_page_count(self, library: str) -> int:
+        parsed = self.parsed(library)
+        return len(parsed) if library == 'pypdfium2' else len(parsed.pages)
+
+    def _extract_text(self, library: str, page: int) -> str:
+        if library != 'pypdfium2':
+            return self.parsed(library).pages[page].extract_text() or ''
+        pdf_page = self.parsed(library)[page]
+        textpage = pdf_page.get_textpage()
+        try:
+            return textpage.get_text_range().replace('\r\n', '\n')
+        finally:
+            textpage.close()
+            pdf_page.close()
+
+    def page_text(self, library: str, page: int = 0) -> str:
+        """Text of a 0-based page from one specific library, memoized."""
+        key = (library, page)
+        if key in self._text:
+            return self._text[key]
+
+        text = self.cache.get(self.file_hash, page, library) if self.cache else None
+        if text is None:
+            start = time.perf_counter()
+            text = self._extract_text(library, page)
+            if self.cache:
+                self.cache.put(self.file_hash, page, library, text, time.perf_counter() - start)
+
+        self._text[key] = text
+        return text
+
+    def extract_page(self, page: int) -> Dict:
+        """Extract a 0-based page, falling back through extractors as needed.
+
+        Returns the first usable result, or else the result with the most
+        non-garbled text. 'tried' lists the extractors run, in order.
+        """
+        best = None
+        best_score = -1.0
+        tried = []
+        for library in self.extractors:
+            try:
+                text = self.page_text(library, page)
+            except Exception:
+                continue
+            tried.append(library)
+            if text_is_usable(text, self.min_chars):
+                best = (library, text)
+                break
+            score = len(text.strip()) * (1 - garble_ratio(text))
+            if score > best_score:
+                best, best_score = (library, text), score
+
+        library, text = best or (None, '')
+        return {
+            'page_number': page + 1,
+            'text': text,
+            'char_count': len(text),
+            'extractor': library,
+            'tried': tried
+        }
+
+    def iter_pages(self, start: int = 0, end: Optional[int] = None) -> Iterator[Dict]:
+        """Yield extract_page results for 0-based pages [start, end)."""
+        end = self.page_count() if end is None else min(end, self.page_count())
+        for page in range(start, end):
+            yield self.extract_page(page)
+
+    def close(self):
+        for library in ('pdfplumber', 'pypdfium2'):
+            pdf = self._parsed.pop(library, None)
+            if pdf is not None:
+                pdf.close()
+        self._parsed.clear()
+
+
+class TextExtractor:
+    """Opens PDFs for fallback extraction with shared settings and cache.
+
+    Without a cache, page text is memoized in an in-memory ExtractionCache
+    of up to MEMORY_CACHE_PAGES pages, so the same file extracted twice in
+    one run is only decoded once.
+    """
+
+    def __init__(self, cache: Optional[ExtractionCache] = None,
+                 extractors: Optional[Sequence[str]] = None, min_chars: int = MIN_PAGE_CHARS):
+        self.cache = cache or ExtractionCache(max_entries=MEMORY_CACHE_PAGES)
+        self.extractors = list(extractors) if extractors else available_extractors()
+        self.min_chars = min_chars
+
+    def open(self, pdf_path: str, file_hash: Optional[str] = None) -> PDFDocument:
+        return PDFDocument(pdf_path, cache=self.cache, extractors=self.extractors,
+                           min_chars=self.min_chars, file_hash=file_hash)
+
+    def extract_pages(self, pdf_path: str, start: int = 0, end: Optional[int] = None) -> List[Dict]:
+        with self.open(pdf_path) as doc:
+            return list(doc.iter_pages(start, end))
+
+    def worker_args(self) -> Dict:
+        """Settings to recreate this extractor in another process."""
+        return {
+            'cache_path': None if self.cache.in_memory else str(self.cache.db_path),
+            'extractors': self.extractors,
+            'min_chars': self.min_chars
+        }
+
+
+def extract_page_range(pdf_path: str, start: int, end: int, file_hash: Optional[str] = None,
+                       cache_path: Optional[str] = None, extractors: Optional[Sequence[str]] = None,
+                       min_chars: int = MIN_PAGE_CHARS) -> List[Dict]:
+    """Extract 0-based pages [start, end) in a worker process.
+
+    Workers open their own cache connection; SQLite WAL lets them share it.
+    """
+    cache = ExtractionCache(cache_path) if cache_path else None
+    try:
+        with PDFDocument(pdf_path, cache=cache, extractors=extractors, min_chars=min_chars,
+                         file_hash=file_hash) as doc:
+            return list(doc.iter_pages(start, end))
+    finally:
+        if cache:
+            cache.close()
@@ -0,0 +1,237 @@
+#!/usr/bin/env python3
+"""
+Token accounting for prompts built from extracted page text.
+
+TokenCounter estimates input tokens locally (a word/number/punctuation
+split that errs high) and calibrates itself against the input tokens the
+API reports, so estimates made before a call converge on what the call is
+billed. trim_pages drops whitespace padding, separator rules and headers
+or footers repeated on most pages; pack_pages groups page sections into
+prompts that fit a token budget.
+
+Usage:
+    python token_budget.py scan.pdf [more.pdf ...] [--budget 100000]
+"""
+
+import argparse
+import math
+import re
+import threading
+from collections import Counter
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from text_extraction import TextExtractor
+
+# Default ceiling for one prompt's input tokens; well inside a 200k context
+# window with room for max_tokens of output
+DEFAULT_TOKEN_BUDGET = 100000
+
+# Letters per token for words and digits per token for numbers in the raw
+# estimate; both err on the high side for English prose and statements
+WORD_CHARS_PER_TOKEN = 5
+DIGITS_PER_TOKEN = 3
+
+# Reported input tokens needed before the estimate switches to the observed scale
+MIN_CALIBRATION_TOKENS = 2000
+SCALE_LIMITS = (0.5, 2.0)
+
+# A line on at least this many pages, and on at least this share of the
+# pages, is a header or footer; only its first occurrence is kept
+BOILERPLATE_MIN_PAGES = 3
+BOILERPLATE_MIN_SHARE = 0.5
+BOILERPLATE_MIN_CHARS = 8
+
+TRUNCATION_NOTE = "[... page text truncated to fit the token budget]"
+
+_PIECES = re.compile(r"[^\W\d_]+|\d+|\n+|[ \t]{2,}|[^\w\s]|_")
+_SPACE_RUNS = re.compile(r"[ \t]{2,}")
+_BLANK_LINES = re.compile(r"\n{3,}")
+_SEPARATOR_LINE = re.compile(r"^[\s\-_=*.·•~#|+]{4,}$")
+
+
+class TokenCounter:
+    """Local token estimates, calibrated against API-reported input tokens.
+
+    Thread-safe; one counter is shared by all calls of a DocumentAnalyzer.
+    """
+
+    def __init__(self, scale: float = 1.0):
+        """scale is the estimate/raw ratio to use until enough calls are observed."""
+        self.default_scale = scale
+        self.raw_total = 0
+        self.actual_total = 0
+        self.samples = 0
+        self.abs_error = 0.0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def raw_tokens(text: str) -> int:
+        """Uncalibrated token count: words by length, numbers by digits, one per symbol."""
+        tokens = 0
+        for piece in _PIECES.findall(text):
+            if piece[0].isdigit():
+                tokens += math.ceil(len(piece) / DIGITS_PER_TOKEN)
+            elif piece[0].isalpha():
+                tokens += math.ceil(len(piece) / WORD_CHARS_PER_TOKEN)
+            else:
+                tokens += 1
+        return tokens
+
+    @property
+    def scale(self) -> float:
+        """Observed actual/raw ratio once calibrated, else the default."""
+        if self.raw_total < MIN_CALIBRATION_TOKENS:
+            return self.default_scale
+        low, high = SCALE_LIMITS
+        return min(high, max(low, self.actual_total / self.raw_total))
+
+    def scaled(self, raw: int) -> int:
+        """Estimate for a raw count."""
+        return math.ceil(raw * self.scale)
+
+    def estimate(self, text: str) -> int:
+        """Estimated input tokens for text."""
+        return self.scaled(self.raw_tokens(text))
+
+    def observe(self, raw: int, actual: int):
+        """Record the input tokens the API reported for a prompt with this raw count."""
+        if raw <= 0 or actual <= 0:
+            return
+        with self._lock:
+            estimate = self.scaled(raw)
+            self.abs_error += abs(estimate - actual) / actual
+            self.samples += 1
+            self.raw_total += raw
+            self.actual_total += actual
+
+    def stats(self) -> Dict:
+        """Calibration state and mean absolute error of estimates made before each call."""
+        return {
+            'samples': self.samples,
+            'scale': round(self.scale, 4),
+            'calibrated': self.raw_total >= MIN_CALIBRATION_TOKENS,
+            'mean_abs_error': round(self.abs_error / self.samples, 4) if self.samples else None
+        }
+
+
+def reported_input_tokens(usage: Optional[Dict]) -> int:
+    """All input tokens of a call, whether billed fresh, written to or read from the prompt cache."""
+    if not usage:
+        return 0
+    return sum(usage.get(field) or 0
+               for field in ('input_tokens', 'cache_creation_input_tokens', 'cache_read_input_tokens'))
+
+
+def clean_page_text(text: str) -> str:
+    """Strip trailing spaces, separator rules and runs of spaces or blank lines."""
+    lines = [_SPACE_RUNS.sub('  ', line).rstrip() for line in text.split('\n')]
+    text = '\n'.join(line for line in lines if not _SEPARATOR_LINE.match(line))
+    return _BLANK_LINES.sub('\n\n', text).strip()
+
+
+def trim_pages(pages: List[Dict], skip: Iterable[int] = ()) -> Tuple[List[Dict], List[str]]:
+    """Clean each page's text and keep only the first copy of repeated headers/footers.
+
+    Pages whose page_number is in skip are left as they are and don't count
+    towards boilerplate. Lines that differ between pages, such as
+    "Page 3 of 12", are never dropped. Returns (trimmed page copies,
+    boilerplate lines dropped).
+    """
+    skip = set(skip)
+    cleaned = [dict(page, text=clean_page_text(page['text'])) if page['page_number'] not in skip else page
+               for page in pages]
+
+    counted = [page for page in cleaned if page['page_number'] not in skip]
+    line_pages = Counter()
+    for page in counted:
+        line_pages.update({line.strip() for line in page['text'].split('\n')
+                           if len(line.strip()) >= BOILERPLATE_MIN_CHARS})
+    min_pages = max(BOILERPLATE_MIN_PAGES, math.ceil(len(counted) * BOILERPLATE_MIN_SHARE))
+    boilerplate = {line for line, count in line_pages.items() if count >= min_pages}
+    if not boilerplate:
+        return cleaned, []
+
+    seen = set()
+    trimmed = []
+    for page in cleaned:
+        if page['page_number'] in skip:
+            trimmed.append(page)
+            continue
+        kept = []
+        for line in page['text'].split('\n'):
+            key = line.strip()
+            if key in boilerplate:
+                if key in seen:
+                    continue
+                seen.add(key)
+            kept.append(line)
+        trimmed.append(dict(page, text='\n'.join(kept)))
+    return trimmed, sorted(boilerplate)
+
+
+def truncate_to_tokens(text: str, max_tokens: int, estimate: Callable[[str], int]) -> str:
+    """Cut text (at a line or word boundary where possible) so it and a truncation note fit max_tokens."""
+    if estimate(text) <= max_tokens:
+        return text
+    allowance = max(0, max_tokens - estimate('\n' + TRUNCATION_NOTE))
+    low, high = 0, len(text)
+    while low < high:
+        middle = (low + high + 1) // 2
+        if estimate(text[:middle]) <= allowance:
+            low = middle
+        else:
+            high = middle - 1
+    cut = text[:low]
+    boundary = max(cut.rfind('\n'), cut.rfind(' '))
+    if boundary > low * 0.8:
+        cut = cut[:boundary]
+    return cut.rstrip() + '\n' + TRUNCATION_NOTE
+
+
+def pack_pages(sections: Sequence[str], budget: int, estimate: Callable[[str], int],
+               separator: str = '\n\n', min_per_chunk: int = 1) -> List[List[int]]:
+    """Group consecutive sections into chunks whose joined text fits budget tokens.
+
+    Returns lists of section indexes, in order. A chunk is only closed once
+    it holds min_per_chunk sections, so a section larger than the budget
+    still gets a chunk of its own (with min_per_chunk=1) instead of being
+    dropped.
+    """
+    separator_tokens = estimate(separator)
+    chunks, current, used = [], [], 0
+    for index, section in enumerate(sections):
+        tokens = estimate(section) + (separator_tokens if current else 0)
+        if current and used + tokens > budget and len(current) >= min_per_chunk:
+            chunks.append(current)
+            current, used = [], 0
+            tokens = estimate(section)
+        current.append(index)
+        used += tokens
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Estimate prompt tokens for PDFs before and after trimming")
+    parser.add_argument('pdfs', nargs='+')
+    parser.add_argument('--budget', type=int, default=DEFAULT_TOKEN_BUDGET, help='input tokens per prompt')
+    args = parser.parse_args()
+
+    counter = TokenCounter()
+    extractor = TextExtractor()
+    for pdf_path in args.pdfs:
+        pages = extractor.extract_pages(pdf_path)
+        trimmed, boilerplate = trim_pages(pages)
+        before = sum(counter.estimate(page['text']) for page in pages)
+        after = [counter.estimate(page['text']) for page in trimmed]
+        chunks = pack_pages([page['text'] for page in trimmed], args.budget, counter.estimate)
+        print(f"\n{pdf_path}")
+        print(f"  {len(pages)} pages, ~{before} tokens raw, ~{sum(after)} trimmed "
+              f"({len(boilerplate)} boilerplate lines), {len(chunks)} prompt(s) at {args.budget} tokens")
+        if after:
+            print(f"  largest page ~{max(after)} tokens")
+
+
+if __name__ == '__main__':
+    main()
@@ -2,12 +2,36 @@
 """
 Analyze differences between original PDF and paperless-processed PDF
 to understand why text extraction is failing.
+
+Files are compared in fixed-size chunks through mmap, stopping at the first
+difference, and each PDF is parsed once per library with the parsed objects
+shared by the metadata, text and character analysis. Text samples come from
+the shared extraction engine (text_extraction.py); method='auto' uses its
+per-page fallback instead of a fixed library; put that experiment's
+directory on PYTHONPATH.
+
+Usage (with PYTHONPATH=../2025-09-28_multi-model-pdf-analysis):
+    python analyze_pdf_differences.py                          # the sample pair
+    python analyze_pdf_differences.py original.pdf paperless.pdf
+    python analyze_pdf_differences.py --pairs pairs.csv [--processes 8] [--report report.json]
+    python analyze_pdf_differences.py --dirs originals/ paperless/ [--processes 8]
 """
 
+import argparse
+import csv
+import hashlib
+import json
+import mmap
 import os
 import sys
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 
+from text_extraction import CONTROL_CHARS, PDFDocument
+
+COMPARE_CHUNK_SIZE = 1024 * 1024
+HEADER_SIZE = 100
+
 def analyze_file_properties(file_path):
     """Analyze basic file properties."""
     path = Path(file_path)
@@ -22,171 +46,224 @@ def analyze_file_properties(file_path):
         'readable': os.access(file_path, os.R_OK)
     }
 
-def read_pdf_metadata(file_path):
-    """Try to read PDF metadata using different methods."""
+def _map_file(f):
+    """mmap an open file for reading; empty files map to b''."""
+    if os.fstat(f.fileno()).st_size == 0:
+        return b''
+    return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+def analyze_binary_differences(file1_path, file2_path, chunk_size=COMPARE_CHUNK_SIZE, digests=False):
+    """Compare binary content of two files.
+
+    Different sizes settle the comparison without reading the contents;
+    equal-sized files are compared chunk by chunk and the scan stops at the
+    first differing chunk, which is then narrowed to the exact byte offset.
+    With digests=True both files are read to the end instead and their
+    SHA-256 digests are hashed from the same chunks ('sha256_1', 'sha256_2').
+    """
+    try:
+        with open(file1_path, 'rb') as f1, open(file2_path, 'rb') as f2:
+            data1 = _map_file(f1)
+            data2 = _map_file(f2)
+            try:
+                header1 = bytes(data1[:HEADER_SIZE])
+                header2 = bytes(data2[:HEADER_SIZE])
+                size1, size2 = len(data1), len(data2)
+                identical = size1 == size2
+                first_difference = None
+                sha256_1, sha256_2 = hashlib.sha256(), hashlib.sha256()
+
+                scan_size = max(size1, size2) if digests else (size1 if identical else 0)
+                for start in range(0, scan_size, chunk_size):
+                    chunk1 = data1[start:start + chunk_size]
+                    chunk2 = data2[start:start + chunk_size]
+                    if digests:
+                        sha256_1.update(chunk1)
+                        sha256_2.update(chunk2)
+                    if identical and chunk1 != chunk2:
+                        identical = False
+                        first_difference = start + next(
+                            i for i, (a, b) in enumerate(zip(chunk1, chunk2)) if a != b
+                        )
+                        if not digests:
+                            break
+            finally:
+                for data in (data1, data2):
+                    if data:
+                        data.close()
+
+            result = {
+                'identical': identical,
+                'size_diff': size2 - size1,
+                'first_difference': first_difference,
+                'header1': header1,
+                'header2': header2,
+                'header_identical': header1 == header2
+            }
+            if digests:
+                result['sha256_1'] = sha256_1.hexdigest()
+                result['sha256_2'] = sha256_2.hexdigest()
+            return result
+    except Exception as e:
+        return {'error': str(e)}
+
+def _as_document(pdf):
+    return pdf if isinstance(pdf, PDFDocument) else PDFDocument(pdf)
+
+def read_pdf_metadata(pdf):
+    """Read PDF metadata with each library (pdf is a path or PDFDocument)."""
+    doc = _as_document(pdf)
     results = {}
 
     # Try with pypdf first (lightweight)
     try:
-        import pypdf
-        with open(file_path, 'rb') as f:
-            reader = pypdf.PdfReader(f)
-            results['pypdf'] = {
-                'pages': len(reader.pages),
-                'metadata': reader.metadata,
-                'encrypted': reader.is_encrypted,
-                'success': True
-            }
+        reader = doc.parsed('pypdf')
+        results['pypdf'] = {
+            'pages': len(reader.pages),
+            'metadata': reader.metadata,
+            'encrypted': reader.is_encrypted,
+            'success': True
+        }
     except Exception as e:
         results['pypdf'] = {'error': str(e), 'success': False}
 
     # Try with pdfplumber (more robust)
     try:
-        import pdfplumber
-        with pdfplumber.open(file_path) as pdf:
-            results['pdfplumber'] = {
-                'pages': len(pdf.pages),
-                'metadata': pdf.metadata,
-                'success': True
-            }
+        plumber = doc.parsed('pdfplumber')
+        results['pdfplumber'] = {
+            'pages': len(plumber.pages),
+            'metadata': plumber.metadata,
+            'success': True
+        }
     except Exception as e:
         results['pdfplumber'] = {'error': str(e), 'success': False}
 
+    if doc is not pdf:
+        doc.close()
     return results
 
-def extract_text_sample(file_path, method='pypdf'):
-    """Extract a sample of text using specified method."""
-    try:
-        if method == 'pypdf':
-            import pypdf
-            with open(file_path, 'rb') as f:
-                reader = pypdf.PdfReader(f)
-                if len(reader.pages) > 0:
-                    text = reader.pages[0].extract_text()
-                    return {
-                        'method': method,
-                        'text_length': len(text),
-                        'first_100_chars': text[:100],
-                        'success': True,
-                        'full_text': text  # For detailed analysis
-                    }
-
-        elif method == 'pdfplumber':
-            import pdfplumber
-            with pdfplumber.open(file_path) as pdf:
-                if len(pdf.pages) > 0:
-                    text = pdf.pages[0].extract_text()
-                    return {
-                        'method': method,
-                        'text_length': len(text) if text else 0,
-                        'first_100_chars': text[:100] if text else '',
-                        'success': True,
-                        'full_text': text  # For detailed analysis
-                    }
+def extract_text_sample(pdf, method='pypdf'):
+    """Extract a sample of text using specified method (pdf is a path or PDFDocument).
 
-    except Exception as e:
-        return {'method': method, 'error': str(e), 'success': False}
-
-def analyze_binary_differences(file1_path, file2_path):
-    """Compare binary content of two files."""
+    method is a library name, or 'auto' for per-page fallback across libraries.
+    """
+    doc = _as_document(pdf)
     try:
-        with open(file1_path, 'rb') as f1, open(file2_path, 'rb') as f2:
-            content1 = f1.read()
-            content2 = f2.read()
-
-            # Check if files are identical
-            identical = content1 == content2
-
-            # Look at headers
-            header1 = content1[:100]
-            header2 = content2[:100]
-
+        if method == 'auto':
+            page = doc.extract_page(0)
             return {
-                'identical': identical,
-                'size_diff': len(content2) - len(content1),
-                'header1': header1,
-                'header2': header2,
-                'header_identical': header1 == header2
+                'method': page['extractor'] or method,
+                'text_length': page['char_count'],
+                'first_100_chars': page['text'][:100],
+                'success': page['extractor'] is not None,
+                'full_text': page['text']
             }
-    except Exception as e:
-        return {'error': str(e)}
+        if doc.page_count(method) > 0:
+            text = doc.page_text(method, 0)
+            return {
+                'method': method,
+                'text_length': len(text),
+                'first_100_chars': text[:100],
+                'success': True,
+                'full_text': text  # For detailed analysis
+            }
+        return {'method': method, 'error': 'no pages', 'success': False}
 
-def main():
-    # File paths
-    original_file = "../../samples/FirstEnergy-110160220841-090827483643-.pdf"
-    paperless_file = "../../samples/2025-10-03-Unlesbarer-Dokumentinhalt.pdf"
+    except Exception as e:
+        return {'method': method, 'error': str(e), 'success': False}
+    finally:
+        if doc is not pdf:
+            doc.close()
+
+def special_character_counts(text, limit=500):
+    """Count non-ASCII and control characters in the first `limit` chars."""
+    special_chars = {}
+    for char in text[:limit]:
+        if ord(char) > 127 or ord(char) in CONTROL_CHARS:
+            special_chars[char] = special_chars.get(char, 0) + 1
+    return special_chars
+
+def compare_pair(original_file, paperless_file, digests=False):
+    """Run every comparison on one original/paperless pair.
+
+    Each file is parsed at most once per library. Returns a dict suitable for
+    printing or a JSON report; digests=True adds both files' SHA-256 to
+    result['binary'].
+    """
+    result = {
+        'original': str(original_file),
+        'paperless': str(paperless_file),
+        'original_props': analyze_file_properties(original_file),
+        'paperless_props': analyze_file_properties(paperless_file)
+    }
+    if not result['original_props'] or not result['paperless_props']:
+        result['error'] = 'file not found'
+        return result
+
+    binary_diff = analyze_binary_differences(original_file, paperless_file, digests=digests)
+    result['binary'] = {key: value for key, value in binary_diff.items() if not key.startswith('header')}
+    result['binary']['header_identical'] = binary_diff.get('header_identical')
+
+    with PDFDocument(original_file) as original, PDFDocument(paperless_file) as paperless:
+        for label, doc in (('original', original), ('paperless', paperless)):
+            result[f'{label}_metadata'] = read_pdf_metadata(doc)
+            result[f'{label}_text'] = {
+                method: extract_text_sample(doc, method) for method in (*PDFDocument.LIBRARIES, 'auto')
+            }
 
-    print("=== PDF Analysis: Original vs Paperless ===\n")
+    paper_text = result['paperless_text']['pypdf'].get('full_text') or ''
+    result['special_chars'] = special_character_counts(paper_text)
+    return result
 
-    # Analyze file properties
+def print_comparison(result):
+    """Print one pair's comparison in the original report format."""
     print("File Properties:")
-    orig_props = analyze_file_properties(original_file)
-    paper_props = analyze_file_properties(paperless_file)
-
-    print(f"Original:  {orig_props}")
-    print(f"Paperless: {paper_props}")
+    print(f"Original:  {result['original_props']}")
+    print(f"Paperless: {result['paperless_props']}")
     print()
 
-    if not orig_props or not paper_props:
+    if result.get('error'):
         print("ERROR: One or both files not found!")
         return
 
     # Analyze binary differences
+    binary_diff = result['binary']
     print("Binary Comparison:")
-    binary_diff = analyze_binary_differences(original_file, paperless_file)
     print(f"Files identical: {binary_diff.get('identical', False)}")
     print(f"Size difference: {binary_diff.get('size_diff', 'unknown')} bytes")
+    if binary_diff.get('first_difference') is not None:
+        print(f"First difference at byte: {binary_diff['first_difference']}")
     print(f"Headers identical: {binary_diff.get('header_identical', False)}")
     print()
 
     # PDF metadata analysis
     print("PDF Metadata Analysis:")
-    print("\nOriginal file:")
-    orig_meta = read_pdf_metadata(original_file)
-    for method, data in orig_meta.items():
-        if data.get('success'):
-            print(f"  {method}: {data.get('pages', 'unknown')} pages, encrypted: {data.get('encrypted', 'unknown')}")
-        else:
-            print(f"  {method}: ERROR - {data.get('error', 'unknown')}")
-
-    print("\nPaperless file:")
-    paper_meta = read_pdf_metadata(paperless_file)
-    for method, data in paper_meta.items():
-        if data.get('success'):
-            print(f"  {method}: {data.get('pages', 'unknown')} pages, encrypted: {data.get('encrypted', 'unknown')}")
-        else:
-            print(f"  {method}: ERROR - {data.get('error', 'unknown')}")
+    for label in ('original', 'paperless'):
+        print(f"\n{label.capitalize()} file:")
+        for method, data in result[f'{label}_metadata'].items():
+            if data.get('success'):
+                print(f"  {method}: {data.get('pages', 'unknown')} pages, encrypted: {data.get('encrypted', 'unknown')}")
+            else:
+                print(f"  {method}: ERROR - {data.get('error', 'unknown')}")
     print()
 
     # Text extraction comparison
     print("Text Extraction Comparison:")
-    methods = ['pypdf', 'pdfplumber']
-
-    for method in methods:
+    for method in PDFDocument.LIBRARIES:
         print(f"\n--- Using {method} ---")
-
-        print("Original file:")
-        orig_text = extract_text_sample(original_file, method)
-        if orig_text.get('success'):
-            print(f"  Length: {orig_text.get('text_length', 0)} characters")
-            print(f"  First 100: {repr(orig_text.get('first_100_chars', ''))}")
-        else:
-            print(f"  ERROR: {orig_text.get('error', 'unknown')}")
-
-        print("Paperless file:")
-        paper_text = extract_text_sample(paperless_file, method)
-        if paper_text.get('success'):
-            print(f"  Length: {paper_text.get('text_length', 0)} characters")
-            print(f"  First 100: {repr(paper_text.get('first_100_chars', ''))}")
-        else:
-            print(f"  ERROR: {paper_text.get('error', 'unknown')}")
+        for label in ('original', 'paperless'):
+            print(f"{label.capitalize()} file:")
+            text = result[f'{label}_text'][method]
+            if text.get('success'):
+                print(f"  Length: {text.get('text_length', 0)} characters")
+                print(f"  First 100: {repr(text.get('first_100_chars', ''))}")
+            else:
+                print(f"  ERROR: {text.get('error', 'unknown')}")
 
     # Detailed character analysis
     print("\n=== Detailed Character Analysis ===")
-
-    # Get full text from both files for analysis
-    orig_text_full = extract_text_sample(original_file, 'pypdf')
-    paper_text_full = extract_text_sample(paperless_file, 'pypdf')
+    orig_text_full = result['original_text']['pypdf']
+    paper_text_full = result['paperless_text']['pypdf']
 
     if orig_text_full.get('success') and paper_text_full.get('success'):
         orig_text = orig_text_full.get('full_text', '')
@@ -197,12 +274,7 @@ def main():
 
         # Character frequency analysis
         if paper_text:
-            # Count special characters
-            special_chars = {}
-            for char in paper_text[:500]:  # First 500 chars
-                if ord(char) > 127 or char in '\x00\x01\x02\x03\x04\x05\x06\x07\x08\x0b\x0c\x0e\x0f':
-                    special_chars[char] = special_chars.get(char, 0) + 1
-
+            special_chars = result['special_chars']
             print(f"Special characters in paperless text: {len(special_chars)}")
             if special_chars:
                 print("Most common special characters:")
@@ -214,5 +286,96 @@ def main():
         print(f"Original: {repr(orig_text[:200])}")
         print(f"Paperless: {repr(paper_text[:200])}")
 
+def _summarize_pair(pair):
+    """Worker-side comparison that returns only JSON-friendly summary fields."""
+    original_file, paperless_file = pair
+    try:
+        result = compare_pair(original_file, paperless_file, digests=True)
+    except Exception as e:
+        return {'original': str(original_file), 'paperless': str(paperless_file), 'error': str(e)}
+
+    summary = {
+        'original': result['original'],
+        'paperless': result['paperless'],
+        'error': result.get('error')
+    }
+    if not summary['error']:
+        summary['identical'] = result['binary'].get('identical')
+        summary['size_diff'] = result['binary'].get('size_diff')
+        for label in ('original', 'paperless'):
+            summary[f'{label}_pages'] = result[f'{label}_metadata']['pypdf'].get('pages')
+            summary[f'{label}_chars'] = {
+                method: text.get('text_length', 0) for method, text in result[f'{label}_text'].items()
+            }
+        summary['special_chars'] = sum(result['special_chars'].values())
+        summary['original_sha256'] = result['binary'].get('sha256_1')
+        summary['paperless_sha256'] = result['binary'].get('sha256_2')
+    return summary
+
+def find_pairs(originals_dir, paperless_dir):
+    """Pair PDFs with the same file name in two directories."""
+    paperless = {path.name: path for path in Path(paperless_dir).glob('*.pdf')}
+    return [
+        (path, paperless[path.name])
+        for path in sorted(Path(originals_dir).glob('*.pdf'))
+        if path.name in paperless
+    ]
+
+def read_pairs_file(pairs_file):
+    """Read original,paperless path pairs from a CSV file (no header)."""
+    with open(pairs_file, newline='') as f:
+        return [(row[0], row[1]) for row in csv.reader(f) if len(row) >= 2 and not row[0].startswith('#')]
+
+def compare_corpus(pairs, processes=None):
+    """Compare many pairs across a process pool; yields summaries in order."""
+    with ProcessPoolExecutor(max_workers=processes) as executor:
+        yield from executor.map(_summarize_pair, pairs, chunksize=4)
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare original PDFs with their paperless-processed versions")
+    parser.add_argument('files', nargs='*', help='original and paperless PDF to compare')
+    parser.add_argument('--pairs', help='CSV of original,paperless paths to compare')
+    parser.add_argument('--dirs', nargs=2, metavar=('ORIGINALS', 'PAPERLESS'),
+                        help='compare same-named PDFs in two directories')
+    parser.add_argument('--processes', type=int, help='worker processes for corpus runs')
+    parser.add_argument('--report', help='write corpus results as JSON to this file')
+    args = parser.parse_args()
+
+    if args.pairs or args.dirs:
+        pairs = read_pairs_file(args.pairs) if args.pairs else find_pairs(*args.dirs)
+        print(f"=== PDF Analysis: {len(pairs)} original/paperless pairs ===\n")
+
+        results = []
+        for summary in compare_corpus(pairs, args.processes):
+            results.append(summary)
+            if summary.get('error'):
+                print(f"  ERROR {Path(summary['original']).name}: {summary['error']}")
+                continue
+            orig_chars = summary['original_chars'].get('pypdf', 0)
+            paper_chars = summary['paperless_chars'].get('pypdf', 0)
+            print(f"  {Path(summary['original']).name:<50} identical={str(summary['identical']):<5} "
+                  f"chars {orig_chars:>6} -> {paper_chars:>6}  special={summary['special_chars']}")
+
+        suspicious = [r for r in results if not r.get('error') and r['special_chars']]
+        print(f"\nCompared {len(results)} pairs; {len(suspicious)} paperless files with special characters")
+
+        if args.report:
+            with open(args.report, 'w') as f:
+                json.dump(results, f, indent=2)
+            print(f"Report written to {args.report}")
+        return
+
+    if args.files and len(args.files) != 2:
+        parser.error("give exactly two files: original and paperless")
+
+    # File paths
+    original_file, paperless_file = args.files or (
+        "../../samples/FirstEnergy-110160220841-090827483643-.pdf",
+        "../../samples/2025-10-03-Unlesbarer-Dokumentinhalt.pdf"
+    )
+
+    print("=== PDF Analysis: Original vs Paperless ===\n")
+    print_comparison(compare_pair(original_file, paperless_file))
+
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    main()
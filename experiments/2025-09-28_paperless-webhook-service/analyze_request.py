@@ -6,12 +6,12 @@ Helps extract and work with the multipart data from paperless webhooks.
 
 import os
 import sys
-from email import message_from_bytes
-from email.mime.multipart import MIMEMultipart
-import re
+
+from multipart_parser import iter_parts, map_http_request
+from streaming_ingest import get_boundary
 
 def parse_http_request(file_path):
-    """Parse a saved HTTP request file."""
+    """Parse a saved HTTP request file; returns None if it has no header/body separator."""
     with open(file_path, 'rb') as f:
         content = f.read()
 
@@ -19,7 +19,7 @@ def parse_http_request(file_path):
     header_end = content.find(b'\r\n\r\n')
     if header_end == -1:
         print(f"Error: Could not find header/body separator in {file_path}")
-        return None, None
+        return None
 
     headers_section = content[:header_end].decode('utf-8')
     body = content[header_end + 4:]  # Skip the \r\n\r\n
@@ -40,81 +40,102 @@ def parse_http_request(file_path):
         'body': body
     }
 
-def extract_multipart_data(headers, body):
-    """Extract form data and files from multipart body."""
+def extract_multipart_data(headers, body, start=0):
+    """Extract form data and files from multipart body.
+
+    body may be bytes or an mmap of the saved request (with start at the
+    body offset); part contents are memoryview slices into it, not copies.
+    """
     content_type = headers.get('Content-Type', '')
     if not content_type.startswith('multipart/form-data'):
         print("Not a multipart request")
         return None
 
     # Extract boundary
-    boundary_match = re.search(r'boundary=([^;\s]+)', content_type)
-    if not boundary_match:
+    boundary = get_boundary(content_type)
+    if not boundary:
         print("Could not find multipart boundary")
         return None
 
-    boundary = boundary_match.group(1)
-
-    # Parse multipart data using email library
-    # Reconstruct as MIME message
-    mime_content = f"Content-Type: {content_type}\r\n\r\n".encode() + body
-
     try:
-        msg = message_from_bytes(mime_content)
         parts = []
-
-        if msg.is_multipart():
-            for part in msg.walk():
-                if part.get_content_maintype() == 'multipart':
-                    continue
-
-                disposition = part.get('Content-Disposition', '')
-                if 'form-data' in disposition:
-                    # Extract name and filename
-                    name_match = re.search(r'name="([^"]+)"', disposition)
-                    filename_match = re.search(r'filename="([^"]+)"', disposition)
-
-                    part_info = {
-                        'name': name_match.group(1) if name_match else None,
-                        'filename': filename_match.group(1) if filename_match else None,
-                        'content_type': part.get_content_type(),
-                        'content': part.get_payload(decode=True)
-                    }
-                    parts.append(part_info)
-
+        for part in iter_parts(body, boundary, start=start):
+            parts.append({
+                'name': part.name,
+                'filename': part.filename,
+                'content_type': part.content_type,
+                'content': part.content
+            })
         return parts
 
     except Exception as e:
         print(f"Error parsing multipart data: {e}")
         return None
 
+def load_archived_request(request_id):
+    """Load a request from the compressed archive in the parse_http_request shape."""
+    from request_archive import RequestArchive
+
+    request = RequestArchive().get(request_id)
+    if not request:
+        return None
+    return {
+        'request_line': request['request_line'],
+        'headers': request['headers'],
+        'body': request['body']
+    }
+
 def main():
     if len(sys.argv) != 2:
-        print("Usage: python analyze_request.py <request_file>")
+        print("Usage: python analyze_request.py <request_file | archived request id>")
         print("\nAvailable request files:")
         saved_dir = "saved_requests"
         if os.path.exists(saved_dir):
             for f in sorted(os.listdir(saved_dir)):
                 if f.endswith(('.txt', '.http')):
                     print(f"  {f}")
+        if os.path.exists("request_archive"):
+            from request_archive import RequestArchive
+            print("\nMost recent archived requests:")
+            for entry in RequestArchive().list(limit=20):
+                print(f"  {entry['id']:<6} {entry['timestamp']}  {entry['endpoint']}")
         return
 
-    file_path = sys.argv[1]
-    if not file_path.startswith('saved_requests/'):
-        file_path = f"saved_requests/{file_path}"
-
-    if not os.path.exists(file_path):
-        print(f"File not found: {file_path}")
+    if sys.argv[1].isdigit():
+        print(f"Analyzing archived request #{sys.argv[1]}")
+        print("=" * 50)
+        request_data = load_archived_request(int(sys.argv[1]))
+        if not request_data:
+            print(f"No archived request with id {sys.argv[1]}")
+            return
+    else:
+        file_path = sys.argv[1]
+        if not file_path.startswith('saved_requests/'):
+            file_path = f"saved_requests/{file_path}"
+
+        if not os.path.exists(file_path):
+            print(f"File not found: {file_path}")
+            return
+
+        print(f"Analyzing: {file_path}")
+        print("=" * 50)
+
+        # Map the HTTP request instead of reading it, so parts are slices
+        try:
+            with map_http_request(file_path) as mapped:
+                report_request({
+                    'request_line': mapped['request_line'],
+                    'headers': mapped['headers'],
+                    'body': mapped['buffer']
+                }, body_offset=mapped['body_offset'])
+        except ValueError as e:
+            print(f"Error: {e}")
         return
 
-    print(f"Analyzing: {file_path}")
-    print("=" * 50)
-
-    # Parse the HTTP request
-    request_data = parse_http_request(file_path)
-    if not request_data:
-        return
+    report_request(request_data)
 
+def report_request(request_data, body_offset=0):
+    """Print a request summary and save any PDF parts."""
     print(f"Request: {request_data['request_line']}")
     print(f"Content-Type: {request_data['headers'].get('Content-Type', 'unknown')}")
     print(f"Content-Length: {request_data['headers'].get('Content-Length', 'unknown')}")
@@ -123,7 +144,7 @@ def main():
     # If it's multipart, extract the parts
     if 'multipart/form-data' in request_data['headers'].get('Content-Type', ''):
         print("Extracting multipart data...")
-        parts = extract_multipart_data(request_data['headers'], request_data['body'])
+        parts = extract_multipart_data(request_data['headers'], request_data['body'], start=body_offset)
 
         if parts:
             for i, part in enumerate(parts):
@@ -140,6 +161,10 @@ def main():
                         f.write(part['content'])
                     print(f"  ✓ Saved PDF to: {save_path}")
 
+        # Release the slices before the caller closes the mmap
+        for part in parts or []:
+            part['content'].release()
+
     print("\nAnalysis complete!")
 
 if __name__ == '__main__':
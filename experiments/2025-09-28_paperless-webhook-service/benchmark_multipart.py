@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""
+Benchmark the mmap multipart parser against the original email-based one.
+Writes a synthetic saved request (form fields plus a large PDF part), parses
+it with both, checks they agree and reports time and peak Python memory.
+
+Usage:
+    python benchmark_multipart.py [--pdf-size 20000000] [--runs 5]
+"""
+
+import argparse
+import os
+import re
+import tempfile
+import time
+import tracemalloc
+import uuid
+from email import message_from_bytes
+
+from analyze_request import extract_multipart_data, parse_http_request
+from multipart_parser import map_http_request
+
+
+def legacy_extract_multipart_data(headers, body):
+    """The original parser: rebuild a MIME message and walk it with email."""
+    content_type = headers.get('Content-Type', '')
+    mime_content = f"Content-Type: {content_type}\r\n\r\n".encode() + body
+    msg = message_from_bytes(mime_content)
+    parts = []
+    for part in msg.walk():
+        if part.get_content_maintype() == 'multipart':
+            continue
+        disposition = part.get('Content-Disposition', '')
+        if 'form-data' in disposition:
+            name_match = re.search(r'name="([^"]+)"', disposition)
+            filename_match = re.search(r'filename="([^"]+)"', disposition)
+            parts.append({
+                'name': name_match.group(1) if name_match else None,
+                'filename': filename_match.group(1) if filename_match else None,
+                'content_type': part.get_content_type(),
+                'content': part.get_payload(decode=True)
+            })
+    return parts
+
+
+def write_sample_request(file_path, pdf_size):
+    boundary = uuid.uuid4().hex
+    pdf_bytes = b'%PDF-1.4\n' + os.urandom(max(0, pdf_size - 9))
+    body = (
+        f"--{boundary}\r\n"
+        f'Content-Disposition: form-data; name="title"\r\n\r\n'
+        f"Benchmark document\r\n"
+        f"--{boundary}\r\n"
+        f'Content-Disposition: form-data; name="file"; filename="benchmark.pdf"\r\n'
+        f"Content-Type: application/pdf\r\n\r\n"
+    ).encode() + pdf_bytes + f"\r\n--{boundary}--\r\n".encode()
+
+    with open(file_path, 'wb') as f:
+        f.write(b"POST /document-added HTTP/1.1\r\n")
+        f.write(f"Content-Type: multipart/form-data; boundary={boundary}\r\n".encode())
+        f.write(f"Content-Length: {len(body)}\r\n\r\n".encode())
+        f.write(body)
+
+
+def run_legacy(file_path):
+    request_data = parse_http_request(file_path)
+    parts = legacy_extract_multipart_data(request_data['headers'], request_data['body'])
+    return [(p['name'], p['filename'], len(p['content'] or b'')) for p in parts]
+
+
+def run_mmap(file_path):
+    with map_http_request(file_path) as mapped:
+        parts = extract_multipart_data(mapped['headers'], mapped['buffer'], start=mapped['body_offset'])
+        summary = [(p['name'], p['filename'], len(p['content'])) for p in parts]
+        for part in parts:
+            part['content'].release()
+    return summary
+
+
+def measure(func, file_path, runs):
+    times = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        result = func(file_path)
+        times.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    func(file_path)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, min(times), peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--pdf-size', type=int, default=20 * 1000 * 1000)
+    parser.add_argument('--runs', type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        file_path = os.path.join(tmp, 'benchmark.http')
+        write_sample_request(file_path, args.pdf_size)
+        print(f"Request size: {os.path.getsize(file_path) / 1e6:.1f} MB, best of {args.runs} runs")
+
+        legacy_parts, legacy_time, legacy_peak = measure(run_legacy, file_path, args.runs)
+        mmap_parts, mmap_time, mmap_peak = measure(run_mmap, file_path, args.runs)
+
+    if legacy_parts != mmap_parts:
+        print(f"MISMATCH:\n  legacy: {legacy_parts}\n  mmap:   {mmap_parts}")
+        return
+
+    print(f"Parts: {mmap_parts}")
+    print(f"{'parser':<8} {'time (ms)':>10} {'peak alloc (MB)':>16}")
+    print(f"{'email':<8} {legacy_time * 1000:>10.1f} {legacy_peak / 1e6:>16.1f}")
+    print(f"{'mmap':<8} {mmap_time * 1000:>10.2f} {mmap_peak / 1e6:>16.3f}")
+    print(f"Speedup: {legacy_time / mmap_time:.0f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,60 @@
+"""
+Gunicorn configuration for running webhook_service in production.
+
+    gunicorn -c gunicorn_conf.py webhook_service:app
+
+Tunable through environment variables:
+    WEBHOOK_BIND              address to bind (default 0.0.0.0:5000)
+    WEBHOOK_HTTP_WORKERS      gunicorn worker processes (default 1; see below)
+    WEBHOOK_HTTP_THREADS      request threads per worker process (default 8)
+    WEBHOOK_WORKERS           queue worker threads per process (default 2)
+    WEBHOOK_GRACEFUL_TIMEOUT  seconds to drain the queue on shutdown (default 30)
+
+Each worker process installs its own rotating handler on the same
+webhook_requests.log, and processes rotating one file lose or interleave
+lines, so the default is one process and concurrency comes from threads.
+"""
+
+import os
+
+bind = os.getenv('WEBHOOK_BIND', '0.0.0.0:5000')
+workers = int(os.getenv('WEBHOOK_HTTP_WORKERS', '1'))
+threads = int(os.getenv('WEBHOOK_HTTP_THREADS', '8'))
+worker_class = 'gthread'
+graceful_timeout = int(os.getenv('WEBHOOK_GRACEFUL_TIMEOUT', '30'))
+timeout = 60
+keepalive = 5
+
+# Log to stdout/stderr; the service's own request log still goes to
+# webhook_requests.log
+accesslog = '-'
+errorlog = '-'
+
+
+def on_starting(server):
+    """Requeue jobs interrupted by the last shutdown, once, in the master.
+
+    Uses its own short-lived connection so no SQLite handle crosses a fork.
+    """
+    from job_queue import JobQueue
+
+    queue_db = os.getenv(
+        'WEBHOOK_QUEUE_DB',
+        os.path.join(os.path.dirname(os.path.abspath(__file__)), 'webhook_jobs.sqlite3')
+    )
+    queue = JobQueue(queue_db)
+    recovered = queue.requeue_interrupted()
+    queue.close()
+    server.log.info(f"Webhook queue ready ({recovered} interrupted jobs requeued)")
+
+
+def post_worker_init(worker):
+    """Start the queue workers inside each gunicorn worker process."""
+    from webhook_service import worker_pool
+    worker_pool.start()
+
+
+def worker_exit(server, worker):
+    """Drain queued jobs before the worker process exits."""
+    from webhook_service import worker_pool
+    worker_pool.stop(drain=True, timeout=graceful_timeout)
@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+"""
+Durable SQLite-backed job queue and worker pool for webhook processing.
+Jobs survive service restarts (NFR-2.2): anything still 'running' when the
+service stopped is put back on the queue by requeue_interrupted() at startup.
+"""
+
+import json
+import logging
+import sqlite3
+import threading
+import time
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+
+class JobQueue:
+    """FIFO job queue persisted in SQLite."""
+
+    def __init__(self, db_path, max_attempts=3):
+        self.db_path = db_path
+        self.max_attempts = max_attempts
+        self._lock = threading.Lock()
+        self._not_empty = threading.Condition(self._lock)
+        # Autocommit mode; claim() takes an explicit write lock so several
+        # processes can share one queue file without double-claiming a job
+        self._conn = sqlite3.connect(db_path, check_same_thread=False, isolation_level=None, timeout=30)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS jobs (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                endpoint TEXT NOT NULL,
+                payload TEXT NOT NULL,
+                status TEXT NOT NULL DEFAULT 'queued',
+                attempts INTEGER NOT NULL DEFAULT 0,
+                error TEXT,
+                created TEXT NOT NULL,
+                updated TEXT NOT NULL
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs(status, id)")
+
+    def requeue_interrupted(self):
+        """Put jobs left running by a crash or hard stop back on the queue.
+
+        Call once per service start, before any worker process claims jobs;
+        with several processes sharing the queue this must not run in each.
+        """
+        with self._lock:
+            recovered = self._conn.execute(
+                "UPDATE jobs SET status = 'queued', updated = ? WHERE status = 'running'",
+                (datetime.now().isoformat(),)
+            ).rowcount
+        if recovered:
+            logger.info(f"Requeued {recovered} interrupted jobs")
+        return recovered
+
+    def enqueue(self, endpoint, payload):
+        """Persist a job and wake a worker. Returns the job id."""
+        now = datetime.now().isoformat()
+        with self._not_empty:
+            cursor = self._conn.execute(
+                "INSERT INTO jobs (endpoint, payload, created, updated) VALUES (?, ?, ?, ?)",
+                (endpoint, json.dumps(payload, default=str), now, now)
+            )
+            self._not_empty.notify()
+            return cursor.lastrowid
+
+    def claim(self, timeout=1.0):
+        """Mark the oldest queued job running and return it, or None after timeout."""
+        deadline = time.monotonic() + timeout
+        with self._not_empty:
+            while True:
+                self._conn.execute("BEGIN IMMEDIATE")
+                try:
+                    row = self._conn.execute(
+                        "SELECT * FROM jobs WHERE status = 'queued' ORDER BY id LIMIT 1"
+                    ).fetchone()
+                    if row:
+                        self._conn.execute(
+                            "UPDATE jobs SET status = 'running', attempts = attempts + 1, updated = ? WHERE id = ?",
+                            (datetime.now().isoformat(), row['id'])
+                        )
+                finally:
+                    self._conn.execute("COMMIT")
+
+                if row:
+                    job = dict(row)
+                    job['payload'] = json.loads(job['payload'])
+                    job['attempts'] += 1
+                    return job
+
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return None
+                self._not_empty.wait(remaining)
+
+    def complete(self, job_id):
+        with self._lock:
+            self._conn.execute(
+                "UPDATE jobs SET status = 'done', error = NULL, updated = ? WHERE id = ?",
+                (datetime.now().isoformat(), job_id)
+            )
+
+    def fail(self, job_id, error, attempts):
+        """Requeue a failed job, or mark it failed once max_attempts is reached."""
+        status = 'failed' if attempts >= self.max_attempts else 'queued'
+        with self._not_empty:
+            self._conn.execute(
+                "UPDATE jobs SET status = ?, error = ?, updated = ? WHERE id = ?",
+                (status, str(error), datetime.now().isoformat(), job_id)
+            )
+            if status == 'queued':
+                self._not_empty.notify()
+
+    def stats(self):
+        """Return job counts by status."""
+        with self._lock:
+            rows = self._conn.execute("SELECT status, COUNT(*) AS count FROM jobs GROUP BY status").fetchall()
+        return {row['status']: row['count'] for row in rows}
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class WorkerPool:
+    """Threads that drain a JobQueue by calling handler(job) for each job."""
+
+    def __init__(self, queue, handler, num_workers=2):
+        self.queue = queue
+        self.handler = handler
+        self.num_workers = num_workers
+        self._stopping = threading.Event()
+        self._draining = False
+        self._threads = []
+
+    def start(self):
+        for i in range(self.num_workers):
+            thread = threading.Thread(target=self._run, name=f"webhook-worker-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        logger.info(f"Started {self.num_workers} webhook workers")
+
+    def _run(self):
+        while not self._stopping.is_set():
+            job = self.queue.claim(timeout=0.5)
+            if job is None:
+                if self._draining:
+                    return
+                continue
+
+            try:
+                self.handler(job)
+                self.queue.complete(job['id'])
+            except Exception as e:
+                logger.exception(f"Job {job['id']} ({job['endpoint']}) failed")
+                self.queue.fail(job['id'], e, job['attempts'])
+
+    def stop(self, drain=True, timeout=None):
+        """Stop the workers. With drain=True, finish queued jobs first.
+
+        timeout bounds the whole stop, not each thread. Jobs not processed
+        before it stay queued in SQLite and are picked up on the next start.
+        """
+        if drain:
+            self._draining = True
+        else:
+            self._stopping.set()
+
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        for thread in self._threads:
+            thread.join(max(0.0, deadline - time.monotonic()) if deadline is not None else None)
+        self._stopping.set()
+        logger.info(f"Webhook workers stopped, queue: {self.queue.stats()}")
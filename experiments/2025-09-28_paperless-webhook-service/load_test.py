@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+Load test for the webhook service.
+Sends concurrent paperless-style "Document Added" multipart POSTs (a PDF file
+part) to a running instance and reports latency percentiles and throughput.
+
+Usage:
+    python load_test.py [--url http://127.0.0.1:5000/document-added]
+                        [--requests 500] [--concurrency 20] [--pdf-size 300000]
+                        [--pdf path/to/sample.pdf]
+"""
+
+import argparse
+import http.client
+import os
+import statistics
+import threading
+import time
+import uuid
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse
+
+
+def build_multipart_body(pdf_bytes, filename):
+    """Build a multipart/form-data body shaped like paperless' webhook action."""
+    boundary = uuid.uuid4().hex
+    body = (
+        f"--{boundary}\r\n"
+        f'Content-Disposition: form-data; name="file"; filename="{filename}"\r\n'
+        f"Content-Type: application/pdf\r\n\r\n"
+    ).encode() + pdf_bytes + f"\r\n--{boundary}--\r\n".encode()
+    return body, f"multipart/form-data; boundary={boundary}"
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(pct / 100 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+class LoadTester:
+    def __init__(self, url, body, content_type):
+        self.url = urlparse(url)
+        self.body = body
+        self.content_type = content_type
+        self._local = threading.local()
+
+    def _connection(self):
+        # One keep-alive connection per client thread, like a pooled client
+        if not hasattr(self._local, 'conn'):
+            self._local.conn = http.client.HTTPConnection(self.url.hostname, self.url.port or 80, timeout=60)
+        return self._local.conn
+
+    def send_one(self, _):
+        start = time.perf_counter()
+        try:
+            conn = self._connection()
+            conn.request('POST', self.url.path or '/', body=self.body, headers={
+                'Content-Type': self.content_type,
+                'Content-Length': str(len(self.body)),
+                'User-Agent': 'python-httpx/0.27.0'  # what paperless' webhook action sends
+            })
+            response = conn.getresponse()
+            response.read()
+            status = response.status
+        except Exception as e:
+            # Drop the connection so the next request on this thread reconnects
+            self._local.__dict__.pop('conn', None)
+            status = type(e).__name__
+        return time.perf_counter() - start, status
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--url', default='http://127.0.0.1:5000/document-added')
+    parser.add_argument('--requests', type=int, default=500)
+    parser.add_argument('--concurrency', type=int, default=20)
+    parser.add_argument('--pdf-size', type=int, default=300000,
+                        help='synthetic PDF payload size in bytes (ignored with --pdf)')
+    parser.add_argument('--pdf', help='send this PDF instead of a synthetic payload')
+    args = parser.parse_args()
+
+    if args.pdf:
+        with open(args.pdf, 'rb') as f:
+            pdf_bytes = f.read()
+        filename = os.path.basename(args.pdf)
+    else:
+        pdf_bytes = b'%PDF-1.4\n' + os.urandom(max(0, args.pdf_size - 9))
+        filename = 'load_test.pdf'
+
+    body, content_type = build_multipart_body(pdf_bytes, filename)
+    tester = LoadTester(args.url, body, content_type)
+
+    print(f"Target: {args.url}")
+    print(f"Requests: {args.requests}, concurrency: {args.concurrency}, body: {len(body) / 1024:.0f} KiB")
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+        results = list(executor.map(tester.send_one, range(args.requests)))
+    elapsed = time.perf_counter() - start
+
+    latencies = sorted(latency * 1000 for latency, _ in results)
+    statuses = Counter(status for _, status in results)
+
+    print(f"\nCompleted in {elapsed:.2f}s ({args.requests / elapsed:.1f} req/s)")
+    print(f"Status codes: {dict(statuses)}")
+    print(f"Latency (ms): p50 {percentile(latencies, 50):.1f} | p90 {percentile(latencies, 90):.1f} | "
+          f"p99 {percentile(latencies, 99):.1f} | max {latencies[-1]:.1f} | "
+          f"mean {statistics.mean(latencies):.1f}")
+
+
+if __name__ == '__main__':
+    main()
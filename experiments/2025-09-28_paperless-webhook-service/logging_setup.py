@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""
+Non-blocking, rotating JSON-lines logging for the webhook service.
+Request threads and queue workers only put records on an in-memory queue;
+a QueueListener thread does formatting and file I/O off the hot path.
+"""
+
+import atexit
+import json
+import logging
+import logging.handlers
+import queue
+from datetime import datetime
+
+# How much of each webhook to log:
+#   summary - endpoint, sizes, file names/sizes, form field names
+#   headers - summary plus request headers (sensitive ones masked)
+#   full    - everything, including form values and JSON/raw bodies
+VERBOSITY_LEVELS = ('summary', 'headers', 'full')
+
+SENSITIVE_HEADERS = {'authorization', 'cookie', 'proxy-authorization', 'x-api-key'}
+
+# LogRecord attributes that aren't user-supplied extra fields
+_RECORD_ATTRS = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime'}
+
+
+class JSONLinesFormatter(logging.Formatter):
+    """Format each record as one compact JSON object per line."""
+
+    def format(self, record):
+        entry = {
+            'ts': datetime.fromtimestamp(record.created).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'msg': record.getMessage()
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_ATTRS and not key.startswith('_'):
+                entry[key] = value
+        if record.exc_info:
+            entry['exc'] = self.formatException(record.exc_info)
+        return json.dumps(entry, separators=(',', ':'), default=str)
+
+
+def mask_headers(headers):
+    """Return a copy of headers with credential values masked (NFR-5.2)."""
+    return {
+        name: '***' if name.lower() in SENSITIVE_HEADERS else value
+        for name, value in headers.items()
+    }
+
+
+def webhook_log_fields(request_details, verbosity='summary'):
+    """Select the request_details fields to log at the given verbosity."""
+    fields = {
+        key: request_details.get(key)
+        for key in ('endpoint', 'timestamp', 'method', 'path', 'remote_addr', 'user_agent',
+                    'content_type', 'body_size', 'body_sha256', 'saved_to_file', 'archive_id',
+                    'timings', 'file_save_error', 'body_error')
+        if request_details.get(key) is not None
+    }
+
+    if 'files_data' in request_details:
+        fields['files'] = request_details['files_data']
+    if 'form_data' in request_details:
+        fields['form_fields'] = sorted(request_details['form_data'])
+
+    if verbosity in ('headers', 'full'):
+        fields['headers'] = mask_headers(request_details.get('headers', {}))
+
+    if verbosity == 'full':
+        for key in ('form_data', 'json_data', 'raw_data'):
+            if key in request_details:
+                fields[key] = request_details[key]
+
+    return fields
+
+
+def setup_logging(log_file, level=logging.INFO, rotate='size', max_bytes=10 * 1024 * 1024,
+                  backup_count=10, when='midnight', console=True):
+    """Route all logging through a QueueHandler to rotating JSON-lines and console output.
+
+    rotate is 'size' (max_bytes per file) or 'time' (rolled over at `when`),
+    keeping backup_count old files. Rotation is per process, so run a single
+    gunicorn worker process (with threads) if rotation must be exact.
+    console=False leaves out the console handler (e.g. for replays).
+    Returns the started QueueListener.
+    """
+    if rotate == 'time':
+        file_handler = logging.handlers.TimedRotatingFileHandler(
+            log_file, when=when, backupCount=backup_count, encoding='utf-8'
+        )
+    else:
+        file_handler = logging.handlers.RotatingFileHandler(
+            log_file, maxBytes=max_bytes, backupCount=backup_count, encoding='utf-8'
+        )
+    file_handler.setFormatter(JSONLinesFormatter())
+
+    handlers = [file_handler]
+    if console:
+        console_handler = logging.StreamHandler()
+        console_handler.setFormatter(logging.Formatter('%(asctime)s - %(levelname)s - %(message)s'))
+        handlers.append(console_handler)
+
+    log_queue = queue.SimpleQueue()
+    listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(logging.handlers.QueueHandler(log_queue))
+    root.setLevel(level)
+
+    listener.start()
+    atexit.register(listener.stop)
+    return listener
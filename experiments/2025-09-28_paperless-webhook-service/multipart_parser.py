@@ -0,0 +1,174 @@
+#!/usr/bin/env python3
+"""
+Zero-copy multipart/form-data parser for saved webhook requests.
+Scans for boundaries directly in an mmap of the .http file and returns parts
+as memoryview slices into it, so a multi-megabyte PDF payload is never copied
+until it is written out.
+"""
+
+import mmap
+import os
+import re
+from contextlib import contextmanager
+
+from streaming_ingest import get_boundary
+
+WRITE_CHUNK_SIZE = 1024 * 1024
+
+
+class MultipartPart:
+    """One form-data part; content is a memoryview into the parsed buffer."""
+
+    __slots__ = ('name', 'filename', 'content_type', 'headers', 'start', 'end', 'content')
+
+    def __init__(self, headers, start, end, content):
+        self.headers = headers
+        self.start = start
+        self.end = end
+        self.content = content
+
+        disposition = headers.get('content-disposition', '')
+        name_match = re.search(r'\bname="([^"]*)"', disposition)
+        filename_match = re.search(r'\bfilename="([^"]*)"', disposition)
+        self.name = name_match.group(1) if name_match else None
+        self.filename = filename_match.group(1) if filename_match else None
+        self.content_type = headers.get('content-type', 'text/plain')
+
+    @property
+    def size(self):
+        return self.end - self.start
+
+    def write_to(self, file_path, chunk_size=WRITE_CHUNK_SIZE):
+        """Stream the payload to file_path straight from the buffer."""
+        with open(file_path, 'wb') as f:
+            for offset in range(0, self.size, chunk_size):
+                f.write(self.content[offset:offset + chunk_size])
+        return self.size
+
+    def release(self):
+        self.content.release()
+
+
+def _parse_headers(header_bytes):
+    headers = {}
+    for line in bytes(header_bytes).decode('utf-8', errors='replace').split('\r\n'):
+        if ':' in line:
+            key, value = line.split(':', 1)
+            headers[key.strip().lower()] = value.strip()
+    return headers
+
+
+def iter_parts(buffer, boundary, start=0, end=None):
+    """Yield MultipartPart objects for the multipart body in buffer[start:end].
+
+    buffer must support find() and the buffer protocol (bytes, bytearray or
+    mmap). Only part headers are copied; contents are memoryview slices, so
+    callers must release them (or let them go) before closing an mmap.
+    """
+    if isinstance(boundary, str):
+        boundary = boundary.encode('latin-1')
+    end = len(buffer) if end is None else end
+    dash_boundary = b'--' + boundary
+    delimiter = b'\r\n' + dash_boundary
+    view = memoryview(buffer)
+
+    try:
+        position = buffer.find(dash_boundary, start, end)
+        if position == -1:
+            return
+        position += len(dash_boundary)
+
+        while position < end:
+            # '--' right after a boundary marks the end of the body
+            if buffer[position:position + 2] == b'--':
+                return
+
+            line_end = buffer.find(b'\r\n', position, end)
+            if line_end == -1:
+                return
+
+            # An empty header block ends immediately with a second CRLF
+            if buffer[line_end + 2:line_end + 4] == b'\r\n':
+                header_end = line_end
+            else:
+                header_end = buffer.find(b'\r\n\r\n', line_end + 2, end)
+                if header_end == -1:
+                    return
+            headers = _parse_headers(buffer[line_end + 2:header_end]) if header_end > line_end else {}
+
+            data_start = header_end + 4
+            data_end = buffer.find(delimiter, data_start, end)
+            if data_end == -1:
+                # Truncated body: treat the rest as this part's content
+                data_end = end
+
+            yield MultipartPart(headers, data_start, data_end, view[data_start:data_end])
+            position = data_end + len(delimiter)
+    finally:
+        view.release()
+
+
+def parse_request_head(buffer):
+    """Parse the request line and headers of a saved .http buffer.
+
+    Returns (request_line, headers, body_offset) or None if malformed.
+    """
+    header_end = buffer.find(b'\r\n\r\n')
+    if header_end == -1:
+        return None
+
+    lines = bytes(buffer[:header_end]).decode('utf-8').split('\r\n')
+    headers = {}
+    for line in lines[1:]:
+        if ':' in line:
+            key, value = line.split(':', 1)
+            headers[key.strip()] = value.strip()
+    return lines[0], headers, header_end + 4
+
+
+@contextmanager
+def map_http_request(file_path):
+    """Memory-map a saved .http file for zero-copy parsing.
+
+    Yields {'request_line', 'headers', 'buffer', 'body_offset'}; the mmap is
+    closed on exit, so part contents must not be used afterwards.
+    """
+    with open(file_path, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            raise ValueError(f"Empty request file: {file_path}")
+        mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    try:
+        head = parse_request_head(mapped)
+        if head is None:
+            raise ValueError(f"Could not find header/body separator in {file_path}")
+        request_line, headers, body_offset = head
+        yield {
+            'request_line': request_line,
+            'headers': headers,
+            'buffer': mapped,
+            'body_offset': body_offset
+        }
+    finally:
+        mapped.close()
+
+
+def extract_files_to_disk(file_path, output_dir='.', prefix='extracted_', extensions=('.pdf',)):
+    """Stream matching file parts of a saved request straight to disk.
+
+    Returns a list of (output path, size) for each file written.
+    """
+    written = []
+    with map_http_request(file_path) as request:
+        boundary = get_boundary(request['headers'].get('Content-Type', ''))
+        if not boundary:
+            return written
+
+        for part in iter_parts(request['buffer'], boundary, start=request['body_offset']):
+            try:
+                if part.filename and part.filename.lower().endswith(extensions):
+                    output_path = os.path.join(output_dir, f"{prefix}{os.path.basename(part.filename)}")
+                    written.append((output_path, part.write_to(output_path)))
+            finally:
+                part.release()
+    return written
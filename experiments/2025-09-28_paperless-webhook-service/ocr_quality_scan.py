@@ -0,0 +1,271 @@
+#!/usr/bin/env python3
+"""
+Corpus-wide OCR quality scanner.
+Streams every document's text from paperless (the `content` field) or from
+local PDFs, scores it for garbled OCR like the special-character check in
+analyze_pdf_differences.py, and writes a ranked list of documents that
+likely need re-OCR. Paperless documents are fetched with PaperlessAPI and
+local PDFs read with text_extraction, so put both experiments' directories
+on PYTHONPATH.
+
+Scores are computed per document with bulk str operations (encode,
+translate, count) that run in C rather than per-character Python loops, on
+batches of documents spread over a process pool.
+
+Usage:
+    python ocr_quality_scan.py paperless [--url http://192.168.1.7:8000] [--report ocr_report.csv]
+    python ocr_quality_scan.py local path/to/media/ [--processes 8] [--dictionary /usr/share/dict/words]
+"""
+
+import argparse
+import csv
+import json
+import os
+import re
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+from paperless_api import PaperlessAPI
+from text_extraction import DELETE_CONTROL, PDFDocument
+
+BATCH_SIZE = 50
+
+# Below this many characters a document is treated as having no usable text
+MIN_TEXT_CHARS = 20
+
+# Thresholds for flagging a document for re-OCR
+MAX_GARBLE_RATIO = 0.05
+MAX_CONTROL_RATIO = 0.01
+MIN_DICTIONARY_RATIO = 0.3
+MIN_WORDS_FOR_DICTIONARY = 20
+
+# Characters expected in OCR'd English/German text; anything else counts as garble
+EXPECTED_CHARS = (
+    [c for c in range(0x20, 0x7f)] + [ord(c) for c in '\t\n\r'] +
+    [ord(c) for c in 'äöüÄÖÜßéèêàâçñóíúÉÈ€£§°±²³µ·×÷«»–—‘’‚“”„•…'] + [0xa0]
+)
+DELETE_EXPECTED = dict.fromkeys(EXPECTED_CHARS)
+
+WORD_PATTERN = re.compile(r'[a-zäöüß]{2,}')
+
+# Small built-in dictionary of common English and German words, used when
+# no --dictionary file is given
+DEFAULT_WORDS = frozenset("""
+the and for are but not you all any can had her was one our out day get has him his how man new now old see
+two way who its let put say she too use with that this from they have will your what when been were said
+each which their time there about would these other into more some could them than then only over such
+account amount balance bill date due invoice number page payment period service statement total tax
+customer charges credit address phone please thank paid receipt order price name year month
+der die das und ist nicht ein eine mit von den dem des zu auf für im sich auch als wie bei aus nach
+oder wird sind werden hat haben noch wir sie ich bitte betrag datum rechnung seite zahlung summe
+konto steuer kunde kundennummer nummer monat jahr vielen dank gesamt netto brutto mwst
+""".split())
+
+_dictionary = DEFAULT_WORDS
+
+
+def load_dictionary(paths):
+    """Load one word per line from each path, lowercased."""
+    words = set()
+    for path in paths:
+        with open(path, encoding='utf-8', errors='ignore') as f:
+            words.update(line.strip().lower() for line in f if line.strip())
+    return frozenset(words)
+
+
+def _init_worker(dictionary):
+    global _dictionary
+    _dictionary = dictionary
+
+
+def score_text(text, dictionary=None):
+    """Return OCR quality ratios for one document's text.
+
+    garble_ratio counts characters outside the expected Latin/German set
+    plus pdfplumber-style (cid:N) glyph markers; dictionary_ratio is the
+    share of words found in the dictionary. quality combines them in [0, 1].
+    """
+    dictionary = _dictionary if dictionary is None else dictionary
+    length = len(text)
+    if length < MIN_TEXT_CHARS:
+        return {
+            'chars': length, 'words': 0, 'non_ascii_ratio': 0.0, 'control_ratio': 0.0,
+            'garble_ratio': 0.0, 'dictionary_ratio': 0.0, 'quality': 0.0,
+            'needs_reocr': True, 'reason': 'no text'
+        }
+
+    non_ascii = length - len(text.encode('ascii', 'ignore'))
+    control = length - len(text.translate(DELETE_CONTROL))
+    garble = len(text.translate(DELETE_EXPECTED)) + text.count('(cid:')
+
+    words = WORD_PATTERN.findall(text.lower())
+    hits = sum(map(dictionary.__contains__, words))
+
+    garble_ratio = min(1.0, garble / length)
+    control_ratio = control / length
+    dictionary_ratio = hits / len(words) if words else 0.0
+
+    reasons = []
+    if garble_ratio > MAX_GARBLE_RATIO:
+        reasons.append('garbled characters')
+    if control_ratio > MAX_CONTROL_RATIO:
+        reasons.append('control characters')
+    # With too few words to judge by dictionary hits, score on characters only
+    dictionary_factor = dictionary_ratio if len(words) >= MIN_WORDS_FOR_DICTIONARY else 1.0
+    if dictionary_factor < MIN_DICTIONARY_RATIO:
+        reasons.append('few dictionary words')
+
+    return {
+        'chars': length,
+        'words': len(words),
+        'non_ascii_ratio': round(non_ascii / length, 4),
+        'control_ratio': round(control_ratio, 4),
+        'garble_ratio': round(garble_ratio, 4),
+        'dictionary_ratio': round(dictionary_ratio, 4),
+        'quality': round(dictionary_factor * (1 - garble_ratio) * (1 - min(1.0, control_ratio * 10)), 4),
+        'needs_reocr': bool(reasons),
+        'reason': ', '.join(reasons)
+    }
+
+
+def extract_pdf_text(file_path):
+    """All page text of a local PDF via pypdf."""
+    with PDFDocument(file_path) as doc:
+        return '\n'.join(doc.page_text('pypdf', page) for page in range(doc.page_count('pypdf')))
+
+
+def score_batch(batch):
+    """Score a batch of documents in a worker process.
+
+    Each item is {'id', 'title', 'content'} or {'id', 'title', 'path'} for a
+    local file whose text is extracted here.
+    """
+    results = []
+    for item in batch:
+        result = {'id': item['id'], 'title': item.get('title', '')}
+        try:
+            text = item['content'] if 'content' in item else extract_pdf_text(item['path'])
+            result.update(score_text(text or ''))
+        except Exception as e:
+            result.update({'chars': 0, 'quality': 0.0, 'needs_reocr': True, 'reason': f"error: {e}"})
+        results.append(result)
+    return results
+
+
+def iter_local_documents(path):
+    """Yield {'id', 'title', 'path'} for each PDF under path."""
+    path = Path(path)
+    files = sorted(path.rglob('*.pdf')) if path.is_dir() else [path]
+    for file_path in files:
+        yield {'id': str(file_path), 'title': file_path.name, 'path': str(file_path)}
+
+
+def _batches(documents, size):
+    batch = []
+    for document in documents:
+        batch.append(document)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def scan(documents, processes=None, dictionary=DEFAULT_WORDS, batch_size=BATCH_SIZE):
+    """Score documents across a process pool; yields results as batches finish.
+
+    Batches are submitted as documents arrive, with at most two per worker
+    in flight, so fetching from paperless overlaps with scoring and memory
+    stays bounded however large the corpus is.
+    """
+    processes = processes or os.cpu_count()
+    with ProcessPoolExecutor(max_workers=processes, initializer=_init_worker, initargs=(dictionary,)) as executor:
+        in_flight = deque()
+        for batch in _batches(documents, batch_size):
+            in_flight.append(executor.submit(score_batch, batch))
+            while len(in_flight) >= processes * 2:
+                yield from in_flight.popleft().result()
+        while in_flight:
+            yield from in_flight.popleft().result()
+
+
+def write_report(results, report_path):
+    """Write results ranked worst first, as CSV or JSON by extension."""
+    if report_path.endswith('.json'):
+        with open(report_path, 'w') as f:
+            json.dump(results, f, indent=2, ensure_ascii=False)
+        return
+
+    fields = ['rank', 'id', 'title', 'needs_reocr', 'reason', 'quality', 'chars', 'words',
+              'garble_ratio', 'control_ratio', 'non_ascii_ratio', 'dictionary_ratio']
+    with open(report_path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.DictWriter(f, fieldnames=fields, extrasaction='ignore')
+        writer.writeheader()
+        for rank, result in enumerate(results, 1):
+            writer.writerow({'rank': rank, **result})
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Rank documents by OCR quality to find ones that need re-OCR")
+    subparsers = parser.add_subparsers(dest='source', required=True)
+
+    paperless_parser = subparsers.add_parser('paperless', help="scan paperless documents' content")
+    paperless_parser.add_argument('--url', default='http://192.168.1.7:8000')
+    paperless_parser.add_argument('--page-size', type=int, default=100)
+
+    local_parser = subparsers.add_parser('local', help='scan local PDFs')
+    local_parser.add_argument('path', help='PDF file or directory (searched recursively)')
+
+    for sub in (paperless_parser, local_parser):
+        sub.add_argument('--processes', type=int, help='worker processes (default: CPU count)')
+        sub.add_argument('--dictionary', action='append', default=[],
+                         help='word list file (one word per line); repeat for several languages')
+        sub.add_argument('--report', default='ocr_report.csv', help='ranked report (.csv or .json)')
+        sub.add_argument('--top', type=int, default=20, help='how many worst documents to print')
+    args = parser.parse_args()
+
+    if args.source == 'paperless':
+        token = os.getenv('PAPERLESS_API_KEY')
+        if not token:
+            print("Set PAPERLESS_API_KEY to scan paperless documents")
+            sys.exit(1)
+        documents = PaperlessAPI(args.url, token=token).iter_documents(
+            page_size=args.page_size, extra_params={'fields': 'id,title,content', 'ordering': 'id'}
+        )
+        print(f"Scanning paperless documents at {args.url}...")
+    else:
+        documents = iter_local_documents(args.path)
+        print(f"Scanning PDFs under {args.path}...")
+
+    dictionary = load_dictionary(args.dictionary) | DEFAULT_WORDS if args.dictionary else DEFAULT_WORDS
+
+    start = time.perf_counter()
+    results = []
+    for result in scan(documents, args.processes, dictionary):
+        results.append(result)
+        if len(results) % 1000 == 0:
+            print(f"  {len(results)} documents scored ({len(results) / (time.perf_counter() - start):.0f}/s)")
+    elapsed = time.perf_counter() - start
+
+    results.sort(key=lambda r: (not r['needs_reocr'], r['quality']))
+    flagged = [r for r in results if r['needs_reocr']]
+
+    print(f"\nScored {len(results)} documents in {elapsed:.1f}s "
+          f"({len(results) / elapsed if elapsed else 0:.0f} docs/s)")
+    print(f"{len(flagged)} documents flagged for re-OCR")
+
+    if flagged:
+        print(f"\n{'id':<10} {'quality':>7} {'garble':>7} {'dict':>6}  title / reason")
+        for result in flagged[:args.top]:
+            print(f"{str(result['id'])[-10:]:<10} {result['quality']:>7.3f} {result.get('garble_ratio', 0):>7.3f} "
+                  f"{result.get('dictionary_ratio', 0):>6.2f}  {result['title'][:40]} ({result['reason']})")
+
+    write_report(results, args.report)
+    print(f"\nReport written to {args.report}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,390 @@
+#!/usr/bin/env python3
+"""
+Replay saved webhook requests through the processing pipeline.
+Takes a directory of saved .http files or the request archive and re-sends
+them in parallel, paced either at a fixed rate or at a multiple of the speed
+they were captured at, then reports throughput and per-stage timings.
+
+By default requests go through an in-process copy of the service (Flask
+handler, durable queue, worker pool) whose queue, archive, saved files and
+log live in a scratch directory, so production data is never touched. With
+--url they are sent over HTTP to a running instance instead.
+
+Usage:
+    python replay.py saved_requests/ [--speed 10 | --rate 50] [--concurrency 8] [--workers 4]
+    python replay.py --archive request_archive [--endpoint document-added] [--since 2025-10-01]
+    python replay.py saved_requests/ --url http://127.0.0.1:5000 [--report replay.json]
+"""
+
+import argparse
+import http.client
+import json
+import os
+import shutil
+import statistics
+import tempfile
+import threading
+import time
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from pathlib import Path
+from urllib.parse import urlparse
+
+from load_test import percentile
+from request_archive import RequestArchive, parse_saved_name, split_http_request
+
+# Headers that describe the original connection rather than the request
+HOP_BY_HOP_HEADERS = {'host', 'content-length', 'connection', 'keep-alive', 'transfer-encoding'}
+
+
+def iter_saved_files(path):
+    """Yield replay items for a saved .http file or a directory of them."""
+    path = Path(path)
+    files = sorted(path.glob('*.http')) if path.is_dir() else [path]
+    for file_path in files:
+        endpoint, timestamp = parse_saved_name(file_path.name)
+        yield {
+            'label': file_path.name,
+            'endpoint': endpoint,
+            'timestamp': timestamp or datetime.fromtimestamp(file_path.stat().st_mtime).isoformat(),
+            'load': lambda file_path=file_path: load_saved_file(file_path)
+        }
+
+
+def load_saved_file(file_path):
+    with open(file_path, 'rb') as f:
+        data = f.read()
+    request_line, headers, body_offset = split_http_request(data)
+    return {'request_line': request_line, 'headers': headers, 'body': data[body_offset:]}
+
+
+def iter_archived(archive, endpoint=None, since=None, until=None, limit=None):
+    """Yield replay items for archived requests, oldest first."""
+    entries = archive.list(endpoint=endpoint, since=since, until=until, limit=limit or -1, newest_first=False)
+    for entry in entries:
+        yield {
+            'label': f"#{entry['id']}",
+            'endpoint': entry['endpoint'],
+            'timestamp': entry['timestamp'],
+            'load': lambda request_id=entry['id']: archive.get(request_id)
+        }
+
+
+def schedule(items, rate=None, speed=None):
+    """Attach a 'due' offset in seconds from replay start to each item.
+
+    speed replays at that multiple of the captured inter-arrival times, rate
+    sends a fixed number of requests per second; with neither everything is
+    due immediately and concurrency alone limits the pace.
+    """
+    items = sorted(items, key=lambda item: item['timestamp'])
+    if speed and items:
+        first = datetime.fromisoformat(items[0]['timestamp'])
+        for item in items:
+            item['due'] = (datetime.fromisoformat(item['timestamp']) - first).total_seconds() / speed
+    else:
+        for i, item in enumerate(items):
+            item['due'] = i / rate if rate else 0.0
+    return items
+
+
+def replay_headers(headers):
+    return {name: value for name, value in headers.items() if name.lower() not in HOP_BY_HOP_HEADERS}
+
+
+class HTTPTarget:
+    """Send requests to a running webhook service over keep-alive connections."""
+
+    def __init__(self, base_url):
+        self.base_url = urlparse(base_url)
+        self._local = threading.local()
+
+    def start(self):
+        pass
+
+    def _connection(self):
+        if not hasattr(self._local, 'conn'):
+            self._local.conn = http.client.HTTPConnection(
+                self.base_url.hostname, self.base_url.port or 80, timeout=60
+            )
+        return self._local.conn
+
+    def send(self, request):
+        """Send one request; returns (status, stage timings in ms)."""
+        method, path = request['request_line'].split()[:2]
+        start = time.perf_counter()
+        try:
+            conn = self._connection()
+            conn.request(method, path, body=request['body'], headers=replay_headers(request['headers']))
+            response = conn.getresponse()
+            response.read()
+            status = response.status
+        except Exception as e:
+            # Reconnect on the next request from this thread
+            self._local.__dict__.pop('conn', None)
+            status = type(e).__name__
+        return status, {'accept': (time.perf_counter() - start) * 1000}
+
+    def finish(self, timeout=300):
+        """Wait until the service's queue has drained (per /health).
+
+        Returns the perf_counter time it was seen empty, or None on timeout.
+        """
+        conn = http.client.HTTPConnection(self.base_url.hostname, self.base_url.port or 80, timeout=10)
+        deadline = time.monotonic() + timeout
+        try:
+            while time.monotonic() < deadline:
+                conn.request('GET', '/health')
+                queue = json.loads(conn.getresponse().read()).get('queue', {})
+                if not queue.get('queued') and not queue.get('running'):
+                    return time.perf_counter()
+                time.sleep(0.05)
+        except Exception as e:
+            print(f"Could not poll /health: {e}")
+        return None
+
+    def results(self):
+        return {}
+
+
+class InProcessTarget:
+    """Drive an isolated in-process copy of the service's full pipeline.
+
+    Requests go through the Flask handler via the test client, and a worker
+    pool over the same durable queue runs process_webhook_job, so accept,
+    queue wait and processing stages are all timed per request.
+    """
+
+    def __init__(self, workers=2, work_dir=None, archive=True):
+        self.work_dir = work_dir or tempfile.mkdtemp(prefix='webhook_replay_')
+        os.makedirs(self.work_dir, exist_ok=True)
+        self.workers = workers
+        self.archive = archive
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._accepted = {}
+        self._processed = {}
+
+    def start(self):
+        # webhook_service configures itself from the environment at import
+        os.environ.update({
+            'WEBHOOK_QUEUE_DB': os.path.join(self.work_dir, 'webhook_jobs.sqlite3'),
+            'WEBHOOK_ARCHIVE_DIR': os.path.join(self.work_dir, 'request_archive'),
+            'WEBHOOK_ARCHIVE': '1' if self.archive else '0',
+            'WEBHOOK_SAVED_DIR': os.path.join(self.work_dir, 'saved_requests'),
+            'WEBHOOK_LOG_FILE': os.path.join(self.work_dir, 'webhook_requests.log'),
+            'WEBHOOK_LOG_CONSOLE': '0'
+        })
+        import webhook_service
+        from job_queue import WorkerPool
+
+        self.service = webhook_service
+        self.pool = WorkerPool(webhook_service.job_queue, self._process, num_workers=self.workers)
+        self.pool.start()
+
+    def _client(self):
+        if not hasattr(self._local, 'client'):
+            self._local.client = self.service.app.test_client()
+        return self._local.client
+
+    def send(self, request):
+        method, path = request['request_line'].split()[:2]
+        start = time.perf_counter()
+        response = self._client().open(
+            path, method=method, data=request['body'], headers=replay_headers(request['headers'])
+        )
+        accepted = time.perf_counter()
+        job_id = (response.get_json(silent=True) or {}).get('job_id')
+        if job_id is not None:
+            with self._lock:
+                self._accepted[job_id] = accepted
+        return response.status_code, {'accept': (accepted - start) * 1000}
+
+    def _process(self, job):
+        start = time.perf_counter()
+        self.service.process_webhook_job(job)
+        end = time.perf_counter()
+        with self._lock:
+            self._processed[job['id']] = (start, end, job['payload'].get('timings', {}))
+
+    def finish(self, timeout=300):
+        """Drain the queue; returns when the last job finished, or None on timeout."""
+        self.pool.stop(drain=True, timeout=timeout)
+        if self.service.job_queue.stats().get('queued'):
+            return None
+        with self._lock:
+            return max((end for _, end, _ in self._processed.values()), default=time.perf_counter())
+
+    def results(self):
+        """Per-job stage timings in ms, joined on job id."""
+        stages = defaultdict(list)
+        with self._lock:
+            for job_id, (start, end, timings) in self._processed.items():
+                if job_id in self._accepted:
+                    stages['queue_wait'].append((start - self._accepted[job_id]) * 1000)
+                stages['process'].append((end - start) * 1000)
+                for name, value in timings.items():
+                    stages[name.removesuffix('_ms')].append(value)
+        return stages
+
+
+class Replayer:
+    """Send scheduled items to a target with bounded concurrency."""
+
+    def __init__(self, target, concurrency=8):
+        self.target = target
+        self.concurrency = concurrency
+        self._slots = threading.BoundedSemaphore(concurrency)
+        self._lock = threading.Lock()
+        self.stages = defaultdict(list)
+        self.statuses = Counter()
+        self.endpoints = Counter()
+        self.errors = []
+
+    def _replay_one(self, item, replay_start):
+        try:
+            # How far behind schedule the request starts: grows without bound
+            # once the target can't keep up with the offered rate
+            lag = (time.perf_counter() - replay_start - item['due']) * 1000
+
+            load_start = time.perf_counter()
+            request = item['load']()
+            load_ms = (time.perf_counter() - load_start) * 1000
+            if not request:
+                raise ValueError(f"Could not load {item['label']}")
+
+            status, timings = self.target.send(request)
+            with self._lock:
+                self.stages['schedule_lag'].append(max(0.0, lag))
+                self.stages['load'].append(load_ms)
+                for name, value in timings.items():
+                    self.stages[name].append(value)
+                self.statuses[status] += 1
+                self.endpoints[item['endpoint']] += 1
+        except Exception as e:
+            with self._lock:
+                self.statuses[type(e).__name__] += 1
+                self.errors.append(f"{item['label']}: {e}")
+        finally:
+            self._slots.release()
+
+    def run(self, items):
+        """Replay items on schedule; returns (send seconds, total seconds)."""
+        self.target.start()
+        replay_start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+            for item in items:
+                delay = item['due'] - (time.perf_counter() - replay_start)
+                if delay > 0:
+                    time.sleep(delay)
+                # Block rather than queue up work the target isn't taking
+                self._slots.acquire()
+                executor.submit(self._replay_one, item, replay_start)
+        send_elapsed = time.perf_counter() - replay_start
+
+        finished = self.target.finish()
+        if finished is None:
+            print("Warning: target did not finish processing before the timeout")
+            finished = time.perf_counter()
+        total_elapsed = max(send_elapsed, finished - replay_start)
+
+        for name, values in self.target.results().items():
+            self.stages[name].extend(values)
+        return send_elapsed, total_elapsed
+
+
+def stage_summary(values):
+    values = sorted(values)
+    return {
+        'count': len(values),
+        'mean': statistics.mean(values),
+        'p50': percentile(values, 50),
+        'p90': percentile(values, 90),
+        'p99': percentile(values, 99),
+        'max': values[-1]
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('path', nargs='?', help='saved .http file or directory (default: saved_requests/)')
+    parser.add_argument('--archive', help='replay from this request archive directory instead')
+    parser.add_argument('--endpoint', help='only replay this endpoint (archive only)')
+    parser.add_argument('--since', help='only replay requests at or after this ISO timestamp (archive only)')
+    parser.add_argument('--until', help='only replay requests before this ISO timestamp (archive only)')
+    parser.add_argument('--limit', type=int, help='replay at most this many requests')
+    pacing = parser.add_mutually_exclusive_group()
+    pacing.add_argument('--speed', type=float, help='replay at this multiple of the captured timing (10 = 10x)')
+    pacing.add_argument('--rate', type=float, help='send this many requests per second')
+    parser.add_argument('--concurrency', type=int, default=8, help='requests in flight at once')
+    parser.add_argument('--url', help='send to a running service at this base URL instead of in-process')
+    parser.add_argument('--workers', type=int, default=2, help='queue workers for the in-process target')
+    parser.add_argument('--no-archive', action='store_true', help='skip the archive stage in-process')
+    parser.add_argument('--keep', action='store_true', help="keep the in-process target's scratch directory")
+    parser.add_argument('--report', help='also write the results as JSON to this file')
+    args = parser.parse_args()
+
+    if args.archive:
+        archive = RequestArchive(args.archive)
+        items = list(iter_archived(archive, args.endpoint, args.since, args.until, args.limit))
+    else:
+        items = list(iter_saved_files(args.path or 'saved_requests'))[:args.limit]
+    if not items:
+        print("No requests to replay")
+        return
+    items = schedule(items, rate=args.rate, speed=args.speed)
+
+    if args.url:
+        target = HTTPTarget(args.url)
+    else:
+        target = InProcessTarget(workers=args.workers, archive=not args.no_archive)
+
+    pacing = f"{args.speed}x captured timing" if args.speed else f"{args.rate} req/s" if args.rate else "unpaced"
+    print(f"Replaying {len(items)} requests -> {args.url or 'in-process service'} "
+          f"({pacing}, concurrency {args.concurrency})")
+
+    replayer = Replayer(target, concurrency=args.concurrency)
+    try:
+        send_elapsed, total_elapsed = replayer.run(items)
+    finally:
+        if isinstance(target, InProcessTarget):
+            if args.keep:
+                print(f"Scratch directory kept at {target.work_dir}")
+            else:
+                shutil.rmtree(target.work_dir, ignore_errors=True)
+
+    sent = sum(replayer.statuses.values())
+    print(f"\nSent {sent} requests in {send_elapsed:.2f}s ({sent / send_elapsed:.1f} req/s)")
+    print(f"All processed after {total_elapsed:.2f}s ({sent / total_elapsed:.1f} req/s end to end)")
+    print(f"Status codes: {dict(replayer.statuses)}")
+    print(f"Endpoints: {dict(replayer.endpoints)}")
+
+    summaries = {name: stage_summary(values) for name, values in replayer.stages.items() if values}
+    print(f"\n{'stage (ms)':<14} {'count':>6} {'mean':>9} {'p50':>9} {'p90':>9} {'p99':>9} {'max':>9}")
+    for name, summary in summaries.items():
+        print(f"{name:<14} {summary['count']:>6} " + ' '.join(
+            f"{summary[key]:>9.2f}" for key in ('mean', 'p50', 'p90', 'p99', 'max')
+        ))
+
+    for error in replayer.errors[:10]:
+        print(f"  error: {error}")
+
+    if args.report:
+        with open(args.report, 'w') as f:
+            json.dump({
+                'target': args.url or 'in-process',
+                'requests': sent,
+                'pacing': pacing,
+                'concurrency': args.concurrency,
+                'send_seconds': send_elapsed,
+                'total_seconds': total_elapsed,
+                'statuses': {str(k): v for k, v in replayer.statuses.items()},
+                'stages': summaries,
+                'errors': replayer.errors
+            }, f, indent=2)
+        print(f"Report written to {args.report}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,461 @@
+#!/usr/bin/env python3
+"""
+Append-only, compressed archive for saved webhook requests.
+Requests are stored in segment files instead of one .http file each. File
+parts (the PDFs paperless sends) are deduplicated by SHA-256, so the same
+document sent by several workflow triggers is stored once, and a SQLite
+index on endpoint, timestamp and document id makes listing and retrieving a
+request an index lookup plus one read, however large the archive grows.
+
+Usage:
+    python request_archive.py import [saved_requests/] [--delete]
+    python request_archive.py list [--endpoint NAME] [--document-id ID] [--limit N]
+    python request_archive.py export <request id> <output.http>
+    python request_archive.py delete <request id>
+    python request_archive.py stats
+"""
+
+import argparse
+import hashlib
+import json
+import mmap
+import os
+import re
+import sqlite3
+import threading
+import zlib
+from datetime import datetime
+from pathlib import Path
+from urllib.parse import parse_qsl
+
+from streaming_ingest import CHUNK_SIZE, MultipartPartTracker, get_boundary
+
+try:
+    import zstandard
+except ImportError:
+    print("Warning: zstandard not installed. Archive segments will use zlib instead.")
+    print("To install: pip install zstandard")
+    zstandard = None
+
+DEFAULT_ARCHIVE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'request_archive')
+SEGMENT_MAX_BYTES = 256 * 1024 * 1024
+
+# File parts smaller than this stay inline in the request record
+MIN_BLOB_SIZE = 4096
+
+# Saved request files are named {endpoint}_{timestamp}.http
+SAVED_NAME_PATTERN = re.compile(r'^(?P<endpoint>.+)_(?P<date>\d{4}-\d{2}-\d{2})T(?P<time>[\d_-]+)\.http$')
+
+
+def compress(data):
+    """Compress with zstd when available; returns (codec, bytes)."""
+    if zstandard:
+        return 'zstd', zstandard.ZstdCompressor(level=3).compress(data)
+    return 'zlib', zlib.compress(data, 6)
+
+
+def decompress(codec, data):
+    if codec == 'zstd':
+        if not zstandard:
+            raise RuntimeError("zstandard is required to read zstd-compressed records")
+        return zstandard.ZstdDecompressor().decompress(data)
+    if codec == 'zlib':
+        return zlib.decompress(data)
+    return data
+
+
+def split_http_request(data):
+    """Split saved .http bytes into (request_line, headers dict, header length)."""
+    header_end = data.find(b'\r\n\r\n')
+    if header_end == -1:
+        raise ValueError("Could not find header/body separator")
+
+    lines = bytes(data[:header_end]).decode('utf-8').split('\r\n')
+    headers = {}
+    for line in lines[1:]:
+        if ':' in line:
+            key, value = line.split(':', 1)
+            headers[key.strip()] = value.strip()
+
+    return lines[0], headers, header_end + 4
+
+
+def parse_saved_name(file_name):
+    """Return (endpoint, ISO timestamp) encoded in a saved .http file name, or (None, None)."""
+    match = SAVED_NAME_PATTERN.match(file_name)
+    if not match:
+        return None, None
+    clock = match.group('time').replace('-', ':', 2).replace('_', '.')
+    return match.group('endpoint'), f"{match.group('date')}T{clock}"
+
+
+def find_document_id(form_data, headers):
+    """Best-effort paperless document id from workflow params or headers.
+
+    Paperless webhooks carry no document metadata by default, so this only
+    finds an id if the workflow was configured to send one.
+    """
+    candidates = [form_data.get(key) for key in ('document_id', 'doc_id', 'id')]
+    candidates.append(headers.get('X-Document-Id'))
+    for value in candidates:
+        if value and str(value).strip().isdigit():
+            return int(value)
+
+    for value in form_data.values():
+        match = re.search(r'/documents/(\d+)', str(value))
+        if match:
+            return int(match.group(1))
+    return None
+
+
+class RequestArchive:
+    def __init__(self, archive_dir=DEFAULT_ARCHIVE_DIR, segment_max_bytes=SEGMENT_MAX_BYTES):
+        self.archive_dir = Path(archive_dir)
+        self.archive_dir.mkdir(parents=True, exist_ok=True)
+        self.segment_max_bytes = segment_max_bytes
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.archive_dir / 'index.sqlite3'), check_same_thread=False,
+                                     isolation_level=None, timeout=30)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS requests (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                endpoint TEXT,
+                timestamp TEXT,
+                document_id INTEGER,
+                request_line TEXT,
+                headers TEXT,
+                body_size INTEGER,
+                body_sha256 TEXT,
+                segment INTEGER,
+                offset INTEGER,
+                length INTEGER,
+                codec TEXT,
+                blob_refs TEXT
+            );
+            CREATE INDEX IF NOT EXISTS idx_requests_endpoint ON requests(endpoint, timestamp);
+            CREATE INDEX IF NOT EXISTS idx_requests_timestamp ON requests(timestamp);
+            CREATE INDEX IF NOT EXISTS idx_requests_document ON requests(document_id);
+            CREATE UNIQUE INDEX IF NOT EXISTS idx_requests_sha ON requests(body_sha256, endpoint, timestamp);
+
+            CREATE TABLE IF NOT EXISTS blobs (
+                sha256 TEXT PRIMARY KEY,
+                size INTEGER,
+                segment INTEGER,
+                offset INTEGER,
+                length INTEGER,
+                codec TEXT,
+                ref_count INTEGER NOT NULL DEFAULT 0
+            );
+
+            CREATE TABLE IF NOT EXISTS archive_state (
+                key TEXT PRIMARY KEY,
+                value INTEGER
+            );
+        """)
+
+    def _segment_path(self, segment):
+        return self.archive_dir / f"segment-{segment:06d}.dat"
+
+    def _append(self, data):
+        """Append bytes to the current segment; returns (segment, offset).
+
+        Must be called inside a write transaction, which serializes appends
+        across threads and processes.
+        """
+        row = self._conn.execute("SELECT value FROM archive_state WHERE key = 'segment'").fetchone()
+        segment = row['value'] if row else 1
+        path = self._segment_path(segment)
+        if path.exists() and path.stat().st_size + len(data) > self.segment_max_bytes:
+            segment += 1
+            path = self._segment_path(segment)
+        self._conn.execute("INSERT OR REPLACE INTO archive_state (key, value) VALUES ('segment', ?)", (segment,))
+
+        with open(path, 'ab') as f:
+            offset = f.tell()
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        return segment, offset
+
+    def _read(self, segment, offset, length):
+        with open(self._segment_path(segment), 'rb') as f:
+            f.seek(offset)
+            return f.read(length)
+
+    def add_http_file(self, file_path, endpoint=None, timestamp=None):
+        """Archive a saved .http request file. Returns the new request id.
+
+        Endpoint and timestamp default to the values encoded in the file name.
+        Re-importing the same file returns the existing id.
+        """
+        file_path = Path(file_path)
+        saved_endpoint, saved_timestamp = parse_saved_name(file_path.name)
+        endpoint = endpoint or saved_endpoint
+        timestamp = timestamp or saved_timestamp or datetime.fromtimestamp(file_path.stat().st_mtime).isoformat()
+
+        with open(file_path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            request_line, headers, body_offset = split_http_request(data)
+            body = memoryview(data)[body_offset:]
+            try:
+                return self._add(endpoint, timestamp, request_line, headers, body)
+            finally:
+                body.release()
+
+    def _add(self, endpoint, timestamp, request_line, headers, body):
+        body_sha256 = hashlib.sha256(body).hexdigest()
+
+        # Find file parts worth deduplicating by scanning the body in chunks
+        parts = []
+        content_type = headers.get('Content-Type', '')
+        boundary = get_boundary(content_type)
+        if boundary:
+            tracker = MultipartPartTracker(boundary)
+            for start in range(0, len(body), CHUNK_SIZE):
+                tracker.feed(body[start:start + CHUNK_SIZE])
+            parts = tracker.parts
+
+        if content_type.startswith('application/x-www-form-urlencoded'):
+            form_data = dict(parse_qsl(bytes(body).decode('utf-8', errors='replace')))
+        else:
+            form_data = {p['name']: p['value'] for p in parts if p['filename'] is None}
+        blob_parts = [p for p in parts if p['filename'] is not None and p['size'] >= MIN_BLOB_SIZE]
+
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                existing = self._conn.execute(
+                    "SELECT id FROM requests WHERE body_sha256 = ? AND endpoint IS ? AND timestamp = ?",
+                    (body_sha256, endpoint, timestamp)
+                ).fetchone()
+                if existing:
+                    self._conn.execute("COMMIT")
+                    return existing['id']
+
+                # Store each file payload once, then the body with payloads cut out
+                blob_refs = []
+                skeleton = bytearray()
+                position = 0
+                for part in blob_parts:
+                    payload = body[part['offset']:part['offset'] + part['size']]
+                    sha256 = hashlib.sha256(payload).hexdigest()
+                    if not self._conn.execute("SELECT 1 FROM blobs WHERE sha256 = ?", (sha256,)).fetchone():
+                        codec, compressed = compress(payload)
+                        segment, offset = self._append(compressed)
+                        self._conn.execute(
+                            "INSERT INTO blobs (sha256, size, segment, offset, length, codec) VALUES (?, ?, ?, ?, ?, ?)",
+                            (sha256, part['size'], segment, offset, len(compressed), codec)
+                        )
+                    self._conn.execute("UPDATE blobs SET ref_count = ref_count + 1 WHERE sha256 = ?", (sha256,))
+
+                    skeleton += body[position:part['offset']]
+                    blob_refs.append({'at': len(skeleton), 'sha256': sha256, 'filename': part['filename']})
+                    position = part['offset'] + part['size']
+                skeleton += body[position:]
+
+                codec, compressed = compress(bytes(skeleton))
+                segment, offset = self._append(compressed)
+                cursor = self._conn.execute(
+                    "INSERT INTO requests (endpoint, timestamp, document_id, request_line, headers, body_size, "
+                    "body_sha256, segment, offset, length, codec, blob_refs) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (endpoint, timestamp, find_document_id(form_data, headers), request_line,
+                     json.dumps(headers), len(body), body_sha256, segment, offset, len(compressed), codec,
+                     json.dumps(blob_refs))
+                )
+                self._conn.execute("COMMIT")
+                return cursor.lastrowid
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def list(self, endpoint=None, document_id=None, since=None, until=None, limit=100, newest_first=True):
+        """List request metadata (no bodies) using the index."""
+        clauses = []
+        params = []
+        if endpoint:
+            clauses.append("endpoint = ?")
+            params.append(endpoint)
+        if document_id is not None:
+            clauses.append("document_id = ?")
+            params.append(document_id)
+        if since:
+            clauses.append("timestamp >= ?")
+            params.append(since)
+        if until:
+            clauses.append("timestamp < ?")
+            params.append(until)
+
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        order = "DESC" if newest_first else "ASC"
+        params.append(limit)
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT id, endpoint, timestamp, document_id, request_line, body_size, body_sha256, blob_refs "
+                f"FROM requests {where} ORDER BY timestamp {order} LIMIT ?", params
+            ).fetchall()
+
+        results = []
+        for row in rows:
+            entry = dict(row)
+            entry['files'] = [ref['filename'] for ref in json.loads(entry.pop('blob_refs'))]
+            results.append(entry)
+        return results
+
+    def get(self, request_id):
+        """Return {'request_line', 'headers', 'body', ...} for a request, or None."""
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM requests WHERE id = ?", (request_id,)).fetchone()
+            if not row:
+                return None
+            refs = json.loads(row['blob_refs'])
+            blobs = {
+                ref['sha256']: self._conn.execute("SELECT * FROM blobs WHERE sha256 = ?", (ref['sha256'],)).fetchone()
+                for ref in refs
+            }
+
+        skeleton = decompress(row['codec'], self._read(row['segment'], row['offset'], row['length']))
+
+        body = bytearray()
+        position = 0
+        for ref in refs:
+            blob = blobs[ref['sha256']]
+            body += skeleton[position:ref['at']]
+            body += decompress(blob['codec'], self._read(blob['segment'], blob['offset'], blob['length']))
+            position = ref['at']
+        body += skeleton[position:]
+
+        return {
+            'id': row['id'],
+            'endpoint': row['endpoint'],
+            'timestamp': row['timestamp'],
+            'document_id': row['document_id'],
+            'request_line': row['request_line'],
+            'headers': json.loads(row['headers']),
+            'body': bytes(body)
+        }
+
+    def delete(self, request_id):
+        """Remove a request from the index, releasing its file blobs.
+
+        Blobs no longer referenced by any request are dropped from the index.
+        Segments are append-only, so their bytes stay on disk. Returns False
+        if there was no such request.
+        """
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._conn.execute("SELECT blob_refs FROM requests WHERE id = ?", (request_id,)).fetchone()
+                if not row:
+                    self._conn.execute("COMMIT")
+                    return False
+                for ref in json.loads(row['blob_refs']):
+                    self._conn.execute("UPDATE blobs SET ref_count = ref_count - 1 WHERE sha256 = ?",
+                                       (ref['sha256'],))
+                self._conn.execute("DELETE FROM blobs WHERE ref_count <= 0")
+                self._conn.execute("DELETE FROM requests WHERE id = ?", (request_id,))
+                self._conn.execute("COMMIT")
+                return True
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def export_http(self, request_id, output_path):
+        """Write a request back out in the original .http format."""
+        request = self.get(request_id)
+        if not request:
+            raise KeyError(f"No archived request with id {request_id}")
+
+        with open(output_path, 'wb') as f:
+            f.write(f"{request['request_line']}\r\n".encode('utf-8'))
+            for name, value in request['headers'].items():
+                f.write(f"{name}: {value}\r\n".encode('utf-8'))
+            f.write(b"\r\n")
+            f.write(request['body'])
+
+    def stats(self):
+        with self._lock:
+            requests_row = self._conn.execute(
+                "SELECT COUNT(*) AS count, COALESCE(SUM(body_size), 0) AS body_bytes, "
+                "COALESCE(SUM(length), 0) AS stored_bytes FROM requests"
+            ).fetchone()
+            blobs_row = self._conn.execute(
+                "SELECT COUNT(*) AS count, COALESCE(SUM(length), 0) AS stored_bytes FROM blobs"
+            ).fetchone()
+
+        stored = requests_row['stored_bytes'] + blobs_row['stored_bytes']
+        return {
+            'requests': requests_row['count'],
+            'unique_files': blobs_row['count'],
+            'original_bytes': requests_row['body_bytes'],
+            'stored_bytes': stored,
+            'ratio': requests_row['body_bytes'] / stored if stored else 0.0,
+            'segments': len(list(self.archive_dir.glob('segment-*.dat')))
+        }
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compressed, indexed archive for saved webhook requests")
+    parser.add_argument('--archive', default=DEFAULT_ARCHIVE_DIR, help='archive directory')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    import_parser = subparsers.add_parser('import', help='import saved .http files')
+    import_parser.add_argument('path', nargs='?', default='saved_requests')
+    import_parser.add_argument('--delete', action='store_true', help='delete files once archived')
+
+    list_parser = subparsers.add_parser('list', help='list archived requests')
+    list_parser.add_argument('--endpoint')
+    list_parser.add_argument('--document-id', type=int)
+    list_parser.add_argument('--since')
+    list_parser.add_argument('--limit', type=int, default=50)
+
+    export_parser = subparsers.add_parser('export', help='write an archived request to a .http file')
+    export_parser.add_argument('request_id', type=int)
+    export_parser.add_argument('output')
+
+    delete_parser = subparsers.add_parser('delete', help='remove an archived request from the index')
+    delete_parser.add_argument('request_id', type=int)
+
+    subparsers.add_parser('stats', help='show archive size and dedup ratio')
+
+    args = parser.parse_args()
+    archive = RequestArchive(args.archive)
+
+    if args.command == 'import':
+        path = Path(args.path)
+        files = sorted(path.glob('*.http')) if path.is_dir() else [path]
+        for file_path in files:
+            request_id = archive.add_http_file(file_path)
+            if args.delete:
+                file_path.unlink()
+            print(f"  {file_path.name} -> #{request_id}")
+        print(f"Imported {len(files)} requests")
+        print(archive.stats())
+
+    elif args.command == 'list':
+        for entry in archive.list(args.endpoint, args.document_id, args.since, limit=args.limit):
+            files = ', '.join(entry['files']) or '-'
+            print(f"#{entry['id']:<6} {entry['timestamp']:<27} {entry['endpoint']:<20} "
+                  f"doc={entry['document_id'] or '-':<6} {entry['body_size']:>9} bytes  {files}")
+
+    elif args.command == 'export':
+        archive.export_http(args.request_id, args.output)
+        print(f"Exported request #{args.request_id} to {args.output}")
+
+    elif args.command == 'delete':
+        if not archive.delete(args.request_id):
+            raise SystemExit(f"No archived request with id {args.request_id}")
+        print(f"Deleted request #{args.request_id}")
+
+    elif args.command == 'stats':
+        for key, value in archive.stats().items():
+            print(f"{key}: {value}")
+
+
+if __name__ == '__main__':
+    main()
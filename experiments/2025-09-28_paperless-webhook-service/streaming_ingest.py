@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+"""
+Streaming request ingestion for the webhook service.
+Spools the request body to the saved .http file in fixed-size chunks while
+hashing it, measuring it and tracking multipart part sizes, so memory use per
+request doesn't depend on upload size.
+"""
+
+import hashlib
+import re
+
+CHUNK_SIZE = 64 * 1024
+
+# Form field values (non-file parts) are captured up to this many bytes
+MAX_FIELD_VALUE = 64 * 1024
+
+
+def get_boundary(content_type):
+    """Extract the multipart boundary from a Content-Type header, or None."""
+    match = re.search(r'boundary="?([^";]+)"?', content_type or '')
+    return match.group(1).encode('latin-1') if match else None
+
+
+def parse_part_headers(header_bytes):
+    """Parse a part's header block into (name, filename, content_type)."""
+    headers = {}
+    for line in header_bytes.decode('utf-8', errors='replace').split('\r\n'):
+        if ':' in line:
+            key, value = line.split(':', 1)
+            headers[key.strip().lower()] = value.strip()
+
+    disposition = headers.get('content-disposition', '')
+    name_match = re.search(r'\bname="([^"]*)"', disposition)
+    filename_match = re.search(r'\bfilename="([^"]*)"', disposition)
+
+    return (
+        name_match.group(1) if name_match else None,
+        filename_match.group(1) if filename_match else None,
+        headers.get('content-type', 'text/plain')
+    )
+
+
+class MultipartPartTracker:
+    """Incremental multipart/form-data scanner fed with body chunks.
+
+    Records each part's name, filename, content type, size and payload offset
+    within the body without keeping file contents; only a tail of
+    len(delimiter) bytes is buffered between chunks. Small form field values
+    are captured as text.
+    """
+
+    def __init__(self, boundary):
+        # The first boundary has no leading CRLF; feeding one up front lets
+        # every boundary be matched with the same delimiter
+        self.delimiter = b'\r\n--' + boundary
+        self.parts = []
+        self._buffer = bytearray(b'\r\n')
+        self._state = 'preamble'
+        self._current = None
+        # Body offset of self._buffer[0] (starts at -2 for the fed CRLF)
+        self._offset = -2
+
+    def feed(self, chunk):
+        self._buffer += chunk
+        while self._step():
+            pass
+
+    def _step(self):
+        """Advance the state machine; return True while progress is possible."""
+        buffer = self._buffer
+
+        if self._state in ('preamble', 'body'):
+            index = buffer.find(self.delimiter)
+            if index == -1:
+                # Keep enough bytes to recognise a delimiter split across chunks
+                keep = len(self.delimiter) - 1
+                if len(buffer) > keep:
+                    self._consume_body(len(buffer) - keep)
+                return False
+            self._consume_body(index)
+            self._discard(len(self.delimiter))
+            self._finish_part()
+            self._state = 'after_delimiter'
+            return True
+
+        if self._state == 'after_delimiter':
+            if len(buffer) < 2:
+                return False
+            if buffer[:2] == b'--':
+                self._state = 'epilogue'
+                self._discard(len(buffer))
+                return False
+            # Skip transport padding up to the CRLF ending the boundary line
+            line_end = buffer.find(b'\r\n')
+            if line_end == -1:
+                return False
+            self._discard(line_end + 2)
+            self._state = 'headers'
+            return True
+
+        if self._state == 'headers':
+            header_end = buffer.find(b'\r\n\r\n')
+            if header_end == -1:
+                return False
+            name, filename, content_type = parse_part_headers(bytes(buffer[:header_end]))
+            self._discard(header_end + 4)
+            self._current = {
+                'name': name,
+                'filename': filename,
+                'content_type': content_type,
+                'offset': self._offset,
+                'size': 0,
+                'value': bytearray() if filename is None else None
+            }
+            self._state = 'body'
+            return True
+
+        # epilogue: ignore anything after the closing boundary
+        self._discard(len(buffer))
+        return False
+
+    def _consume_body(self, length):
+        if self._current is not None:
+            self._current['size'] += length
+            value = self._current['value']
+            if value is not None and len(value) < MAX_FIELD_VALUE:
+                value += self._buffer[:min(length, MAX_FIELD_VALUE - len(value))]
+        self._discard(length)
+
+    def _discard(self, length):
+        del self._buffer[:length]
+        self._offset += length
+
+    def _finish_part(self):
+        if self._current is None:
+            return
+        part = self._current
+        if part['value'] is not None:
+            part['value'] = bytes(part['value']).decode('utf-8', errors='replace')
+        self.parts.append(part)
+        self._current = None
+
+    def summary(self):
+        """Return (form_data, files_data) in the shape the webhook log uses."""
+        form_data = {}
+        files_data = {}
+        for part in self.parts:
+            if part['filename'] is not None:
+                files_data[part['name']] = {
+                    'filename': part['filename'],
+                    'content_type': part['content_type'],
+                    'size': part['size']
+                }
+            else:
+                form_data[part['name']] = part['value']
+        return form_data, files_data
+
+
+def spool_request(stream, file_path, request_line, headers, content_type=None, chunk_size=CHUNK_SIZE):
+    """Write a request to file_path, streaming the body from stream in chunks.
+
+    headers is an iterable of (name, value) pairs. Returns the body size and
+    SHA-256, plus form/file summaries when the body is multipart.
+    """
+    boundary = get_boundary(content_type) if (content_type or '').startswith('multipart/form-data') else None
+    tracker = MultipartPartTracker(boundary) if boundary else None
+    sha256 = hashlib.sha256()
+    body_size = 0
+
+    with open(file_path, 'wb') as f:
+        # Write request line and headers
+        f.write(request_line.encode('utf-8'))
+        for header_name, header_value in headers:
+            f.write(f"{header_name}: {header_value}\r\n".encode('utf-8'))
+        f.write(b"\r\n")  # Empty line between headers and body
+
+        while True:
+            chunk = stream.read(chunk_size)
+            if not chunk:
+                break
+            f.write(chunk)
+            sha256.update(chunk)
+            body_size += len(chunk)
+            if tracker:
+                tracker.feed(chunk)
+
+    result = {
+        'body_size': body_size,
+        'body_sha256': sha256.hexdigest()
+    }
+    if tracker:
+        result['form_data'], result['files_data'] = tracker.summary()
+    return result
@@ -2,36 +2,64 @@
 """
 Simple webhook service for paperless-ngx integration.
 Logs all incoming request details for analysis and debugging.
+
+Endpoints only save the raw request and enqueue a job, returning 202
+immediately; a worker pool drains the durable queue and does the parsing
+and logging.
+
+Development:  python webhook_service.py
+Production:   gunicorn -c gunicorn_conf.py webhook_service:app
 """
 
 import json
 import logging
+import time
 from datetime import datetime
 from flask import Flask, request, jsonify
 import os
-from werkzeug.datastructures import FileStorage
+from urllib.parse import parse_qsl
+
+from analyze_request import parse_http_request
+from job_queue import JobQueue, WorkerPool
+from logging_setup import VERBOSITY_LEVELS, setup_logging, webhook_log_fields
+from request_archive import RequestArchive
+from streaming_ingest import spool_request
 
 # Setup logging and directories
 log_dir = os.path.dirname(os.path.abspath(__file__))
-log_file = os.path.join(log_dir, 'webhook_requests.log')
-saved_requests_dir = os.path.join(log_dir, 'saved_requests')
+log_file = os.getenv('WEBHOOK_LOG_FILE', os.path.join(log_dir, 'webhook_requests.log'))
+saved_requests_dir = os.getenv('WEBHOOK_SAVED_DIR', os.path.join(log_dir, 'saved_requests'))
+queue_db = os.getenv('WEBHOOK_QUEUE_DB', os.path.join(log_dir, 'webhook_jobs.sqlite3'))
 os.makedirs(saved_requests_dir, exist_ok=True)
 
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler(log_file),
-        logging.StreamHandler()
-    ]
+num_workers = int(os.getenv('WEBHOOK_WORKERS', '2'))
+
+# Move processed requests from saved_requests/ into the compressed archive
+archive_enabled = os.getenv('WEBHOOK_ARCHIVE', '1') == '1'
+archive_dir = os.getenv('WEBHOOK_ARCHIVE_DIR', os.path.join(log_dir, 'request_archive'))
+
+# summary | headers | full (full includes request bodies)
+log_verbosity = os.getenv('WEBHOOK_LOG_VERBOSITY', 'summary')
+if log_verbosity not in VERBOSITY_LEVELS:
+    raise ValueError(f"WEBHOOK_LOG_VERBOSITY must be one of {VERBOSITY_LEVELS}")
+
+setup_logging(
+    log_file,
+    rotate=os.getenv('WEBHOOK_LOG_ROTATE', 'size'),
+    max_bytes=int(os.getenv('WEBHOOK_LOG_MAX_BYTES', str(10 * 1024 * 1024))),
+    backup_count=int(os.getenv('WEBHOOK_LOG_BACKUPS', '10')),
+    console=os.getenv('WEBHOOK_LOG_CONSOLE', '1') == '1'
 )
 
 logger = logging.getLogger(__name__)
 
 app = Flask(__name__)
 
+job_queue = JobQueue(queue_db)
+request_archive = RequestArchive(archive_dir) if archive_enabled else None
+
 def handle_webhook_request(endpoint_name):
-    """Common webhook handler for all endpoints."""
+    """Common webhook handler for all endpoints: save, enqueue, return 202."""
     # Get current timestamp
     timestamp = datetime.now().isoformat()
 
@@ -56,76 +84,108 @@ def handle_webhook_request(endpoint_name):
     request_filename = f"{endpoint_name}_{clean_timestamp}.http"
     request_file_path = os.path.join(saved_requests_dir, request_filename)
 
-    # Get raw request body
-    raw_body = request.get_data()
-
-    # Save complete raw request
+    # Save complete raw request, streaming the body to disk in chunks so it
+    # is never fully buffered; size, hash and multipart part sizes are
+    # measured in the same pass
+    spool_start = time.perf_counter()
     try:
-        with open(request_file_path, 'wb') as f:
-            # Write request line and headers
-            request_line = f"{request.method} {request.path} HTTP/1.1\r\n"
-            f.write(request_line.encode('utf-8'))
-
-            # Write headers
-            for header_name, header_value in request.headers:
-                header_line = f"{header_name}: {header_value}\r\n"
-                f.write(header_line.encode('utf-8'))
-
-            f.write(b"\r\n")  # Empty line between headers and body
-            f.write(raw_body)  # Raw body
+        spooled = spool_request(
+            request.stream,
+            request_file_path,
+            request_line=f"{request.method} {request.path} HTTP/1.1\r\n",
+            headers=request.headers,
+            content_type=request.content_type
+        )
+        request_details.update(spooled)
+        if 'files_data' in spooled:
+            request_details['multipart_info'] = (
+                f"Form fields: {len(spooled['form_data'])}, Files: {len(spooled['files_data'])}"
+            )
 
         request_details['saved_to_file'] = request_file_path
-        logger.info(f"Raw request saved to: {request_file_path}")
     except Exception as e:
         request_details['file_save_error'] = str(e)
+    request_details['timings'] = {'spool_ms': round((time.perf_counter() - spool_start) * 1000, 3)}
 
-    # Get request body if present
-    try:
-        if request.is_json:
-            request_details['json_data'] = request.get_json()
-        elif request.content_type and request.content_type.startswith('multipart/form-data'):
-            # Handle multipart form data
-            form_data = {}
-            files_data = {}
-
-            for key, value in request.form.items():
-                form_data[key] = value
-
-            for key, file_obj in request.files.items():
-                if isinstance(file_obj, FileStorage):
-                    files_data[key] = {
-                        'filename': file_obj.filename,
-                        'content_type': file_obj.content_type,
-                        'size': len(file_obj.read()) if file_obj else 0
-                    }
-                    file_obj.seek(0)  # Reset file pointer
-
-            request_details['form_data'] = form_data
-            request_details['files_data'] = files_data
-            request_details['multipart_info'] = f"Form fields: {len(form_data)}, Files: {len(files_data)}"
-        elif request.data:
-            request_details['raw_data'] = request.data.decode('utf-8', errors='replace')
-        elif request.form:
-            request_details['form_data'] = dict(request.form)
-    except Exception as e:
-        request_details['body_error'] = str(e)
+    job_id = job_queue.enqueue(endpoint_name, request_details)
+    logger.info(f"{endpoint_name} webhook queued", extra={
+        'job_id': job_id,
+        'saved_to_file': request_details.get('saved_to_file'),
+        'body_size': request_details.get('body_size')
+    })
 
-    # Log the request with headers prominently displayed
-    logger.info(f"=== {endpoint_name.upper()} WEBHOOK RECEIVED ===")
-    logger.info(f"Method: {request.method} | Path: {request.path} | From: {request.remote_addr}")
-    logger.info(f"Headers: {json.dumps(dict(request.headers), indent=2)}")
-    logger.info(f"Full Request Details: {json.dumps(request_details, indent=2)}")
-    logger.info(f"========================")
-
-    # Return success response
+    # Return accepted response; processing happens in the worker pool
     response_data = {
-        'status': 'received',
+        'status': 'queued',
         'endpoint': endpoint_name,
         'timestamp': timestamp,
-        'message': f'{endpoint_name} webhook processed successfully'
+        'job_id': job_id,
+        'message': f'{endpoint_name} webhook queued for processing'
     }
 
-    return jsonify(response_data), 200
+    return jsonify(response_data), 202
+
+def process_webhook_job(job):
+    """Worker-side processing: parse the saved request body and log it."""
+    request_details = job['payload']
+    endpoint_name = request_details['endpoint']
+    request_file_path = request_details.get('saved_to_file')
+
+    if not request_file_path:
+        logger.warning(f"{endpoint_name} webhook has no saved request file", extra={
+            'job_id': job['id'],
+            'request': webhook_log_fields(request_details, log_verbosity)
+        })
+        return
+
+    content_type = request_details.get('content_type') or ''
+    timings = request_details.setdefault('timings', {})
+
+    # Multipart bodies were already summarized while spooling; only small
+    # non-multipart bodies are read back from disk
+    if 'files_data' not in request_details:
+        parse_start = time.perf_counter()
+        process_saved_body(request_details, request_file_path, content_type)
+        timings['parse_ms'] = round((time.perf_counter() - parse_start) * 1000, 3)
+
+    if request_archive:
+        archive_start = time.perf_counter()
+        request_details['archive_id'] = request_archive.add_http_file(
+            request_file_path, endpoint=endpoint_name, timestamp=request_details['timestamp']
+        )
+        os.remove(request_file_path)
+        # The spool file is gone; the archive id is now how to find the request
+        del request_details['saved_to_file']
+        timings['archive_ms'] = round((time.perf_counter() - archive_start) * 1000, 3)
+
+    # One structured record per webhook; how much of the request it carries
+    # is controlled by WEBHOOK_LOG_VERBOSITY
+    logger.info(f"{endpoint_name} webhook processed", extra={
+        'job_id': job['id'],
+        'request': webhook_log_fields(request_details, log_verbosity)
+    })
+
+def process_saved_body(request_details, request_file_path, content_type):
+    """Parse a saved non-multipart request body into request_details."""
+    request_data = parse_http_request(request_file_path)
+    if request_data is None:
+        raise ValueError(f"Could not parse saved request {request_file_path}")
+
+    body = request_data['body']
+
+    # Get request body if present
+    try:
+        if content_type.startswith('application/json'):
+            request_details['json_data'] = json.loads(body) if body else None
+        elif content_type.startswith('application/x-www-form-urlencoded'):
+            # paperless's default format for webhooks that send params only
+            request_details['form_data'] = dict(parse_qsl(body.decode('utf-8', errors='replace')))
+        elif body:
+            request_details['raw_data'] = body.decode('utf-8', errors='replace')
+    except Exception as e:
+        request_details['body_error'] = str(e)
+
+worker_pool = WorkerPool(job_queue, process_webhook_job, num_workers=num_workers)
 
 @app.route('/webhook', methods=['GET', 'POST', 'PUT', 'DELETE', 'PATCH'])
 def webhook_handler():
@@ -155,7 +215,11 @@ def scheduled_handler():
 @app.route('/health', methods=['GET'])
 def health_check():
     """Simple health check endpoint."""
-    return jsonify({'status': 'healthy', 'timestamp': datetime.now().isoformat()}), 200
+    return jsonify({
+        'status': 'healthy',
+        'queue': job_queue.stats(),
+        'timestamp': datetime.now().isoformat()
+    }), 200
 
 @app.route('/', methods=['GET'])
 def root():
@@ -182,8 +246,19 @@ def root():
     }), 200
 
 if __name__ == '__main__':
-    logger.info("Starting webhook service...")
+    debug = os.getenv('WEBHOOK_DEBUG', '1') == '1'
+
+    logger.info("Starting webhook service (development server)...")
     logger.info(f"Logging requests to: {log_file}")
 
+    # With the debug reloader, only the child process that serves requests
+    # should run workers
+    if not debug or os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        job_queue.requeue_interrupted()
+        worker_pool.start()
+
     # Run on all interfaces to accept local network connections
-    app.run(host='0.0.0.0', port=5000, debug=True)
\ No newline at end of file
+    try:
+        app.run(host='0.0.0.0', port=int(os.getenv('WEBHOOK_PORT', '5000')), debug=debug)
+    finally:
+        worker_pool.stop(drain=True, timeout=30)
\ No newline at end of file
@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+"""
+Benchmark get_document_type_stats methods against a local fake paperless server.
+The fake server serves a synthetic archive with OCR-sized content and a fixed
+per-request latency, so the numbers reflect round trips and transfer size.
+"""
+
+import json
+import random
+import sys
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlencode, urlparse
+
+from paperless_api import PaperlessAPI
+
+NUM_DOCUMENTS = 20000
+NUM_TYPES = 40
+CONTENT_SIZE = 2000  # characters of fake OCR content per document
+LATENCY = 0.02  # seconds added to every request
+
+
+def build_archive(seed=42):
+    """Generate synthetic document types and documents."""
+    rng = random.Random(seed)
+    doc_types = [{'id': i, 'name': f'Type {i}'} for i in range(1, NUM_TYPES + 1)]
+    filler = 'lorem ipsum dolor sit amet ' * (CONTENT_SIZE // 27 + 1)
+
+    documents = []
+    for doc_id in range(1, NUM_DOCUMENTS + 1):
+        documents.append({
+            'id': doc_id,
+            'title': f'Document {doc_id}',
+            'document_type': rng.choice([None] + [dt['id'] for dt in doc_types]),
+            'correspondent': rng.randint(1, 50),
+            'tags': rng.sample(range(1, 30), 3),
+            'content': filler[:CONTENT_SIZE],
+            'modified': '2025-10-01T00:00:00Z'
+        })
+
+    counts = Counter(doc['document_type'] for doc in documents)
+    for dt in doc_types:
+        dt['document_count'] = counts[dt['id']]
+
+    return doc_types, documents
+
+
+class FakePaperlessHandler(BaseHTTPRequestHandler):
+    doc_types = []
+    documents = []
+    request_count = 0
+    bytes_sent = 0
+    lock = threading.Lock()
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        time.sleep(LATENCY)
+        parsed = urlparse(self.path)
+        query = {k: v[0] for k, v in parse_qs(parsed.query).items()}
+
+        if parsed.path == '/api/document_types/':
+            items = self.doc_types
+        elif parsed.path == '/api/documents/':
+            items = self.documents
+            if 'document_type__id' in query:
+                type_id = int(query['document_type__id'])
+                items = [d for d in items if d['document_type'] == type_id]
+            if query.get('document_type__isnull') in ('1', 'true', 'True'):
+                items = [d for d in items if d['document_type'] is None]
+        else:
+            self.send_error(404)
+            return
+
+        page = int(query.get('page', 1))
+        page_size = int(query.get('page_size', 25))
+        results = items[(page - 1) * page_size:page * page_size]
+
+        if 'fields' in query:
+            fields = query['fields'].split(',')
+            results = [{k: item[k] for k in fields if k in item} for item in results]
+
+        next_url = None
+        if page * page_size < len(items):
+            next_query = dict(query, page=page + 1)
+            next_url = f'http://{self.headers["Host"]}{parsed.path}?{urlencode(next_query)}'
+
+        body = json.dumps({'count': len(items), 'next': next_url, 'results': results}).encode()
+
+        with self.lock:
+            FakePaperlessHandler.request_count += 1
+            FakePaperlessHandler.bytes_sent += len(body)
+
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def legacy_type_counts(api):
+    """The original approach: download every full document record serially."""
+    documents = list(api.iter_documents(max_workers=1))
+    return Counter(doc.get('document_type') for doc in documents)
+
+
+def run_benchmark(label, func):
+    FakePaperlessHandler.request_count = 0
+    FakePaperlessHandler.bytes_sent = 0
+    start = time.time()
+    result = func()
+    elapsed = time.time() - start
+    print(f"{label:<28} {elapsed:>8.2f}s {FakePaperlessHandler.request_count:>8} requests "
+          f"{FakePaperlessHandler.bytes_sent / 1e6:>9.2f} MB")
+    return result
+
+
+def main():
+    doc_types, documents = build_archive()
+    FakePaperlessHandler.doc_types = doc_types
+    FakePaperlessHandler.documents = documents
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), FakePaperlessHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f'http://127.0.0.1:{server.server_port}'
+
+    print(f"Fake archive: {NUM_DOCUMENTS} documents, {NUM_TYPES} types, "
+          f"{CONTENT_SIZE} chars content, {LATENCY * 1000:.0f}ms latency")
+    print(f"{'method':<28} {'time':>9} {'requests':>17} {'transferred':>12}")
+
+    api = PaperlessAPI(base_url, token='benchmark', max_workers=8)
+    expected = run_benchmark('legacy (full records)', lambda: legacy_type_counts(api))
+
+    ok = True
+    for method in ['full_scan', 'count_queries', 'document_count']:
+        stats = run_benchmark(method, lambda: api.get_document_type_stats(method=method))
+        counts = {s['id']: s['count'] for s in stats['type_stats']}
+        if counts != {k: v for k, v in expected.items() if v}:
+            print(f"  MISMATCH: {method} counts differ from legacy scan")
+            ok = False
+
+    server.shutdown()
+    return 0 if ok else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
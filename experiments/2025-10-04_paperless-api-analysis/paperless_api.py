@@ -7,14 +7,23 @@ import requests
 import json
 import os
 import datetime
-from collections import defaultdict
+from collections import defaultdict, deque
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
+from requests.adapters import HTTPAdapter
 
 class PaperlessAPI:
-    def __init__(self, base_url, token=None, username=None, password=None, save_raw_data=False):
+    def __init__(self, base_url, token=None, username=None, password=None, save_raw_data=False,
+                 max_workers=1):
         self.base_url = base_url.rstrip('/')
         self.session = requests.Session()
         self.save_raw_data = save_raw_data
+        self.max_workers = max(1, max_workers)
+
+        # Size the connection pool so concurrent page fetches reuse connections
+        adapter = HTTPAdapter(pool_connections=self.max_workers, pool_maxsize=self.max_workers)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
         self.raw_data_dir = Path(__file__).parent / "raw_data"
 
         if save_raw_data:
@@ -41,6 +50,9 @@ class PaperlessAPI:
 
         timestamp = datetime.datetime.now().strftime('%Y%m%d_%H%M%S_%f')[:-3]  # Include milliseconds
         base_name = f"{timestamp}_{method.lower()}_{url.split('/')[-1]}"
+        if params and 'page' in params:
+            # Concurrent page fetches can share a millisecond timestamp
+            base_name += f"_page{params['page']}"
 
         # Save request
         request_data = {
@@ -81,59 +93,174 @@ class PaperlessAPI:
         response.raise_for_status()
         return response
 
+    def _get_all_results(self, endpoint, page_size=1000):
+        """Get every result of a paginated list endpoint as one {'count', 'results'} dict."""
+        response = self._make_request('GET', f'{self.base_url}/api/{endpoint}/', params={'page_size': page_size})
+        data = response.json()
+        results = list(data['results'])
+
+        next_url = data.get('next')
+        while next_url:
+            data = self._make_request('GET', next_url).json()
+            results.extend(data['results'])
+            next_url = data.get('next')
+
+        return {'count': len(results), 'results': results}
+
     def get_document_types(self):
         """Get all document types from paperless."""
-        response = self._make_request('GET', f'{self.base_url}/api/document_types/')
-        return response.json()
-
-    def get_documents(self, page_size=100, document_type=None):
-        """Get documents, optionally filtered by document type."""
+        return self._get_all_results('document_types')
+
+    def count_documents(self, **filters):
+        """Count documents matching the given filters without downloading them."""
+        params = {'page_size': 1, 'fields': 'id', **filters}
+        response = self._make_request('GET', f'{self.base_url}/api/documents/', params=params)
+        return response.json()['count']
+
+    def _fetch_documents_page(self, url, params, page):
+        """Fetch a single numbered page of the documents list."""
+        response = self._make_request('GET', url, params={**params, 'page': page})
+        return response.json()['results']
+
+    def iter_documents(self, page_size=100, document_type=None, max_workers=None, extra_params=None):
+        """Yield documents in order, fetching later pages concurrently.
+
+        The first page's count and length are used to compute every remaining
+        page up front; those pages are fetched by up to max_workers threads
+        (defaults to self.max_workers) with at most two pages per worker
+        buffered, so callers can process results without holding the whole
+        archive.
+        """
         url = f'{self.base_url}/api/documents/'
         params = {'page_size': page_size}
 
         if document_type:
             params['document_type__id'] = document_type
+        if extra_params:
+            params.update(extra_params)
 
-        all_documents = []
-        next_url = url
+        workers = max(1, max_workers or self.max_workers)
 
-        while next_url:
-            if next_url == url:
-                response = self._make_request('GET', next_url, params=params)
-            else:
-                response = self._make_request('GET', next_url)
+        response = self._make_request('GET', url, params=params)
+        data = response.json()
+        yield from data['results']
+
+        if not data.get('next'):
+            return
 
-            data = response.json()
+        # The server caps page_size (paperless's max_page_size), so page
+        # numbers follow the size it actually served
+        served = len(data['results']) or page_size
+        total_pages = -(-data['count'] // min(page_size, served))
+        remaining = deque(range(2, total_pages + 1))
 
-            all_documents.extend(data['results'])
-            next_url = data.get('next')
+        if workers == 1:
+            for page in remaining:
+                yield from self._fetch_documents_page(url, params, page)
+            return
+
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            in_flight = deque()
+            while remaining or in_flight:
+                while remaining and len(in_flight) < workers * 2:
+                    in_flight.append(executor.submit(self._fetch_documents_page, url, params, remaining.popleft()))
+                yield from in_flight.popleft().result()
 
-            print(f"Fetched {len(all_documents)} documents so far...")
+    def get_documents(self, page_size=100, document_type=None, max_workers=None, extra_params=None):
+        """Get documents, optionally filtered by document type."""
+        all_documents = []
 
+        for document in self.iter_documents(page_size, document_type, max_workers, extra_params):
+            all_documents.append(document)
+            if len(all_documents) % page_size == 0:
+                print(f"Fetched {len(all_documents)} documents so far...")
+
+        print(f"Fetched {len(all_documents)} documents total")
         return all_documents
 
-    def get_document_type_stats(self):
-        """Get statistics on documents by type."""
+    def _type_counts_from_document_count(self, doc_types):
+        """Read per-type counts from the document_count field on /api/document_types/."""
+        if not all('document_count' in dt for dt in doc_types['results']):
+            return None
+
+        type_counts = {dt['id']: dt['document_count'] for dt in doc_types['results']}
+        total = self.count_documents()
+        # A document has at most one type, so the remainder is untyped
+        type_counts[None] = total - sum(type_counts.values())
+        return type_counts, total
+
+    def _type_counts_from_count_queries(self, doc_types):
+        """Issue one page_size=1 count query per type (plus untyped), concurrently."""
+        queries = {dt['id']: {'document_type__id': dt['id']} for dt in doc_types['results']}
+        queries[None] = {'document_type__isnull': 1}
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            futures = {type_id: executor.submit(self.count_documents, **filters)
+                       for type_id, filters in queries.items()}
+            type_counts = {type_id: future.result() for type_id, future in futures.items()}
+
+        return type_counts, self.count_documents()
+
+    def _type_counts_from_full_scan(self):
+        """Download every document (type field only) and count types client-side."""
+        type_counts = defaultdict(int)
+        total = 0
+
+        for doc in self.iter_documents(extra_params={'fields': 'id,document_type'}):
+            type_counts[doc.get('document_type')] += 1
+            total += 1
+
+        return type_counts, total
+
+    def get_document_type_stats(self, method='auto'):
+        """Get statistics on documents by type.
+
+        method is one of 'document_count' (counts embedded in the document
+        type list, one extra request), 'count_queries' (one count-only request
+        per type), 'full_scan' (stream every document) or 'auto', which tries
+        them in that order and falls back when a method isn't supported.
+        """
         print("Fetching document types...")
         doc_types = self.get_document_types()
 
-        print("Fetching all documents...")
-        documents = self.get_documents()
+        methods = ['document_count', 'count_queries', 'full_scan'] if method == 'auto' else [method]
+        counted = None
+
+        for candidate in methods:
+            print(f"Counting documents by type ({candidate})...")
+            try:
+                if candidate == 'document_count':
+                    counted = self._type_counts_from_document_count(doc_types)
+                elif candidate == 'count_queries':
+                    counted = self._type_counts_from_count_queries(doc_types)
+                elif candidate == 'full_scan':
+                    counted = self._type_counts_from_full_scan()
+                else:
+                    raise ValueError(f"Unknown stats method: {candidate}")
+            except requests.exceptions.HTTPError as e:
+                if method != 'auto':
+                    raise
+                print(f"  {candidate} failed ({e}), falling back")
+                counted = None
+
+            if counted:
+                break
+
+        if not counted:
+            raise Exception("Could not count documents by type")
+
+        type_counts, total_documents = counted
 
-        # Count documents by type
-        type_counts = defaultdict(int)
         type_names = {dt['id']: dt['name'] for dt in doc_types['results']}
 
         # Add "No Type" for documents without a type
         type_names[None] = "No Type"
 
-        for doc in documents:
-            doc_type_id = doc.get('document_type')
-            type_counts[doc_type_id] += 1
-
         # Prepare results
         results = []
         for type_id, count in type_counts.items():
+            if count == 0:
+                continue
             results.append({
                 'id': type_id,
                 'name': type_names.get(type_id, f"Unknown (ID: {type_id})"),
@@ -144,20 +271,25 @@ class PaperlessAPI:
         results.sort(key=lambda x: x['count'], reverse=True)
 
         return {
-            'total_documents': len(documents),
+            'total_documents': total_documents,
             'total_types': len(doc_types['results']),
-            'type_stats': results
+            'type_stats': results,
+            'method': candidate
         }
 
     def get_correspondents(self):
         """Get all correspondents."""
-        response = self._make_request('GET', f'{self.base_url}/api/correspondents/')
-        return response.json()
+        return self._get_all_results('correspondents')
 
     def get_tags(self):
         """Get all tags."""
-        response = self._make_request('GET', f'{self.base_url}/api/tags/')
-        return response.json()
+        return self._get_all_results('tags')
+
+    def get_all_document_ids(self):
+        """Get the ids of every document from the 'all' field, or None if unsupported."""
+        response = self._make_request('GET', f'{self.base_url}/api/documents/',
+                                      params={'page_size': 1, 'fields': 'id'})
+        return response.json().get('all')
 
 def main():
     # Configuration from previous experiment (EXPERIMENTS.md)
@@ -182,7 +314,8 @@ def main():
         # Connect to paperless with raw data saving enabled
         print(f"Connecting to paperless at {PAPERLESS_URL}...")
         print("Raw request/response data will be saved to raw_data/ folder")
-        api = PaperlessAPI(PAPERLESS_URL, token=TOKEN, username=USERNAME, password=PASSWORD, save_raw_data=True)
+        api = PaperlessAPI(PAPERLESS_URL, token=TOKEN, username=USERNAME, password=PASSWORD, save_raw_data=True,
+                           max_workers=4)
 
         # Get document type statistics
         print("\nGetting document type statistics...")
@@ -0,0 +1,318 @@
+#!/usr/bin/env python3
+"""
+Local SQLite mirror of paperless-ngx metadata.
+The first sync pulls every document's metadata plus document types,
+correspondents and tags; later syncs only fetch documents modified after the
+last watermark. Lookups, stats and queries the API can't express (like "NOT
+tagged with X") then run locally.
+
+Usage:
+    python paperless_mirror.py sync
+    python paperless_mirror.py resync
+    python paperless_mirror.py stats
+    python paperless_mirror.py without-tag <tag name or id>
+"""
+
+import datetime
+import json
+import os
+import sqlite3
+import sys
+import time
+from pathlib import Path
+
+import requests
+
+from paperless_api import PaperlessAPI
+
+# Everything except OCR content, which the mirror doesn't need
+MIRROR_FIELDS = [
+    'id', 'title', 'document_type', 'correspondent', 'storage_path', 'tags',
+    'created', 'modified', 'added', 'archive_serial_number', 'original_file_name',
+    'custom_fields', 'notes'
+]
+
+
+class PaperlessMirror:
+    def __init__(self, api, db_path=None):
+        self.api = api
+        self.db_path = Path(db_path) if db_path else Path(__file__).parent / "paperless_mirror.sqlite3"
+        self.conn = sqlite3.connect(str(self.db_path))
+        self.conn.row_factory = sqlite3.Row
+        self._create_schema()
+
+    def _create_schema(self):
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS documents (
+                id INTEGER PRIMARY KEY,
+                title TEXT,
+                document_type INTEGER,
+                correspondent INTEGER,
+                created TEXT,
+                modified TEXT,
+                data TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_documents_type ON documents(document_type);
+            CREATE INDEX IF NOT EXISTS idx_documents_correspondent ON documents(correspondent);
+
+            CREATE TABLE IF NOT EXISTS document_tags (
+                document_id INTEGER NOT NULL,
+                tag_id INTEGER NOT NULL,
+                PRIMARY KEY (document_id, tag_id)
+            );
+            CREATE INDEX IF NOT EXISTS idx_document_tags_tag ON document_tags(tag_id);
+
+            CREATE TABLE IF NOT EXISTS metadata (
+                endpoint TEXT NOT NULL,
+                id INTEGER NOT NULL,
+                name TEXT,
+                data TEXT NOT NULL,
+                PRIMARY KEY (endpoint, id)
+            );
+
+            CREATE TABLE IF NOT EXISTS sync_state (
+                key TEXT PRIMARY KEY,
+                value TEXT
+            );
+        """)
+        self.conn.commit()
+
+    def _get_state(self, key):
+        row = self.conn.execute("SELECT value FROM sync_state WHERE key = ?", (key,)).fetchone()
+        return row['value'] if row else None
+
+    def _set_state(self, key, value):
+        self.conn.execute("INSERT OR REPLACE INTO sync_state (key, value) VALUES (?, ?)", (key, value))
+
+    def _upsert_document(self, doc):
+        self.conn.execute(
+            "INSERT OR REPLACE INTO documents (id, title, document_type, correspondent, created, modified, data) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (doc['id'], doc.get('title'), doc.get('document_type'), doc.get('correspondent'),
+             doc.get('created'), doc.get('modified'), json.dumps(doc))
+        )
+        self.conn.execute("DELETE FROM document_tags WHERE document_id = ?", (doc['id'],))
+        self.conn.executemany(
+            "INSERT INTO document_tags (document_id, tag_id) VALUES (?, ?)",
+            [(doc['id'], tag_id) for tag_id in doc.get('tags') or []]
+        )
+
+    def _sync_metadata(self):
+        """Metadata lists are small, so they are always refreshed in full."""
+        metadata = {
+            'document_types': self.api.get_document_types,
+            'correspondents': self.api.get_correspondents,
+            'tags': self.api.get_tags
+        }
+        for endpoint, fetch in metadata.items():
+            items = fetch()['results']
+            self.conn.execute("DELETE FROM metadata WHERE endpoint = ?", (endpoint,))
+            self.conn.executemany(
+                "INSERT INTO metadata (endpoint, id, name, data) VALUES (?, ?, ?, ?)",
+                [(endpoint, item['id'], item.get('name'), json.dumps(item)) for item in items]
+            )
+
+    def _prune_deleted(self):
+        """Drop mirrored documents that no longer exist on the server.
+
+        Paperless includes an 'all' list of matching ids in list responses;
+        if the server doesn't, deletions are only repaired by a full resync.
+        """
+        server_ids = self.api.get_all_document_ids()
+        if server_ids is None:
+            return 0
+
+        self.conn.execute("CREATE TEMP TABLE IF NOT EXISTS server_ids (id INTEGER PRIMARY KEY)")
+        self.conn.execute("DELETE FROM server_ids")
+        self.conn.executemany("INSERT INTO server_ids (id) VALUES (?)", [(i,) for i in server_ids])
+        deleted = self.conn.execute(
+            "DELETE FROM documents WHERE id NOT IN (SELECT id FROM server_ids)"
+        ).rowcount
+        self.conn.execute("DELETE FROM document_tags WHERE document_id NOT IN (SELECT id FROM documents)")
+        return deleted
+
+    def sync(self):
+        """Fetch documents modified since the last watermark (full pull on first run)."""
+        start_time = time.time()
+        watermark = self._get_state('modified_watermark')
+
+        extra_params = {'fields': ','.join(MIRROR_FIELDS)}
+        if watermark:
+            extra_params['modified__gt'] = watermark
+            print(f"Syncing documents modified after {watermark}...")
+        else:
+            print("No watermark found, pulling all documents...")
+
+        self._sync_metadata()
+
+        fetched = 0
+        newest = watermark
+        newest_dt = datetime.datetime.fromisoformat(watermark.replace('Z', '+00:00')) if watermark else None
+
+        for doc in self.api.iter_documents(extra_params=extra_params):
+            self._upsert_document(doc)
+            fetched += 1
+
+            # Track the watermark in server time rather than the local clock
+            modified = doc.get('modified')
+            if modified:
+                modified_dt = datetime.datetime.fromisoformat(modified.replace('Z', '+00:00'))
+                if newest_dt is None or modified_dt > newest_dt:
+                    newest, newest_dt = modified, modified_dt
+
+        deleted = self._prune_deleted()
+
+        if newest:
+            self._set_state('modified_watermark', newest)
+        self._set_state('last_sync', datetime.datetime.now().isoformat())
+        self.conn.commit()
+
+        result = {
+            'fetched': fetched,
+            'deleted': deleted,
+            'watermark': newest,
+            'elapsed': time.time() - start_time
+        }
+        print(f"Sync complete: {fetched} fetched, {deleted} deleted in {result['elapsed']:.2f}s")
+        return result
+
+    def full_resync(self):
+        """Discard the mirror and pull everything again to repair drift."""
+        self.conn.executescript("""
+            DELETE FROM documents;
+            DELETE FROM document_tags;
+            DELETE FROM metadata;
+            DELETE FROM sync_state;
+        """)
+        self.conn.commit()
+        return self.sync()
+
+    def get_document(self, document_id):
+        """Return a mirrored document's metadata, or None."""
+        row = self.conn.execute("SELECT data FROM documents WHERE id = ?", (document_id,)).fetchone()
+        return json.loads(row['data']) if row else None
+
+    def resolve_id(self, endpoint, name_or_id):
+        """Resolve a metadata name (case-insensitive) or numeric id to an id.
+
+        Names win, so an all-digit name such as a "2025" tag is found by name;
+        digits only fall back to being an id when no name matches.
+        """
+        row = self.conn.execute(
+            "SELECT id FROM metadata WHERE endpoint = ? AND name = ? COLLATE NOCASE", (endpoint, str(name_or_id))
+        ).fetchone()
+        if row:
+            return row['id']
+        return int(name_or_id) if str(name_or_id).isdigit() else None
+
+    def find_documents(self, document_type=None, correspondent=None, with_tags=None, without_tags=None,
+                       any_tags=None):
+        """Query mirrored documents with filters paperless can't combine server-side.
+
+        with_tags requires all of the tags, any_tags at least one of them and
+        without_tags none of them. Returns documents' metadata dicts.
+        """
+        clauses = []
+        params = []
+
+        if document_type is not None:
+            clauses.append("document_type = ?")
+            params.append(document_type)
+        if correspondent is not None:
+            clauses.append("correspondent = ?")
+            params.append(correspondent)
+        for tag_id in with_tags or []:
+            clauses.append("id IN (SELECT document_id FROM document_tags WHERE tag_id = ?)")
+            params.append(tag_id)
+        if any_tags:
+            placeholders = ','.join('?' * len(any_tags))
+            clauses.append(f"id IN (SELECT document_id FROM document_tags WHERE tag_id IN ({placeholders}))")
+            params.extend(any_tags)
+        if without_tags:
+            placeholders = ','.join('?' * len(without_tags))
+            clauses.append(f"id NOT IN (SELECT document_id FROM document_tags WHERE tag_id IN ({placeholders}))")
+            params.extend(without_tags)
+
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        rows = self.conn.execute(f"SELECT data FROM documents {where} ORDER BY id", params)
+        return [json.loads(row['data']) for row in rows]
+
+    def get_document_type_stats(self):
+        """Same shape as PaperlessAPI.get_document_type_stats, computed locally."""
+        rows = self.conn.execute("""
+            SELECT d.document_type AS id, COUNT(*) AS count, m.name AS name
+            FROM documents d
+            LEFT JOIN metadata m ON m.endpoint = 'document_types' AND m.id = d.document_type
+            GROUP BY d.document_type
+            ORDER BY count DESC
+        """).fetchall()
+
+        results = []
+        for row in rows:
+            if row['id'] is None:
+                name = "No Type"
+            else:
+                name = row['name'] or f"Unknown (ID: {row['id']})"
+            results.append({'id': row['id'], 'name': name, 'count': row['count']})
+
+        return {
+            'total_documents': sum(r['count'] for r in results),
+            'total_types': self.conn.execute(
+                "SELECT COUNT(*) FROM metadata WHERE endpoint = 'document_types'"
+            ).fetchone()[0],
+            'type_stats': results,
+            'method': 'mirror'
+        }
+
+
+def main():
+    PAPERLESS_URL = os.getenv('PAPERLESS_URL', "http://192.168.1.7:8000")
+    TOKEN = os.getenv('PAPERLESS_API_KEY')
+
+    if len(sys.argv) < 2 or sys.argv[1] not in ('sync', 'resync', 'stats', 'without-tag'):
+        print(__doc__.strip())
+        return
+
+    if not TOKEN:
+        print("Authentication required: set PAPERLESS_API_KEY environment variable")
+        return
+
+    command = sys.argv[1]
+
+    try:
+        api = PaperlessAPI(PAPERLESS_URL, token=TOKEN, max_workers=4)
+        mirror = PaperlessMirror(api)
+
+        if command == 'sync':
+            mirror.sync()
+        elif command == 'resync':
+            mirror.full_resync()
+        elif command == 'stats':
+            stats = mirror.get_document_type_stats()
+            print(f"Total Documents: {stats['total_documents']}")
+            print(f"Total Document Types: {stats['total_types']}")
+            print("-" * 50)
+            for type_stat in stats['type_stats']:
+                percentage = (type_stat['count'] / stats['total_documents']) * 100
+                print(f"{type_stat['name']:<30} {type_stat['count']:>5} ({percentage:>5.1f}%)")
+        elif command == 'without-tag':
+            if len(sys.argv) != 3:
+                print("Usage: python paperless_mirror.py without-tag <tag name or id>")
+                return
+            tag_id = mirror.resolve_id('tags', sys.argv[2])
+            if tag_id is None:
+                print(f"Unknown tag: {sys.argv[2]} (run sync first?)")
+                return
+            documents = mirror.find_documents(without_tags=[tag_id])
+            for doc in documents:
+                print(f"{doc['id']:>6}  {doc.get('title')}")
+            print(f"\n{len(documents)} documents not tagged with {sys.argv[2]}")
+
+    except requests.exceptions.ConnectionError:
+        print(f"ERROR: Could not connect to paperless at {PAPERLESS_URL}")
+    except requests.exceptions.HTTPError as e:
+        print(f"ERROR: HTTP error occurred: {e}")
+
+
+if __name__ == '__main__':
+    main()
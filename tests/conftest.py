@@ -0,0 +1,10 @@
+"""Make each experiment's modules importable by name, as its scripts import them."""
+
+import sys
+from pathlib import Path
+
+EXPERIMENTS_DIR = Path(__file__).resolve().parent.parent / "experiments"
+
+for experiment in sorted(EXPERIMENTS_DIR.iterdir()):
+    if experiment.is_dir() and str(experiment) not in sys.path:
+        sys.path.insert(0, str(experiment))
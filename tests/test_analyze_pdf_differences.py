@@ -0,0 +1,32 @@
+import hashlib
+
+from analyze_pdf_differences import analyze_binary_differences
+
+
+def write(path, data):
+    path.write_bytes(data)
+    return str(path)
+
+
+def test_first_difference_found_across_chunks(tmp_path):
+    original = write(tmp_path / "a.pdf", b"%PDF-1.7" + bytes(100))
+    changed = write(tmp_path / "b.pdf", b"%PDF-1.7" + bytes(50) + b"x" + bytes(49))
+
+    result = analyze_binary_differences(original, changed, chunk_size=16)
+    assert (result['identical'], result['first_difference'], result['size_diff']) == (False, 58, 0)
+    assert 'sha256_1' not in result
+
+
+def test_digests_come_from_the_comparison(tmp_path):
+    data1 = b"%PDF-1.7" + bytes(100)
+    data2 = b"%PDF-1.7" + b"y" + bytes(120)
+    original = write(tmp_path / "a.pdf", data1)
+    larger = write(tmp_path / "b.pdf", data2)
+
+    result = analyze_binary_differences(original, larger, chunk_size=16, digests=True)
+    assert (result['identical'], result['size_diff']) == (False, len(data2) - len(data1))
+    assert result['sha256_1'] == hashlib.sha256(data1).hexdigest()
+    assert result['sha256_2'] == hashlib.sha256(data2).hexdigest()
+
+    same = analyze_binary_differences(original, original, chunk_size=16, digests=True)
+    assert same['identical'] and same['sha256_1'] == same['sha256_2'] == hashlib.sha256(data1).hexdigest()
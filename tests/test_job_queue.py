@@ -0,0 +1,87 @@
+import threading
+import time
+
+from job_queue import JobQueue, WorkerPool
+
+
+def test_enqueue_and_claim_in_order(tmp_path):
+    queue = JobQueue(str(tmp_path / "jobs.sqlite3"))
+    first = queue.enqueue('/document-added', {'document_id': 1})
+    second = queue.enqueue('/document-added', {'document_id': 2})
+
+    job = queue.claim(timeout=0)
+    assert (job['id'], job['payload'], job['attempts']) == (first, {'document_id': 1}, 1)
+    assert queue.claim(timeout=0)['id'] == second
+    assert queue.claim(timeout=0) is None
+    assert queue.stats() == {'running': 2}
+
+    queue.complete(first)
+    assert queue.stats() == {'done': 1, 'running': 1}
+
+
+def test_failed_job_is_retried_until_max_attempts(tmp_path):
+    queue = JobQueue(str(tmp_path / "jobs.sqlite3"), max_attempts=2)
+    job_id = queue.enqueue('/document-added', {'document_id': 1})
+
+    job = queue.claim(timeout=0)
+    queue.fail(job['id'], RuntimeError("paperless down"), job['attempts'])
+    assert queue.stats() == {'queued': 1}
+
+    retry = queue.claim(timeout=0)
+    assert (retry['id'], retry['attempts'], retry['error']) == (job_id, 2, "paperless down")
+    queue.fail(retry['id'], RuntimeError("still down"), retry['attempts'])
+    assert queue.stats() == {'failed': 1}
+    assert queue.claim(timeout=0) is None
+
+
+def test_job_claimed_by_dead_worker_is_reclaimed(tmp_path):
+    db_path = str(tmp_path / "jobs.sqlite3")
+    crashed = JobQueue(db_path)
+    job_id = crashed.enqueue('/document-added', {'document_id': 1})
+    assert crashed.claim(timeout=0)['id'] == job_id
+    crashed.close()  # the worker dies without completing or failing the job
+
+    restarted = JobQueue(db_path)
+    assert restarted.claim(timeout=0) is None
+    assert restarted.requeue_interrupted() == 1
+
+    job = restarted.claim(timeout=0)
+    assert (job['id'], job['attempts']) == (job_id, 2)
+
+
+def test_worker_pool_drains_queue(tmp_path):
+    queue = JobQueue(str(tmp_path / "jobs.sqlite3"))
+    handled = []
+    lock = threading.Lock()
+
+    def handler(job):
+        with lock:
+            handled.append(job['payload']['document_id'])
+        if job['payload']['document_id'] == 3 and job['attempts'] == 1:
+            raise RuntimeError("transient")
+
+    for document_id in range(5):
+        queue.enqueue('/document-added', {'document_id': document_id})
+    pool = WorkerPool(queue, handler, num_workers=2)
+    pool.start()
+    pool.stop(drain=True, timeout=10)
+
+    assert sorted(handled) == [0, 1, 2, 3, 3, 4]
+    assert queue.stats() == {'done': 5}
+
+
+def test_stop_timeout_is_shared_across_workers(tmp_path):
+    queue = JobQueue(str(tmp_path / "jobs.sqlite3"))
+    release = threading.Event()
+    for document_id in range(3):
+        queue.enqueue('/document-added', {'document_id': document_id})
+    pool = WorkerPool(queue, lambda job: release.wait(), num_workers=3)
+    pool.start()
+
+    started = time.monotonic()
+    pool.stop(drain=True, timeout=0.5)
+    elapsed = time.monotonic() - started
+    release.set()
+
+    # Three hung workers must not stretch the stop to three timeouts
+    assert elapsed < 1.0
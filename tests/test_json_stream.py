@@ -0,0 +1,71 @@
+import json
+
+import pytest
+
+from json_stream import JSONObjectExtractor, extract_json_from_response, parse_json_response
+
+ANSWER = {
+    "document_type": "letter",
+    "key_summary": "see {page} 2 for the \"total\" [due]",
+    "recommended_actions": [{"action": "keep", "pages": [1, 2], "reasoning": "a \\ b, c"}],
+    "analysis_confidence": 90
+}
+RESPONSE = "Here is the analysis {as requested}:\n" + json.dumps(ANSWER, indent=2) + "\nI hope {this} helps."
+
+
+def feed_in_chunks(text, size, on_field=None):
+    extractor = JSONObjectExtractor(on_field=on_field)
+    results = [extractor.feed(text[start:start + size]) for start in range(0, len(text), size)]
+    extractor.finish()
+    return extractor, [result for result in results if result is not None]
+
+
+def test_braces_inside_strings_are_not_structural():
+    result, json_text, trailing = parse_json_response('{"summary": "see {page}", "pages": "}"} Done.')
+    assert result == {"summary": "see {page}", "pages": "}"}
+    assert json_text == '{"summary": "see {page}", "pages": "}"}'
+    assert trailing == "Done."
+
+
+def test_escaped_quotes_do_not_end_strings():
+    text = r'{"summary": "the \"{total}\" is \\", "confidence": 80}'
+    assert parse_json_response(text)[0] == {"summary": 'the "{total}" is \\', "confidence": 80}
+
+
+def test_prose_braces_before_the_object_are_skipped():
+    extractor, _ = feed_in_chunks(RESPONSE, len(RESPONSE))
+    assert extractor.result == ANSWER
+    assert extractor.prefix == "Here is the analysis {as requested}:\n"
+    assert extractor.trailing == "\nI hope {this} helps."
+
+
+def test_unbalanced_prose_brace_is_retried_at_finish():
+    assert extract_json_from_response('Note: { see below\n{"confidence": 70}') == '{"confidence": 70}'
+
+
+@pytest.mark.parametrize("size", [1, 2, 3, 7, 64])
+def test_chunk_boundaries_that_split_tokens(size):
+    extractor, results = feed_in_chunks(RESPONSE, size)
+    assert results == [ANSWER]
+    assert extractor.result == ANSWER
+    assert extractor.trailing == "\nI hope {this} helps."
+
+
+@pytest.mark.parametrize("size", [1, 5, len(RESPONSE)])
+def test_on_field_fires_once_per_top_level_field(size):
+    reported = []
+    feed_in_chunks(RESPONSE + ' {"document_type": "again"}', size,
+                   on_field=lambda name, value: reported.append((name, value)))
+    assert reported == list(ANSWER.items())
+
+
+def test_fields_complete_before_the_object():
+    extractor = JSONObjectExtractor()
+    assert extractor.feed('{"document_type": "invoice", "pages": [1,') is None
+    assert extractor.fields == {"document_type": "invoice"}
+    assert extractor.feed(' 2]}') == {"document_type": "invoice", "pages": [1, 2]}
+    assert set(extractor.field_times) == {"document_type", "pages"}
+
+
+def test_no_object():
+    assert parse_json_response("I could not read this document.") == (None, None, "")
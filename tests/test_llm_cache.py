@@ -0,0 +1,80 @@
+import itertools
+
+import pytest
+
+import llm_cache
+from llm_cache import LLMResultCache
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Strictly increasing time.time() so last_used ordering is deterministic."""
+    ticks = itertools.count(1000)
+    monkeypatch.setattr(llm_cache.time, 'time', lambda: float(next(ticks)))
+
+
+def row_count(cache):
+    return cache._conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+
+
+def test_put_get_round_trip(tmp_path):
+    cache = LLMResultCache(tmp_path / "cache.sqlite3")
+    key = LLMResultCache.make_key("model", 0.1, 100, "prompt")
+
+    assert cache.get(key) is None
+    cache.put(key, "model", '{"a": 1}', {"input_tokens": 5, "output_tokens": 2})
+
+    assert cache.get(key) == {'response': '{"a": 1}', 'usage': {"input_tokens": 5, "output_tokens": 2}}
+    stats = cache.stats()
+    assert (stats['hits'], stats['misses'], stats['entries']) == (1, 1, 1)
+
+
+def test_key_covers_every_input():
+    base = LLMResultCache.make_key("model", 0.1, 100, "prompt")
+    assert base == LLMResultCache.make_key("model", 0.1, 100, "prompt")
+    assert base != LLMResultCache.make_key("other", 0.1, 100, "prompt")
+    assert base != LLMResultCache.make_key("model", 0.2, 100, "prompt")
+    assert base != LLMResultCache.make_key("model", 0.1, 200, "prompt")
+    assert base != LLMResultCache.make_key("model", 0.1, 100, "prompt!")
+    assert base != LLMResultCache.make_key("model", 0.1, 100, "prompt", stream=True)
+    assert base == LLMResultCache.make_key("model", 0.1, 100, "prompt", stream=False)
+
+
+def test_put_evicts_least_recently_used_only_past_slack(tmp_path, clock):
+    cache = LLMResultCache(tmp_path / "cache.sqlite3", max_entries=10)
+    for index in range(10):
+        cache.put(f"k{index}", "model", str(index))
+    cache.get("k0")  # k0 is now the most recently used
+
+    # One over max_entries is within the slack: no eviction scan yet
+    cache.put("k10", "model", "10")
+    assert row_count(cache) == 11
+
+    # Passing the slack trims back to max_entries, least recently used first
+    cache.put("k11", "model", "11")
+    assert row_count(cache) == 10
+    assert cache.get("k0") is not None
+    assert cache.get("k1") is None
+    assert cache.get("k2") is None
+    assert cache.get("k11") is not None
+
+
+def test_evict_trims_to_max_entries(tmp_path, clock):
+    cache = LLMResultCache(tmp_path / "cache.sqlite3", max_entries=3)
+    for index in range(4):
+        cache.put(f"k{index}", "model", str(index))
+    assert row_count(cache) == 4
+
+    cache.evict()
+    assert row_count(cache) == 3
+    assert cache.get("k0") is None
+
+
+def test_expired_entries_are_misses(tmp_path, clock):
+    cache = LLMResultCache(tmp_path / "cache.sqlite3", max_age_seconds=5)
+    cache.put("old", "model", "stale")
+    for _ in range(10):
+        llm_cache.time.time()
+
+    assert cache.get("old") is None
+    assert row_count(cache) == 0
@@ -0,0 +1,191 @@
+import json
+import re
+import threading
+
+import anthropic
+import httpx
+import pytest
+
+import rate_limit
+from json_stream import JSONObjectExtractor
+from llm_cache import LLMResultCache
+from llm_document_analyzer import DocumentAnalyzer
+from rate_limit import RateLimiter
+
+USAGE = {'input_tokens': 100, 'output_tokens': 20}
+HAIKU = "claude-3-5-haiku-latest"
+LONG_PREFIX = "Classify the document and extract its key fields. " * 600
+
+
+@pytest.fixture
+def analyzer(monkeypatch):
+    monkeypatch.setattr(rate_limit.time, 'sleep', lambda seconds: None)
+    return DocumentAnalyzer(api_key='test-key', rate_limiter=RateLimiter(seed=1))
+
+
+def connection_error():
+    return anthropic.APIConnectionError(request=httpx.Request('POST', 'http://stub/v1/messages'))
+
+
+def test_retried_stream_reports_each_field_once(analyzer, monkeypatch):
+    attempts = []
+
+    def stream_message(content, model, max_tokens, temperature, on_field, permit):
+        attempts.append(model)
+        on_field('document_type', 'invoice')
+        if len(attempts) == 1:
+            raise connection_error()
+        on_field('summary', 'Power bill')
+        return {'text': '{"document_type": "invoice", "summary": "Power bill"}', 'usage': USAGE,
+                'cached': False, 'streaming': {'stopped_early': True}}
+
+    monkeypatch.setattr(analyzer, '_stream_message', stream_message)
+    fields = []
+    result = analyzer._create_message("Analyze", "model", 256, stream=True,
+                                      on_field=lambda name, value: fields.append(name))
+
+    assert len(attempts) == 2
+    assert fields == ['document_type', 'summary']
+    assert result['text'].startswith('{"document_type"')
+
+
+def test_stopped_early_streams_are_cached_apart_from_full_responses(analyzer, monkeypatch, tmp_path):
+    analyzer.cache = LLMResultCache(tmp_path / "cache.sqlite3")
+    monkeypatch.setattr(analyzer, '_stream_message', lambda *args: {
+        'text': '{"summary": "cut short"}', 'usage': USAGE, 'cached': False, 'streaming': {'stopped_early': True}
+    })
+    analyzer._create_message("Analyze", "model", 256, stream=True)
+
+    stream_key = LLMResultCache.make_key("model", 0.1, 256, "Analyze", stream=True)
+    assert analyzer.cache.get(stream_key)['response'] == '{"summary": "cut short"}'
+    assert analyzer.cache.get(LLMResultCache.make_key("model", 0.1, 256, "Analyze")) is None
+
+
+def test_streamed_requests_are_served_full_responses(analyzer, monkeypatch, tmp_path):
+    analyzer.cache = LLMResultCache(tmp_path / "cache.sqlite3")
+    analyzer.cache.put(LLMResultCache.make_key("model", 0.1, 256, "Analyze"), "model",
+                       '{"document_type": "invoice"} Notes', USAGE)
+    monkeypatch.setattr(analyzer, '_stream_message', lambda *args: pytest.fail("cache miss"))
+    fields = []
+
+    result = analyzer._create_message("Analyze", "model", 256, stream=True,
+                                      on_field=lambda name, value: fields.append((name, value)))
+
+    assert result['cached'] and result['text'] == '{"document_type": "invoice"} Notes'
+    assert fields == [('document_type', 'invoice')]
+
+
+def test_document_type_is_reported_before_the_answer_completes(analyzer):
+    """The early routing in main() needs document_type as a top-level field of the real schema."""
+    prefix, _ = analyzer.load_prompt_parts("text_extraction_analysis")
+    fields = re.findall(r'^  "(\w+)":', prefix, re.MULTILINE)
+    assert fields[0] == 'document_type'
+
+    answer = {name: 'invoice' if name == 'document_type' else [] for name in fields}
+    text = json.dumps(answer, indent=2)
+    reported = []
+    extractor = JSONObjectExtractor(on_field=lambda name, value: reported.append((name, extractor.done)))
+    for start in range(0, len(text), 5):
+        extractor.feed(text[start:start + 5])
+
+    assert extractor.result == answer
+    assert reported[0] == ('document_type', False)
+
+
+def test_only_prefixes_long_enough_to_cache_are_marked(analyzer):
+    short_prefix, _ = analyzer.load_prompt_parts("page_analysis")
+    assert not analyzer.caches_prefix(short_prefix, HAIKU)
+    assert analyzer.message_content("Page 1", short_prefix, HAIKU) == short_prefix + "Page 1"
+
+    assert analyzer.caches_prefix(LONG_PREFIX, HAIKU)
+    content = analyzer.message_content("Page 1", LONG_PREFIX, HAIKU)
+    assert content[0]['cache_control'] == {'type': 'ephemeral'}
+
+    analyzer.prompt_caching = False
+    assert analyzer.message_content("Page 1", LONG_PREFIX, HAIKU) == LONG_PREFIX + "Page 1"
+
+
+def test_small_prefix_page_fan_out_is_not_serialized(analyzer, monkeypatch):
+    """Both page calls must be in flight together; a warm-up call would run alone and time out."""
+    analyzer.max_concurrent_pages = 2
+    pages = [{'page_number': number, 'text': f"Page {number} text"} for number in (1, 2)]
+    monkeypatch.setattr(analyzer, 'iter_text_from_pdf', lambda pdf_path, processes=None: iter(pages))
+    both_sent = threading.Barrier(2, timeout=5)
+
+    def create_message(prompt, model, max_tokens, cached_prefix=''):
+        if max_tokens == 1000:
+            both_sent.wait()
+        return {'text': '{"summary": "ok"}', 'usage': USAGE, 'cached': False, 'estimated_input_tokens': 10}
+
+    monkeypatch.setattr(analyzer, '_create_message', create_message)
+    result = analyzer.analyze_page_by_page("stub.pdf", model=HAIKU)
+
+    assert [page.get('error') for page in result['page_analyses']] == [None, None]
+    assert result['final_analysis'] == '{"summary": "ok"}'
+
+
+def test_cacheable_prefix_warms_the_cache_first(analyzer):
+    analyzer.max_concurrent_pages = 4
+    events = []
+
+    def call(item):
+        events.append(('start', item))
+        threading.Event().wait(0.05)
+        events.append(('end', item))
+        return item
+
+    assert analyzer._run_calls(call, [0, 1, 2, 3], warm_cache=True) == [0, 1, 2, 3]
+    assert events[:2] == [('start', 0), ('end', 0)]
+
+
+def stub_aggregate_calls(analyzer, monkeypatch):
+    """Answer every aggregate call with a short summary, recording the prompts."""
+    prompts = []
+
+    def create_message(prompt, model, max_tokens, cached_prefix=''):
+        prompts.append(prompt)
+        return {'text': f'{{"summary": "part {len(prompts)}"}}', 'usage': USAGE, 'cached': False,
+                'estimated_input_tokens': analyzer.token_counter.estimate(cached_prefix + prompt)}
+
+    monkeypatch.setattr(analyzer, '_create_message', create_message)
+    return prompts
+
+
+def page_analyses(count, words):
+    return [{'page': number, 'analysis': ' '.join(['detail'] * words), 'usage': USAGE}
+            for number in range(1, count + 1)]
+
+
+def test_aggregate_fits_in_one_call(analyzer, monkeypatch):
+    prompts = stub_aggregate_calls(analyzer, monkeypatch)
+    result = analyzer._aggregate(page_analyses(3, 20), 3, HAIKU)
+
+    assert (result['aggregate_calls'], len(prompts)) == (1, 1)
+    assert '"usage"' not in prompts[0]
+
+
+def test_aggregate_recurses_over_groups_within_the_budget(analyzer, monkeypatch):
+    prompts = stub_aggregate_calls(analyzer, monkeypatch)
+    prefix, template = analyzer.load_prompt_parts("aggregate_analysis")
+    overhead = analyzer.token_counter.estimate(prefix + template.format(page_analyses='[]', total_pages=8))
+    analyzer.token_budget = overhead + 900
+
+    result = analyzer._aggregate(page_analyses(8, 300), 8, HAIKU)
+
+    assert result['aggregate_calls'] == len(prompts) > 1
+    assert result['usage']['input_tokens'] == USAGE['input_tokens'] * len(prompts)
+    assert all(analyzer.token_counter.estimate(prefix + prompt) <= analyzer.token_budget for prompt in prompts)
+    assert '"pages": [\n      1,' in prompts[-1]
+
+
+def test_aggregate_truncates_when_grouping_cannot_shrink(analyzer, monkeypatch):
+    prompts = stub_aggregate_calls(analyzer, monkeypatch)
+    prefix, template = analyzer.load_prompt_parts("aggregate_analysis")
+    overhead = analyzer.token_counter.estimate(prefix + template.format(page_analyses='[]', total_pages=2))
+    analyzer.token_budget = overhead + 400
+
+    result = analyzer._aggregate(page_analyses(2, 1000), 2, HAIKU)
+
+    assert (result['aggregate_calls'], len(prompts)) == (1, 1)
+    assert prompts[0].count("truncated to fit the token budget") == 2
+    assert analyzer.token_counter.estimate(prefix + prompts[0]) <= analyzer.token_budget
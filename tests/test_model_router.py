@@ -0,0 +1,58 @@
+import json
+
+import pytest
+
+from model_router import DEFAULT_TIERS, ModelRouter, normalized_confidence
+
+
+def analysis_result(confidence, document_type="utility bill"):
+    analysis = {
+        "analysis_confidence": confidence,
+        "document_count": 1,
+        "total_pages": 2,
+        "recommended_actions": [
+            {"action": "keep", "pages": [1, 2], "document_type": document_type}
+        ]
+    }
+    return {"response": f"Here is the analysis:\n{json.dumps(analysis)}\nLet me know."}
+
+
+@pytest.fixture
+def router():
+    return ModelRouter(analyzer=None)
+
+
+@pytest.mark.parametrize("confidence, expected", [
+    (0.85, 85.0),
+    (1, 1),
+    (1.0, 1.0),
+    (0, 0),
+    (80, 80),
+])
+def test_normalized_confidence(confidence, expected):
+    assert normalized_confidence({"analysis_confidence": confidence}) == pytest.approx(expected)
+
+
+def test_review_escalates_a_confidence_of_one_percent(router):
+    reason, checked = router.review(DEFAULT_TIERS[0], analysis_result(1))
+    assert reason == 'low_confidence'
+    assert checked['confidence'] == 1
+
+
+def test_review_accepts_a_fractional_confidence_over_the_threshold(router):
+    reason, checked = router.review(DEFAULT_TIERS[0], analysis_result(0.9))
+    assert reason is None
+    assert checked['confidence'] == pytest.approx(90)
+
+
+def test_review_applies_document_type_overrides(router):
+    reason, checked = router.review(DEFAULT_TIERS[0], analysis_result(80, "Tax return"))
+    assert reason == 'low_confidence'
+    assert (checked['threshold'], checked['type_override']) == (90, 'tax')
+
+
+def test_review_escalates_errors_and_schema_problems(router):
+    assert router.review(DEFAULT_TIERS[0], {"error": "overloaded"}) == ('error', {})
+    reason, checked = router.review(DEFAULT_TIERS[0], {"response": '{"analysis_confidence": 95}'})
+    assert reason == 'schema'
+    assert "recommended_actions is missing or empty" in checked['schema_problems']
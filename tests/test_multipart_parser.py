@@ -0,0 +1,71 @@
+import pytest
+
+from multipart_parser import extract_files_to_disk, iter_parts, map_http_request
+from streaming_ingest import MultipartPartTracker
+
+BOUNDARY = 'paperless-boundary'
+# Looks like a delimiter until the boundary text diverges
+PAYLOAD = b'%PDF-1.4\r\n--paperless-bound\r\n\r\n' + bytes(range(256)) * 4 + b'\r\n%%EOF'
+BODY = (
+    b'preamble\r\n'
+    b'--paperless-boundary\r\nContent-Disposition: form-data; name="document_id"\r\n\r\n42\r\n'
+    b'--paperless-boundary\r\nContent-Disposition: form-data; name="file"; filename="scan.pdf"\r\n'
+    b'Content-Type: application/pdf\r\n\r\n' + PAYLOAD + b'\r\n'
+    b'--paperless-boundary--\r\n'
+)
+EXPECTED = [('document_id', None, 2), ('file', 'scan.pdf', len(PAYLOAD))]
+
+
+def summarize(parts):
+    summary = []
+    for part in parts:
+        summary.append((part.name, part.filename, part.size, bytes(part.content)))
+        part.release()
+    return summary
+
+
+def save_request(tmp_path):
+    path = tmp_path / 'document-added.http'
+    path.write_bytes(b'POST /document-added HTTP/1.1\r\n'
+                     b'Content-Type: multipart/form-data; boundary=' + BOUNDARY.encode() + b'\r\n\r\n' + BODY)
+    return path
+
+
+@pytest.mark.parametrize("buffer_type", [bytes, bytearray])
+def test_iter_parts(buffer_type):
+    parts = summarize(iter_parts(buffer_type(BODY), BOUNDARY))
+    assert [part[:3] for part in parts] == EXPECTED
+    assert [part[3] for part in parts] == [b'42', PAYLOAD]
+
+
+@pytest.mark.parametrize("size", [1, 3, 7, len(BODY)])
+def test_iter_parts_agrees_with_the_streaming_tracker(size):
+    tracker = MultipartPartTracker(BOUNDARY.encode())
+    for start in range(0, len(BODY), size):
+        tracker.feed(BODY[start:start + size])
+
+    parts = list(iter_parts(BODY, BOUNDARY))
+    assert [(part.name, part.filename, part.start, part.size) for part in parts] == [
+        (part['name'], part['filename'], part['offset'], part['size']) for part in tracker.parts
+    ]
+    summarize(parts)
+
+
+def test_truncated_body_keeps_the_rest_as_content():
+    truncated = BODY[:BODY.index(b'%%EOF')]
+    parts = summarize(iter_parts(truncated, BOUNDARY))
+    assert parts[-1][:2] == ('file', 'scan.pdf')
+    assert parts[-1][3] == PAYLOAD[:PAYLOAD.index(b'%%EOF')]
+
+
+def test_iter_parts_over_an_mmap(tmp_path):
+    with map_http_request(save_request(tmp_path)) as request:
+        assert request['request_line'] == 'POST /document-added HTTP/1.1'
+        parts = summarize(iter_parts(request['buffer'], BOUNDARY, start=request['body_offset']))
+    assert [part[:3] for part in parts] == EXPECTED
+
+
+def test_extract_files_to_disk(tmp_path):
+    written = extract_files_to_disk(save_request(tmp_path), output_dir=tmp_path)
+    assert written == [(str(tmp_path / 'extracted_scan.pdf'), len(PAYLOAD))]
+    assert (tmp_path / 'extracted_scan.pdf').read_bytes() == PAYLOAD
@@ -0,0 +1,20 @@
+from ocr_quality_scan import score_text
+
+CLEAN = "Please pay the invoice total by the due date. Thank you for your payment. " * 3
+
+
+def test_clean_text_is_not_flagged():
+    result = score_text(CLEAN)
+    assert not result['needs_reocr']
+    assert result['control_ratio'] == 0.0
+
+
+def test_c0_and_c1_control_characters_are_flagged():
+    for control in ('\x07', '\x85'):
+        result = score_text(CLEAN + control * 10)
+        assert result['needs_reocr']
+        assert 'control characters' in result['reason']
+
+
+def test_short_text_needs_reocr():
+    assert score_text("  ")['reason'] == 'no text'
@@ -0,0 +1,62 @@
+import random
+
+from page_dedup import PageDeduplicator
+
+WORDS = ("account balance payment service period statement customer charges credit address "
+         "phone please thank receipt order price name year month total due date invoice").split()
+
+
+def page_text(seed, words=120):
+    """Deterministic pseudo-prose for one page."""
+    rng = random.Random(seed)
+    return ' '.join(rng.choice(WORDS) for _ in range(words))
+
+
+def near_copy(text, seed, edits=3):
+    """text with a few words replaced, like the same page OCR'd twice."""
+    rng = random.Random(seed)
+    words = text.split()
+    for index in rng.sample(range(len(words)), edits):
+        words[index] = "smudge"
+    return ' '.join(words)
+
+
+def test_near_identical_page_matches_and_different_page_does_not():
+    dedup = PageDeduplicator()
+    original = page_text(1)
+    dedup.add_document("terms-2024", [{'page_number': 3, 'text': original}])
+
+    match = dedup.query(dedup.signature(near_copy(original, seed=2)))
+    assert (match['doc_id'], match['page_number'], match['exact']) == ("terms-2024", 3, False)
+    assert match['similarity'] >= dedup.threshold
+
+    assert dedup.query(dedup.signature(original))['exact'] is True
+    assert dedup.query(dedup.signature(page_text(99))) is None
+
+
+def test_exclude_doc_ignores_the_document_itself():
+    dedup = PageDeduplicator()
+    text = page_text(5)
+    dedup.add_document("statement", [{'page_number': 1, 'text': text}])
+    signature = dedup.signature(text)
+
+    assert dedup.query(signature, exclude_doc="statement") is None
+
+    dedup.add_document("other", [{'page_number': 2, 'text': near_copy(text, seed=6)}])
+    match = dedup.query(signature, exclude_doc="statement")
+    assert (match['doc_id'], match['page_number']) == ("other", 2)
+
+
+def test_repeated_page_within_a_scan_matches_its_first_copy():
+    dedup = PageDeduplicator()
+    boilerplate = page_text(7)
+    pages = [
+        {'page_number': 1, 'text': page_text(8)},
+        {'page_number': 2, 'text': boilerplate},
+        {'page_number': 3, 'text': near_copy(boilerplate, seed=9)},
+        {'page_number': 4, 'text': "too short to match"},
+    ]
+
+    duplicates = dedup.find_duplicates("scan", pages)
+    assert list(duplicates) == [3]
+    assert (duplicates[3]['page_number'], duplicates[3]['same_document']) == (2, True)
@@ -0,0 +1,42 @@
+import pytest
+
+from paperless_api import PaperlessAPI
+
+DOCUMENTS = [{'id': number} for number in range(1, 26)]
+
+
+class StubResponse:
+    def __init__(self, data):
+        self.data = data
+
+    def json(self):
+        return self.data
+
+
+def serve_documents(api, monkeypatch, max_page_size):
+    """Answer the documents list like paperless, capping page_size at max_page_size."""
+    requested_pages = []
+
+    def make_request(method, url, params=None, **kwargs):
+        size = min(params['page_size'], max_page_size)
+        page = params.get('page', 1)
+        requested_pages.append(page)
+        results = DOCUMENTS[(page - 1) * size:page * size]
+        more = page * size < len(DOCUMENTS)
+        return StubResponse({'count': len(DOCUMENTS), 'next': f'{url}?page={page + 1}' if more else None,
+                             'results': results})
+
+    monkeypatch.setattr(api, '_make_request', make_request)
+    return requested_pages
+
+
+@pytest.mark.parametrize("max_workers", [1, 3])
+@pytest.mark.parametrize("max_page_size", [4, 10, 100])
+def test_iter_documents_follows_the_served_page_size(monkeypatch, max_workers, max_page_size):
+    api = PaperlessAPI('http://paperless.test', token='token')
+    requested_pages = serve_documents(api, monkeypatch, max_page_size)
+
+    documents = list(api.iter_documents(page_size=10, max_workers=max_workers))
+
+    assert documents == DOCUMENTS
+    assert sorted(requested_pages) == list(range(1, -(-len(DOCUMENTS) // min(10, max_page_size)) + 1))
@@ -0,0 +1,14 @@
+from paperless_mirror import PaperlessMirror
+
+
+def test_resolve_id_prefers_names_over_ids(tmp_path):
+    mirror = PaperlessMirror(api=None, db_path=tmp_path / "mirror.sqlite3")
+    mirror.conn.executemany(
+        "INSERT INTO metadata (endpoint, id, name, data) VALUES (?, ?, ?, '{}')",
+        [('tags', 7, '2025'), ('tags', 8, 'Taxes')]
+    )
+
+    assert mirror.resolve_id('tags', '2025') == 7
+    assert mirror.resolve_id('tags', 'taxes') == 8
+    assert mirror.resolve_id('tags', '8') == 8
+    assert mirror.resolve_id('tags', 'missing') is None
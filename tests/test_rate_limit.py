@@ -0,0 +1,130 @@
+import random
+import threading
+
+import anthropic
+import httpx
+import pytest
+
+import rate_limit
+from rate_limit import RETRY_AFTER_JITTER, RateLimiter
+
+
+class FakeClock:
+    """Stands in for time.monotonic/time.sleep so waits and backoff take no real time."""
+
+    def __init__(self):
+        self.now = 1000.0
+        self.sleeps = []
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(rate_limit.time, 'monotonic', clock.monotonic)
+    monkeypatch.setattr(rate_limit.time, 'sleep', clock.sleep)
+    return clock
+
+
+def api_error(error_class, status, headers=None):
+    request = httpx.Request('POST', 'http://stub/v1/messages')
+    response = httpx.Response(status, headers=headers or {}, request=request)
+    return error_class(f"HTTP {status}", response=response, body=None)
+
+
+def fake_send(*outcomes):
+    """A send that raises or returns each outcome in turn and counts its calls."""
+    calls = []
+
+    def send(permit):
+        outcome = outcomes[len(calls)]
+        calls.append(permit)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+    return send, calls
+
+
+def test_429_waits_for_retry_after_and_pauses_every_request(clock):
+    limiter = RateLimiter(seed=7)
+    send, calls = fake_send(api_error(anthropic.RateLimitError, 429, {'retry-after': '2'}), "ok")
+    start = clock.now
+
+    assert limiter.call(send) == "ok"
+    assert len(calls) == 2
+
+    expected = 2 + random.Random(7).uniform(0, RETRY_AFTER_JITTER)
+    assert clock.sleeps == [pytest.approx(expected)]
+    assert limiter.paused_until == pytest.approx(start + expected)
+    stats = limiter.stats()
+    assert (stats['rate_limited'], stats['retries'], stats['failed']) == (1, 1, 0)
+
+
+def test_x_should_retry_overrides_the_status(clock):
+    limiter = RateLimiter(seed=1)
+    send, calls = fake_send(api_error(anthropic.InternalServerError, 500, {'x-should-retry': 'false'}))
+    with pytest.raises(anthropic.InternalServerError):
+        limiter.call(send)
+    assert len(calls) == 1
+    assert limiter.stats()['failed'] == 1
+
+    send, calls = fake_send(api_error(anthropic.BadRequestError, 400, {'x-should-retry': 'true'}), "ok")
+    assert limiter.call(send) == "ok"
+    assert len(calls) == 2
+
+
+def test_retries_stop_after_max_retries(clock):
+    limiter = RateLimiter(max_retries=2, seed=1)
+    overloaded = api_error(anthropic.InternalServerError, 529)
+    send, calls = fake_send(overloaded, overloaded, overloaded, "unreached")
+    with pytest.raises(anthropic.InternalServerError):
+        limiter.call(send)
+    assert len(calls) == 3
+    assert all(0 <= delay <= 2 ** attempt for attempt, delay in enumerate(clock.sleeps))
+
+
+def test_settle_gives_back_unused_tokens(clock):
+    limiter = RateLimiter(input_tokens_per_minute=1000, output_tokens_per_minute=1000)
+
+    def send(permit):
+        permit.settle({'input_tokens': 150, 'cache_creation_input_tokens': 50, 'output_tokens': 100})
+        permit.settle({'output_tokens': 0})  # a second settle is ignored
+        return "ok"
+
+    limiter.call(send, input_tokens=500, max_tokens=800)
+    limits = limiter.stats()['limits']
+    assert limits['input_tokens']['available'] == 1000 - 200
+    assert limits['output_tokens']['available'] == 1000 - 100
+
+
+def test_reservation_larger_than_capacity_does_not_deadlock(clock):
+    limiter = RateLimiter(output_tokens_per_minute=1000)
+    send, _ = fake_send("ok")
+    send_again, _ = fake_send("again")
+    results = []
+
+    worker = threading.Thread(target=lambda: results.append(limiter.call(send, max_tokens=5000)))
+    worker.start()
+    worker.join(timeout=5)
+
+    assert not worker.is_alive()
+    assert results == ["ok"]
+    assert limiter.stats()['limits']['output_tokens']['available'] == 1000 - 5000
+
+    # The bucket can never hold 5000; the next big request goes once it is full
+    worker = threading.Thread(target=lambda: results.append(limiter.call(send_again, max_tokens=5000)))
+    worker.start()
+    clock.now += 5000 * 60 / 1000
+    with limiter._condition:
+        limiter._condition.notify_all()
+    worker.join(timeout=5)
+
+    assert not worker.is_alive()
+    assert results == ["ok", "again"]
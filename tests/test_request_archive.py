@@ -0,0 +1,115 @@
+import hashlib
+import os
+
+import pytest
+
+import request_archive
+from request_archive import RequestArchive, find_document_id
+
+BOUNDARY = 'paperless-boundary'
+PDF = b'%PDF-1.4\n' + os.urandom(8192) + b'\n%%EOF'
+
+
+def multipart_body(document_id, pdf=PDF):
+    return (
+        f'--{BOUNDARY}\r\n'
+        f'Content-Disposition: form-data; name="document_id"\r\n\r\n'
+        f'{document_id}\r\n'
+        f'--{BOUNDARY}\r\n'
+        f'Content-Disposition: form-data; name="file"; filename="scan.pdf"\r\n'
+        f'Content-Type: application/pdf\r\n\r\n'
+    ).encode() + pdf + f'\r\n--{BOUNDARY}--\r\n'.encode()
+
+
+def save_request(directory, name, body, content_type=f'multipart/form-data; boundary={BOUNDARY}'):
+    path = directory / name
+    path.write_bytes(
+        f'POST /document-added HTTP/1.1\r\nContent-Type: {content_type}\r\n'
+        f'Content-Length: {len(body)}\r\n\r\n'.encode() + body
+    )
+    return path
+
+
+@pytest.fixture
+def archive(tmp_path):
+    archive = RequestArchive(tmp_path / 'archive')
+    yield archive
+    archive.close()
+
+
+def blob_ref_counts(archive):
+    return [row['ref_count'] for row in archive._conn.execute("SELECT ref_count FROM blobs")]
+
+
+def test_round_trip(archive, tmp_path):
+    body = multipart_body(42)
+    path = save_request(tmp_path, 'document-added_2025-10-01T12-00-00_123456.http', body)
+
+    request_id = archive.add_http_file(path)
+    request = archive.get(request_id)
+
+    assert request['body'] == body
+    assert request['endpoint'] == 'document-added'
+    assert request['timestamp'] == '2025-10-01T12:00:00.123456'
+    assert request['request_line'] == 'POST /document-added HTTP/1.1'
+    assert request['headers']['Content-Type'] == f'multipart/form-data; boundary={BOUNDARY}'
+    row = archive._conn.execute("SELECT body_sha256 FROM requests WHERE id = ?", (request_id,)).fetchone()
+    assert row['body_sha256'] == hashlib.sha256(body).hexdigest()
+
+    assert archive.add_http_file(path) == request_id
+
+    exported = tmp_path / 'exported.http'
+    archive.export_http(request_id, exported)
+    assert exported.read_bytes() == path.read_bytes()
+
+
+def test_file_parts_are_stored_once(archive, tmp_path):
+    first = archive.add_http_file(save_request(tmp_path, 'document-added_2025-10-01T12-00-00.http',
+                                               multipart_body(42)))
+    second = archive.add_http_file(save_request(tmp_path, 'document-updated_2025-10-01T12-05-00.http',
+                                                multipart_body(42)))
+
+    assert archive.stats()['unique_files'] == 1
+    assert blob_ref_counts(archive) == [2]
+    assert [entry['files'] for entry in archive.list()] == [['scan.pdf'], ['scan.pdf']]
+
+    assert archive.delete(first)
+    assert blob_ref_counts(archive) == [1]
+    assert archive.get(first) is None
+    assert archive.get(second)['body'] == multipart_body(42)
+
+    assert archive.delete(second)
+    assert blob_ref_counts(archive) == []
+    assert not archive.delete(second)
+
+
+def test_zlib_fallback_without_zstandard(archive, tmp_path, monkeypatch):
+    monkeypatch.setattr(request_archive, 'zstandard', None)
+    body = multipart_body(7)
+    request_id = archive.add_http_file(save_request(tmp_path, 'scheduled_2025-10-01T12-00-00.http', body))
+
+    codecs = {row['codec'] for row in archive._conn.execute(
+        "SELECT codec FROM requests UNION SELECT codec FROM blobs")}
+    assert codecs == {'zlib'}
+    assert archive.get(request_id)['body'] == body
+
+
+def test_document_id_index(archive, tmp_path):
+    archive.add_http_file(save_request(tmp_path, 'document-added_2025-10-01T12-00-00.http', multipart_body(42)))
+    urlencoded = archive.add_http_file(save_request(
+        tmp_path, 'document-added_2025-10-01T12-01-00.http',
+        b'doc_url=http%3A%2F%2Fpaperless%2Fdocuments%2F17%2F&title=Bill',
+        content_type='application/x-www-form-urlencoded'
+    ))
+    archive.add_http_file(save_request(tmp_path, 'general_2025-10-01T12-02-00.http', b'{}',
+                                       content_type='application/json'))
+
+    assert [entry['id'] for entry in archive.list(document_id=17)] == [urlencoded]
+    assert [entry['document_id'] for entry in archive.list(newest_first=False)] == [42, 17, None]
+
+
+def test_find_document_id():
+    assert find_document_id({'doc_id': ' 12 '}, {}) == 12
+    assert find_document_id({}, {'X-Document-Id': '5'}) == 5
+    assert find_document_id({'url': 'https://paperless/documents/9/details'}, {}) == 9
+    assert find_document_id({'title': 'Bill'}, {}) is None
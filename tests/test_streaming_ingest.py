@@ -0,0 +1,71 @@
+import io
+
+import pytest
+
+from streaming_ingest import MultipartPartTracker, get_boundary, spool_request
+
+BOUNDARY = b'paperless-boundary'
+# Looks like a delimiter until the boundary text diverges
+PAYLOAD = b'%PDF-1.4\r\n--paperless-bound\r\n\r\n' + bytes(range(256)) * 4 + b'\r\n%%EOF'
+FIELDS = [('document_id', '42'), ('title', 'Power bill')]
+
+
+def multipart_body():
+    body = b'preamble\r\n'
+    for name, value in FIELDS:
+        body += (b'--' + BOUNDARY + b'\r\nContent-Disposition: form-data; name="' + name.encode()
+                 + b'"\r\n\r\n' + value.encode() + b'\r\n')
+    body += (b'--' + BOUNDARY + b'\r\nContent-Disposition: form-data; name="file"; filename="scan.pdf"\r\n'
+             b'Content-Type: application/pdf\r\n\r\n' + PAYLOAD + b'\r\n--' + BOUNDARY + b'--\r\n')
+    return body
+
+
+BODY = multipart_body()
+
+
+def track(chunks):
+    tracker = MultipartPartTracker(BOUNDARY)
+    for chunk in chunks:
+        tracker.feed(chunk)
+    return tracker
+
+
+def assert_parts(tracker):
+    assert [(part['name'], part['filename'], part['size']) for part in tracker.parts] == [
+        ('document_id', None, 2), ('title', None, 10), ('file', 'scan.pdf', len(PAYLOAD))
+    ]
+    for part in tracker.parts:
+        assert BODY[part['offset']:part['offset'] + part['size']] == (
+            PAYLOAD if part['filename'] else dict(FIELDS)[part['name']].encode())
+    assert tracker.summary() == (dict(FIELDS), {
+        'file': {'filename': 'scan.pdf', 'content_type': 'application/pdf', 'size': len(PAYLOAD)}
+    })
+
+
+@pytest.mark.parametrize("size", [1, 3, 7, len(BODY)])
+def test_parts_at_any_chunk_size(size):
+    assert_parts(track(BODY[start:start + size] for start in range(0, len(BODY), size)))
+
+
+@pytest.mark.parametrize("split", [
+    BODY.index(b'\r\n--' + BOUNDARY + b'--') + 1,   # between CR and LF
+    BODY.index(b'\r\n--' + BOUNDARY + b'--') + 2,   # chunk ends with the CRLF
+    BODY.index(b'\r\n--' + BOUNDARY + b'--') + 9,   # inside the boundary
+    BODY.index(b'--paperless-bound\r\n') + 5,       # inside the near-miss in the payload
+])
+def test_delimiter_split_across_chunks(split):
+    assert_parts(track([BODY[:split], BODY[split:]]))
+
+
+def test_spool_request_summarizes_multipart(tmp_path):
+    path = tmp_path / 'request.http'
+    content_type = f'multipart/form-data; boundary="{BOUNDARY.decode()}"'
+    assert get_boundary(content_type) == BOUNDARY
+
+    spooled = spool_request(io.BytesIO(BODY), path, 'POST /document-added HTTP/1.1\r\n',
+                            [('Content-Type', content_type)], content_type=content_type, chunk_size=7)
+
+    assert spooled['body_size'] == len(BODY)
+    assert spooled['form_data'] == dict(FIELDS)
+    assert spooled['files_data']['file']['size'] == len(PAYLOAD)
+    assert path.read_bytes().endswith(b'\r\n\r\n' + BODY)
@@ -0,0 +1,121 @@
+import itertools
+
+import pytest
+
+import text_extraction
+from text_extraction import ExtractionCache, PDFDocument
+
+GOOD = "Invoice total due on receipt"
+GARBLED = "\x01\x02\x03\x04(cid:12)(cid:13)"
+
+
+def minimal_pdf(text):
+    """A one-page PDF showing text in Helvetica."""
+    stream = f"BT /F1 24 Tf 72 720 Td ({text}) Tj ET".encode()
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        b"<< /Type /Pages /Kids [3 0 R] /Count 1 >>",
+        b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] /Contents 4 0 R "
+        b"/Resources << /Font << /F1 5 0 R >> >> >>",
+        b"<< /Length %d >>\nstream\n" % len(stream) + stream + b"\nendstream",
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    ]
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, 1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n" % number + body + b"\nendobj\n"
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    out += b"".join(b"%010d 00000 n \n" % offset for offset in offsets)
+    out += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+    return bytes(out)
+
+
+@pytest.fixture
+def library_text(monkeypatch):
+    """Serve each library's page text from a dict and record the calls."""
+    texts = {}
+    calls = []
+
+    def extract(doc, library, page):
+        calls.append(library)
+        if isinstance(texts[library], Exception):
+            raise texts[library]
+        return texts[library]
+
+    monkeypatch.setattr(PDFDocument, '_extract_text', extract)
+    return texts, calls
+
+
+def open_stub(cache=None):
+    return PDFDocument("stub.pdf", cache=cache, extractors=PDFDocument.LIBRARIES, file_hash="stub")
+
+
+def test_fallback_order(library_text):
+    texts, calls = library_text
+    texts.update(pypdf=GOOD, pdfplumber=GOOD, pypdfium2=GOOD)
+    assert open_stub().extract_page(0)['tried'] == ['pypdf']
+
+    texts['pypdf'] = ''
+    page = open_stub().extract_page(0)
+    assert (page['extractor'], page['tried']) == ('pdfplumber', ['pypdf', 'pdfplumber'])
+
+    texts['pdfplumber'] = GARBLED
+    page = open_stub().extract_page(0)
+    assert (page['extractor'], page['text']) == ('pypdfium2', GOOD)
+    assert page['tried'] == ['pypdf', 'pdfplumber', 'pypdfium2']
+
+
+def test_failing_library_is_skipped_and_best_text_kept(library_text):
+    texts, _ = library_text
+    texts.update(pypdf=RuntimeError("broken xref"), pdfplumber="short", pypdfium2=GARBLED)
+
+    page = open_stub().extract_page(0)
+    assert (page['extractor'], page['text']) == ('pdfplumber', "short")
+    assert page['tried'] == ['pdfplumber', 'pypdfium2']
+
+
+def test_page_text_is_memoized_per_library(library_text):
+    texts, calls = library_text
+    texts.update(pypdf='', pdfplumber=GOOD, pypdfium2=GOOD)
+    cache = ExtractionCache()
+
+    doc = open_stub(cache)
+    doc.extract_page(0)
+    doc.extract_page(0)
+    assert calls == ['pypdf', 'pdfplumber']
+
+    open_stub(cache).extract_page(0)
+    assert calls == ['pypdf', 'pdfplumber']
+    assert cache.stats()['hits'] == 2
+
+
+def test_every_library_reads_a_real_pdf(tmp_path):
+    path = tmp_path / "hello.pdf"
+    path.write_bytes(minimal_pdf("Hello fallback world"))
+
+    with PDFDocument(str(path)) as doc:
+        for library in doc.extractors:
+            assert doc.page_count(library) == 1
+            assert doc.page_text(library, 0).strip() == "Hello fallback world"
+
+
+def test_memory_cache_drops_least_recently_used_pages(monkeypatch):
+    ticks = itertools.count(1000)
+    monkeypatch.setattr(text_extraction.time, 'time', lambda: float(next(ticks)))
+    cache = ExtractionCache(max_entries=10)
+    for page in range(11):
+        cache.put("file", page, 'pypdf', f"page {page}")
+    cache.get("file", 0, 'pypdf')
+    assert cache.stats()['entries'] == 11
+
+    cache.put("file", 11, 'pypdf', "page 11")
+    assert cache.stats()['entries'] == 10
+    assert cache.get("file", 0, 'pypdf') == "page 0"
+    assert cache.get("file", 1, 'pypdf') is None
+    assert cache.get("file", 11, 'pypdf') == "page 11"
+
+
+def test_text_extractor_bounds_its_default_cache():
+    assert text_extraction.TextExtractor().cache.max_entries == text_extraction.MEMORY_CACHE_PAGES
@@ -0,0 +1,59 @@
+from token_budget import TRUNCATION_NOTE, TokenCounter, clean_page_text, pack_pages, trim_pages, truncate_to_tokens
+
+
+def words(count):
+    """Text the raw estimate counts as exactly count tokens."""
+    return ' '.join(['word'] * count)
+
+
+estimate = TokenCounter().estimate
+
+
+def test_pack_pages_fills_chunks_up_to_the_budget():
+    sections = [words(40), words(40), words(40), words(10), words(100)]
+    assert pack_pages(sections, 95, estimate, separator=' ') == [[0, 1], [2, 3], [4]]
+
+
+def test_pack_pages_min_per_chunk_keeps_pairs_together():
+    sections = [words(80), words(80), words(80)]
+    assert pack_pages(sections, 100, estimate) == [[0], [1], [2]]
+    assert pack_pages(sections, 100, estimate, min_per_chunk=2) == [[0, 1], [2]]
+
+
+def test_trim_pages_keeps_the_first_copy_of_headers_and_footers():
+    pages = [
+        {'page_number': number,
+         'text': f"ACME Utilities Statement\nUsage for page {number}\n-----------\nPage {number} of 4"}
+        for number in range(1, 5)
+    ]
+    pages[2]['text'] += "\nACME Utilities Statement"
+
+    trimmed, boilerplate = trim_pages(pages, skip=[4])
+    assert boilerplate == ["ACME Utilities Statement"]
+    assert trimmed[0]['text'] == "ACME Utilities Statement\nUsage for page 1\nPage 1 of 4"
+    assert trimmed[1]['text'] == "Usage for page 2\nPage 2 of 4"
+    assert trimmed[2]['text'] == "Usage for page 3\nPage 3 of 4"
+    assert trimmed[3] is pages[3]
+    assert pages[1]['text'].startswith("ACME")
+
+
+def test_trim_pages_needs_a_line_on_enough_pages():
+    pages = [{'page_number': 1, 'text': "Account summary"}, {'page_number': 2, 'text': "Account summary"}]
+    trimmed, boilerplate = trim_pages(pages)
+    assert boilerplate == []
+    assert [page['text'] for page in trimmed] == ["Account summary", "Account summary"]
+
+
+def test_clean_page_text_drops_rules_and_padding():
+    assert clean_page_text("Total   due      $5   \n\n\n\n=====\nThanks") == "Total  due  $5\n\nThanks"
+
+
+def test_truncate_to_tokens_cuts_at_a_word_and_notes_it():
+    text = words(200)
+    assert truncate_to_tokens(text, 500, estimate) == text
+
+    cut = truncate_to_tokens(text, 50, estimate)
+    assert cut.endswith('\n' + TRUNCATION_NOTE)
+    assert estimate(cut) <= 50
+    kept = cut.rsplit('\n', 1)[0]
+    assert set(kept.split(' ')) == {'word'}
@@ -0,0 +1,70 @@
+import importlib
+import logging
+
+import pytest
+
+
+@pytest.fixture(scope='module')
+def service(tmp_path_factory):
+    """Import webhook_service with its log, queue, spool and archive under a temp dir."""
+    root = tmp_path_factory.mktemp("webhook")
+    env = {
+        'WEBHOOK_LOG_FILE': str(root / "webhook_requests.log"),
+        'WEBHOOK_SAVED_DIR': str(root / "saved_requests"),
+        'WEBHOOK_QUEUE_DB': str(root / "jobs.sqlite3"),
+        'WEBHOOK_ARCHIVE_DIR': str(root / "archive"),
+        'WEBHOOK_LOG_CONSOLE': '0',
+    }
+    with pytest.MonkeyPatch.context() as monkeypatch:
+        for name, value in env.items():
+            monkeypatch.setenv(name, value)
+        module = importlib.import_module('webhook_service')
+    yield module
+    module.job_queue.close()
+    module.request_archive.close()
+
+
+def saved_request(tmp_path, content_type, body):
+    path = tmp_path / "request.http"
+    path.write_bytes(f"POST /document-added HTTP/1.1\r\nContent-Type: {content_type}\r\n\r\n".encode() + body)
+    return str(path)
+
+
+def test_urlencoded_body_becomes_form_data(service, tmp_path):
+    details = {}
+    content_type = 'application/x-www-form-urlencoded'
+    service.process_saved_body(details, saved_request(tmp_path, content_type, b"doc_url=http%3A%2F%2Fp%2F7&id=7"),
+                               content_type)
+    assert details == {'form_data': {'doc_url': 'http://p/7', 'id': '7'}}
+
+
+def test_json_and_other_bodies(service, tmp_path):
+    details = {}
+    service.process_saved_body(details, saved_request(tmp_path, 'application/json', b'{"id": 7}'), 'application/json')
+    assert details == {'json_data': {'id': 7}}
+
+    details = {}
+    service.process_saved_body(details, saved_request(tmp_path, 'text/plain', b"hello"), 'text/plain')
+    assert details == {'raw_data': "hello"}
+
+
+def test_unparseable_saved_request_raises_value_error(service, tmp_path):
+    path = tmp_path / "broken.http"
+    path.write_bytes(b"POST / HTTP/1.1\r\nno blank line")
+    with pytest.raises(ValueError):
+        service.process_saved_body({}, str(path), 'text/plain')
+
+
+def test_posted_form_is_logged_and_archived_with_its_fields(service, caplog):
+    client = service.app.test_client()
+    response = client.post('/document-added', data={'document_id': '42', 'title': 'Power bill'})
+    assert response.status_code == 202
+
+    job = service.job_queue.claim(timeout=0)
+    with caplog.at_level(logging.INFO, logger='webhook_service'):
+        service.process_webhook_job(job)
+    service.job_queue.complete(job['id'])
+
+    record = next(r for r in caplog.records if r.getMessage() == "document-added webhook processed")
+    assert record.request['form_fields'] == ['document_id', 'title']
+    assert 'raw_data' not in job['payload']